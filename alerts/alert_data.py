@@ -1,52 +1,62 @@
 """Checks the plant data in the RDS for temp or soil moisture outside
 the optimum range."""
-from os import environ as ENV
-from datetime import datetime, timedelta
+from datetime import datetime
 
-import pyodbc
 from dotenv import load_dotenv
 
+from alert_detectors import ANOMALY_DETECTORS
+from alert_digest import render_digest
+from alert_evaluator import (COOLDOWN_CACHE, RANGE_STATE, CooldownCache, decide_alerts,
+                             insert_alerts, to_datetime)
+from alert_rules import ALERT_RULES, ALERT_TYPE_NAMES
+from db_pool import ConnectionPool
+from storage import BACKEND
+
 
 def get_db_connection():
-    """Gets a connection to the SQL Server plants database."""
+    """Gets a connection to the plants database using the configured backend."""
+
+    return BACKEND.connect()
 
-    connection = pyodbc.connect(driver=ENV["DB_DRIVER"],
-                                server=ENV["DB_HOST"],
-                                database=ENV["DB_NAME"],
-                                TrustServerCertificate='yes',
-                                UID=ENV["DB_USER"],
-                                PWD=ENV["DB_PASSWORD"],)
 
-    return connection
+DB_POOL = ConnectionPool(get_db_connection)
 
 
 def get_db_cursor(connection: "Connection"):
-    """Gets a cursor for the SQL Server plants database."""
+    """Gets a cursor for the plants database."""
 
     cursor = connection.cursor()
 
     return cursor
 
 
-def get_last_three_readings(connection: "Connection") -> list[dict]:
-    """Gets the average of the last 3 recorded readings for temperature and soil moisture."""
-    query = """WITH ranked_readings as
+def get_alert_state(connection: "Connection",
+                    cooldowns: CooldownCache = COOLDOWN_CACHE) -> list[dict]:
+    """Gets each plant's average of its last 3 readings and its newest reading in
+    one query, with the last time each type of alert was sent for it from the
+    cooldown cache.
+
+    Readings come from latest_reading, the window of each plant's newest
+    readings kept by the pipeline, so the query reads a few rows per plant
+    however long sensor_reading grows."""
+    cooldowns.ensure_warm(connection)
+    query = """WITH ranked_readings AS
                 (
-                SELECT 
-                    p.plant_id, 
-                    p.plant_name, 
-                    sr.temperature, 
-                    sr.soil_moisture, 
-                    sr.taken_at,
-                ROW_NUMBER() OVER (PARTITION BY p.plant_id ORDER BY taken_at DESC) AS rank
-                FROM plant AS p
-                JOIN sensor_reading AS sr
-                ON p.plant_id = sr.plant_id
+                SELECT
+                    plant_id,
+                    temperature,
+                    soil_moisture,
+                ROW_NUMBER() OVER (PARTITION BY plant_id ORDER BY taken_at DESC) AS rank
+                FROM latest_reading
                 )
-                SELECT plant_id, plant_name, AVG(temperature), AVG(soil_moisture) 
-                FROM ranked_readings
-                WHERE rank <= 3
-                GROUP BY plant_id, plant_name"""
+                SELECT p.plant_id, p.plant_name, AVG(r.temperature), AVG(r.soil_moisture),
+                    p.scientific_name,
+                    MAX(CASE WHEN r.rank = 1 THEN r.temperature END),
+                    MAX(CASE WHEN r.rank = 1 THEN r.soil_moisture END)
+                FROM plant AS p
+                JOIN ranked_readings AS r
+                    ON r.plant_id = p.plant_id AND r.rank <= 3
+                GROUP BY p.plant_id, p.plant_name, p.scientific_name"""
     curs = get_db_cursor(connection)
     try:
         curs.execute(query)
@@ -54,142 +64,79 @@ def get_last_three_readings(connection: "Connection") -> list[dict]:
     finally:
         curs.close()
 
-    avg_last_3_readings = []
-    for result in results:
-        avg_last_3_readings.append({
-            "plant_id": result[0], "plant_name": result[1],
-            "avg_temp": round(float(result[2]), 2),
-            "avg_soil_moisture": round(float(result[3]), 2)})
-
-    return avg_last_3_readings
+    return [{"plant_id": result[0], "plant_name": result[1], "scientific_name": result[4],
+             "avg_temp": round(float(result[2]), 2),
+             "avg_soil_moisture": round(float(result[3]), 2),
+             "temperature": float(result[5]), "soil_moisture": float(result[6]),
+             "last_alerts": cooldowns.get_last_alerts(result[0])}
+            for result in results]
 
 
-def recent_alert_sent(plant_id: int, connection: "Connection", alert_type_id: int) -> bool:
-    """
-    Checks if a recent alert was sent for the 
-    plant_id and alert type provided within the last hour.
-    """
-
-    curs = connection.cursor()
-    one_hour_ago = datetime.now() - timedelta(hours=1)
-
-    curs.execute(
-        """
-    SELECT COUNT(*) FROM alert
-    WHERE plant_id = ? AND sent_at >= ? AND alert_type_id = ?;
-    """,
-        (plant_id, one_hour_ago, alert_type_id)
-    )
-    recent_alert_count = curs.fetchone()[0]
-    curs.close()
-    return recent_alert_count != 0
-
-
-def get_plant_id(connection: "Connection", plant_data: dict) -> dict:
-    """Gets the corresponding origin ID from database using longitude and latitude."""
-
+def observe_latest_readings(connection: "Connection") -> None:
+    """Adds the readings in latest_reading to the plants' anomaly detectors, which
+    skip any they have already seen."""
     curs = get_db_cursor(connection)
+    try:
+        curs.execute("""SELECT plant_id, taken_at, temperature, soil_moisture
+                        FROM latest_reading
+                        ORDER BY plant_id, taken_at""")
+        results = curs.fetchall()
+    finally:
+        curs.close()
 
-    curs.execute("""SELECT plant_id
-                    FROM plant 
-                    WHERE plant_name 
-                    COLLATE SQL_Latin1_General_CP1_CS_AS 
-                    LIKE ?""",
-                 plant_data["plant_name"])
-    result = curs.fetchone()[0]
-
-    return result
-
-
-def insert_alert_query(reading: dict, alert_type_id: int, connection: "Connection") -> None:
-    """Adds an alert into the alert table."""
-
-    curs = connection.cursor()
-    plant_id = get_plant_id(connection, reading)
-    alert_sent_at = datetime.now()
-
-    if alert_type_id == 1:
-        alert_value = reading["avg_temp"]
-    if alert_type_id == 2:
-        alert_value = reading["avg_soil_moisture"]
-
-    insert_query = """ INSERT INTO alert
-                        (plant_id, sent_at, alert_type_id, alert_value)
-                        VALUES (?, ?, ?, ?); """
-
-    curs.execute(insert_query, (plant_id, alert_sent_at,
-                 alert_type_id, alert_value))
-
-    connection.commit()
-    curs.close()
-
-
-def temp_alert_required(reading: dict, connection: "Connection") -> bool:
-    """Checks if plants require an alert for temp."""
-
-    optimum_temp = [15, 30]
-
-    temp = reading["avg_temp"]
-
-    plant_id = get_plant_id(connection, reading)
-
-    temp_alert = not optimum_temp[0] <= temp <= optimum_temp[1]
-
-    if temp_alert:
-        if not recent_alert_sent(
-                plant_id, connection, 1):
-            return True
-
-    return False
-
-
-def soil_moisture_alert_required(reading: dict, connection: "Connection") -> bool:
-    """Checks if plants require an alert for soil moisture."""
-
-    soil_moisture_threshold = 20
-
-    soil_moisture = reading["avg_soil_moisture"]
-    plant_id = get_plant_id(connection, reading)
-
-    soil_moisture_alert = soil_moisture < soil_moisture_threshold
-
-    if soil_moisture_alert:
-        if not recent_alert_sent(
-                plant_id, connection, 2):
-            return True
-
-    return False
+    for plant_id, taken_at, temperature, soil_moisture in results:
+        ANOMALY_DETECTORS.observe(plant_id, to_datetime(taken_at), temperature, soil_moisture)
+
+
+def evaluate_alerts(connection: "Connection", now: datetime = None,
+                    on_alerts: "Callable[[list[dict]], None]" = None) -> list[dict]:
+    """Finds the plants that need alerts, records the alerts and returns the plants.
+
+    The readings are read once, every plant's rule is checked in one
+    vectorised pass alongside the anomalies its detectors flag, and the new
+    alerts are written in one batch, then the updated detectors and range
+    state, which keeps plants in alert within their rules' hysteresis. The
+    cooldowns are re-read every run, so alerts just sent by the pipeline's
+    push mode are not repeated. If given, on_alerts is handed the alerts
+    before they are recorded, so they are delivered before their cooldown
+    starts, and if it raises they are decided again next run."""
+
+    now = now or datetime.now()
+    ALERT_RULES.ensure_warm(connection)
+    ANOMALY_DETECTORS.ensure_warm(connection)
+    RANGE_STATE.ensure_warm(connection)
+    COOLDOWN_CACHE.warm(connection, now)
+    observe_latest_readings(connection)
+    plants = get_alert_state(connection, COOLDOWN_CACHE)
+    plant_ids = [plant["plant_id"] for plant in plants]
+    rules = ALERT_RULES.compile(plant_ids, [plant["scientific_name"] for plant in plants])
+    decisions, out_of_range = decide_alerts(
+        plants, now, rules, RANGE_STATE.get_active(plant_ids), COOLDOWN_CACHE.cooldowns,
+        ANOMALY_DETECTORS.get_anomalies(plant_ids))
+
+    alerts, to_insert = [], []
+    for plant, alert_type_ids in zip(plants, decisions):
+        if alert_type_ids:
+            to_insert.extend((plant, alert_type_id) for alert_type_id in alert_type_ids)
+            del plant["last_alerts"]
+            alerts.append(add_alert(plant, [ALERT_TYPE_NAMES[alert_type_id]
+                                            for alert_type_id in alert_type_ids]))
+    if on_alerts and alerts:
+        on_alerts(alerts)
+    insert_alerts(connection, to_insert, now)
+    ANOMALY_DETECTORS.clear_anomalies(plant_ids)
+    ANOMALY_DETECTORS.save(connection)
+    COOLDOWN_CACHE.record(((plant["plant_id"], alert_type_id)
+                           for plant, alert_type_id in to_insert), now)
+    RANGE_STATE.update(plant_ids, out_of_range)
+    RANGE_STATE.save(connection)
+
+    return alerts
 
 
 def make_html(data: list[dict]) -> str:
     """Converts the data into html to make the alert look better."""
-    start = f"""<!DOCTYPE html>
-                <html>
-                <body>
-
-                <h1> Plant Alerts </h1>
-            """
-    body = ""
-    for plant in data:
-        body += f"""
-                <h2> Plant {plant["plant_id"]} ({plant["plant_name"]}) </h2>
-
-                <h3> Sensor readings:</h3>
-                
-                <p> Average temperature over last 3 readings: {plant["avg_temp"]} </p>
-                <p> Average soil moisture over last 3 readings: {plant["avg_soil_moisture"]} </p>
-
-
-                <h3> Alert information:</h3>
-
-                <p> Alert sent at: {plant["alert_sent_at"]} </p>
-                <p> Alert type: {plant["alert_type"]} </p>
-                """
-
-    end = """</body>
-            </html>
-            """
-    return start+body+end
+    return render_digest(data)
 
 
 def add_alert(plant: dict, alert_type: list[str]) -> dict:
@@ -202,17 +149,5 @@ def add_alert(plant: dict, alert_type: list[str]) -> dict:
 if __name__ == "__main__":
     load_dotenv()
     conn = get_db_connection()
-    average_readings = get_last_three_readings(conn)
-    alerts = []
-
-    for plant in average_readings:
-        if temp_alert_required(plant, conn) and soil_moisture_alert_required(plant, conn):
-            alerts.append(add_alert(plant, ["temperature", "soil moisture"]))
-        elif temp_alert_required(plant, conn):
-            insert_alert_query(plant, 1, conn)
-            alerts.append(add_alert(plant, ["temperature"]))
-        elif soil_moisture_alert_required(plant, conn):
-            insert_alert_query(plant, 2, conn)
-            alerts.append(add_alert(plant, ["soil moisture"]))
-
+    evaluate_alerts(conn)
     conn.close()
@@ -0,0 +1,195 @@
+"""Alert digests for each botanist, rendered from precompiled templates.
+
+Each cycle's alerts are grouped by the botanists assigned to their plants in
+botanist_assignment, and each botanist gets one digest of all their plants.
+A botanist is sent at most one digest per DIGEST_MIN_INTERVAL_MINUTES, and
+alerts held back in the meantime go into their next digest."""
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from html import escape
+from os import environ as ENV
+from string import Formatter
+from typing import NamedTuple
+import logging
+
+
+LOGGER = logging.getLogger(__name__)
+
+DIGEST_SENDER = ENV.get("DIGEST_SENDER", "plant-alerts@lnhm.co.uk")
+DIGEST_FALLBACK_EMAIL = ENV.get("DIGEST_FALLBACK_EMAIL")
+DIGEST_MIN_INTERVAL = timedelta(minutes=float(ENV.get("DIGEST_MIN_INTERVAL_MINUTES", "0")))
+
+ASSIGNMENT_QUERY = """SELECT ba.plant_id, b.botanist_id, b.botanist_name, b.email
+                      FROM botanist_assignment AS ba
+                      JOIN botanist AS b ON b.botanist_id = ba.botanist_id"""
+
+
+class Botanist(NamedTuple):
+    """Who a digest is for."""
+    botanist_id: int
+    botanist_name: str
+    email: str
+
+
+class CompiledTemplate:
+    """A template split once into its literal text and field names, so rendering
+    only appends fragments to a list, which is joined once at the end.
+
+    Field values are HTML-escaped, as plant and botanist names come from the API."""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, text: str):
+        self.parts = [(literal, field)
+                      for literal, field, _, _ in Formatter().parse(text)]
+
+    def render_into(self, fragments: list[str], values: dict) -> None:
+        """Appends the template's fragments, with its fields filled from values."""
+        for literal, field in self.parts:
+            fragments.append(literal)
+            if field is not None:
+                fragments.append(escape(str(values[field])))
+
+
+PAGE_START = CompiledTemplate("""<!DOCTYPE html>
+<html>
+<body>
+
+<h1> Plant Alerts </h1>
+""")
+GREETING = CompiledTemplate("""
+<p> Hello {botanist_name}, {plant_count} of your plants need attention. </p>
+""")
+PLANT = CompiledTemplate("""
+<h2> Plant {plant_id} ({plant_name}) </h2>
+
+<h3> Sensor readings:</h3>
+
+<p> Average temperature over last 3 readings: {avg_temp} </p>
+<p> Average soil moisture over last 3 readings: {avg_soil_moisture} </p>
+
+<h3> Alert information:</h3>
+
+<p> Alert sent at: {alert_sent_at} </p>
+<p> Alert type: {alert_types} </p>
+""")
+PAGE_END = CompiledTemplate("""</body>
+</html>
+""")
+
+
+def render_digest(alerts: list[dict], botanist: Botanist = None) -> str:
+    """Renders alerted plants into one HTML page, greeting the botanist if given."""
+
+    fragments = []
+    PAGE_START.render_into(fragments, {})
+    if botanist:
+        GREETING.render_into(fragments, {"botanist_name": botanist.botanist_name,
+                                         "plant_count": len(alerts)})
+    for alert in alerts:
+        PLANT.render_into(fragments, {**alert, "alert_types": ", ".join(alert["alert_type"])})
+    PAGE_END.render_into(fragments, {})
+    return "".join(fragments)
+
+
+def make_message(botanist: Botanist, alerts: list[dict],
+                 sender: str = DIGEST_SENDER) -> EmailMessage:
+    """Makes the email of a botanist's digest."""
+
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = botanist.email
+    message["Subject"] = f"Plant alerts: {len(alerts)} of your plants need attention"
+    message.set_content(render_digest(alerts, botanist), subtype="html")
+    return message
+
+
+def get_assignments(connection: "Connection") -> dict[int, list[Botanist]]:
+    """Gets the botanists assigned to each plant, in one query."""
+
+    curs = connection.cursor()
+    try:
+        curs.execute(ASSIGNMENT_QUERY)
+        results = curs.fetchall()
+    finally:
+        curs.close()
+
+    assignments = {}
+    for plant_id, botanist_id, botanist_name, email in results:
+        assignments.setdefault(plant_id, []).append(Botanist(botanist_id, botanist_name, email))
+    return assignments
+
+
+def group_by_botanist(alerts: list[dict], assignments: dict[int, list[Botanist]],
+                      fallback_email: str = DIGEST_FALLBACK_EMAIL
+                      ) -> tuple[dict[Botanist, list[dict]], list[dict]]:
+    """Groups alerts by the botanists assigned to their plants.
+
+    Alerts for plants with no botanist go to the fallback address if one is
+    set. Returns the groups and the alerts no one was sent."""
+
+    groups, unassigned = {}, []
+    fallback = Botanist(None, "plant team", fallback_email) if fallback_email else None
+    for alert in alerts:
+        botanists = assignments.get(alert["plant_id"]) or ([fallback] if fallback else [])
+        if not botanists:
+            unassigned.append(alert)
+        for botanist in botanists:
+            groups.setdefault(botanist, []).append(alert)
+    return groups, unassigned
+
+
+class DigestQueue:
+    """Alerts waiting to go to each botanist, with when each was last sent a digest.
+
+    The queue lives at module level so it survives warm Lambda invocations.
+    A cold start loses held alerts, though they are still in the alert table."""
+
+    def __init__(self, min_interval: timedelta = DIGEST_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self.pending = {}
+        self.last_sent = {}
+
+    def add(self, groups: dict[Botanist, list[dict]]) -> None:
+        """Queues each botanist's alerts."""
+        for botanist, alerts in groups.items():
+            self.pending.setdefault(botanist, []).extend(alerts)
+
+    def take_due(self, now: datetime) -> dict[Botanist, list[dict]]:
+        """Takes the queued alerts of every botanist not sent a digest within the interval."""
+        due = {botanist: alerts for botanist, alerts in self.pending.items()
+               if botanist not in self.last_sent
+               or now - self.last_sent[botanist] >= self.min_interval}
+        for botanist in due:
+            del self.pending[botanist]
+        return due
+
+    def discard(self, alerts: list[dict]) -> None:
+        """Drops the given alerts from every botanist's queue, as they will be
+        decided again."""
+        dropped = {id(alert) for alert in alerts}
+        self.pending = {botanist: kept for botanist, queued in self.pending.items()
+                        if (kept := [alert for alert in queued if id(alert) not in dropped])}
+
+    def mark_sent(self, botanists: "Iterable[Botanist]", now: datetime) -> None:
+        """Starts the interval of each botanist sent a digest."""
+        self.last_sent.update((botanist, now) for botanist in botanists)
+
+
+DIGEST_QUEUE = DigestQueue()
+
+
+def collect_digests(connection: "Connection", alerts: list[dict], now: datetime = None,
+                    queue: DigestQueue = DIGEST_QUEUE) -> dict[Botanist, list[dict]]:
+    """Queues a cycle's alerts by botanist and takes the digests that are due.
+
+    Assignments are only read when there are alerts to group."""
+
+    now = now or datetime.now()
+    if alerts:
+        groups, unassigned = group_by_botanist(alerts, get_assignments(connection))
+        queue.add(groups)
+        if unassigned:
+            LOGGER.warning("No botanist for plants %s",
+                           sorted(alert["plant_id"] for alert in unassigned))
+    return queue.take_due(now)
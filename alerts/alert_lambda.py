@@ -1,35 +1,67 @@
 """Script that creates a lambda handler for the alert functionality."""
 
+import logging
+from logging import Logger
+
 from dotenv import load_dotenv
 
-from alert_data import (get_db_connection, get_last_three_readings,
-                        add_alert, make_html, temp_alert_required,
-                        soil_moisture_alert_required, insert_alert_query)
+from alert_data import DB_POOL, evaluate_alerts, make_html
+from alert_delivery import DeliveryError, deliver_alerts, get_sender
+
+SENDER = get_sender()
+
+
+def add_logger() -> Logger:
+    """Sets a logger that logs each run's connections and digests."""
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+    return logger
 
 
 def lambda_handler(event: dict, context: dict) -> dict:
-    """Makes a lambda handler."""
-
-    conn = get_db_connection()
-    last_three_readings = get_last_three_readings(conn)
-    alerts = []
-    for plant in last_three_readings:
-        if temp_alert_required(plant, conn) and soil_moisture_alert_required(plant, conn):
-            alerts.append(add_alert(plant, ["temperature", "soil moisture"]))
-        elif temp_alert_required(plant, conn):
-            insert_alert_query(plant, 1, conn)
-            alerts.append(add_alert(plant, ["temperature"]))
-        elif soil_moisture_alert_required(plant, conn):
-            insert_alert_query(plant, 2, conn)
-            alerts.append(add_alert(plant, ["soil moisture"]))
-
-    if alerts:
-        html = make_html(alerts)
-        conn.close()
-        return {"status_code": 200,
-                "message": html}
-    conn.close()
-    return {None: None}
+    """Makes a lambda handler.
+
+    With DIGEST_TRANSPORT set, each botanist with alerts due gets one digest,
+    sent before the alerts are recorded, so an alert whose digest could not
+    be sent is decided again next run. Without it, the alerts are returned
+    as one HTML page instead of sent."""
+
+    logger = add_logger()
+    results = []
+    with DB_POOL.connection() as conn:
+        if SENDER is None:
+            alerts = evaluate_alerts(conn)
+        else:
+            def deliver(alerts: list[dict]) -> None:
+                results.append(deliver_alerts(conn, alerts, SENDER))
+            try:
+                alerts = evaluate_alerts(conn, on_alerts=deliver)
+                if not alerts:
+                    deliver([])
+            except DeliveryError as error:
+                alerts = []
+                results.append(error.result)
+                logger.error("No digest could be sent, so no alerts were recorded: %s", error)
+
+    logger.info("Database connections: %s", DB_POOL.get_metrics())
+
+    if SENDER is None:
+        if alerts:
+            return {"status_code": 200,
+                    "message": make_html(alerts)}
+        return {None: None}
+
+    sent = sum(result.sent for result in results)
+    failed = sum(len(result.failed) for result in results)
+    if not sent + failed:
+        return {None: None}
+    logger.info("Digests sent: %s, failed: %s", sent, failed)
+    return {"status_code": 200 if sent else 502,
+            "alerts": len(alerts),
+            "digests_sent": sent,
+            "digests_failed": failed}
 
 
 if __name__ == "__main__":
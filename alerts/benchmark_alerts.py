@@ -0,0 +1,216 @@
+"""Benchmarks the per-plant alert checks against the single set-based alert query.
+
+A temporary SQLite database is seeded with plants, a reading per minute for
+each and some recent alerts, then both paths decide which alerts are needed.
+Neither path inserts alerts, so both see the same data on every repeat.
+The per-plant checks are the alerts Lambda's original ones, kept here only
+to be measured against.
+Run it with DB_BACKEND=sqlite, so the alert queries use SQLite syntax."""
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from alert_data import get_alert_state
+from alert_evaluator import COOLDOWN_CACHE, decide_alerts
+from alert_rules import ALERT_RULES, ALERT_TYPE_NAMES, OPTIMUM_TEMP, SOIL_MOISTURE_THRESHOLD
+from storage import BACKEND, SQLITE, SQLiteBackend
+
+
+SCHEMA_PATH = Path(__file__).parent.parent / "pipeline" / "schema.sql"
+
+
+def seed_database(connection: "Connection", plant_count: int, readings_per_plant: int,
+                  now: datetime) -> None:
+    """Fills the database with plants, their readings and an alert for every fifth
+    plant, and fills the latest_reading window as the pipeline would."""
+    rng = Random(0)
+    connection.execute("INSERT INTO country (country_name) VALUES ('Brazil')")
+    connection.execute("""INSERT INTO origin (latitude, longitude, city_name, country_id)
+                          VALUES (0, 0, 'Recife', 1)""")
+    connection.executemany("INSERT INTO plant (plant_name, origin_id) VALUES (?, 1)",
+                           [(f"Plant {plant_id}",) for plant_id in range(1, plant_count + 1)])
+    connection.executemany("""INSERT INTO sensor_reading
+                              (taken_at, temperature, last_watered, soil_moisture, plant_id)
+                              VALUES (?, ?, ?, ?, ?)""",
+                           [(now - timedelta(minutes=minute), rng.uniform(8, 35), now,
+                             rng.uniform(0, 100), plant_id)
+                            for plant_id in range(1, plant_count + 1)
+                            for minute in range(readings_per_plant)])
+    connection.executemany("""INSERT INTO alert (plant_id, alert_type_id, alert_value, sent_at)
+                              VALUES (?, ?, ?, ?)""",
+                           [(plant_id, 1 + plant_id % 2, 0, now - timedelta(minutes=30))
+                            for plant_id in range(1, plant_count + 1, 5)])
+    connection.execute("""INSERT INTO latest_reading
+                              (plant_id, taken_at, temperature, soil_moisture)
+                          SELECT plant_id, taken_at, temperature, soil_moisture
+                          FROM (
+                              SELECT plant_id, taken_at, temperature, soil_moisture,
+                              ROW_NUMBER() OVER (PARTITION BY plant_id
+                                                 ORDER BY taken_at DESC) AS reading_rank
+                              FROM sensor_reading)
+                          WHERE reading_rank <= 3""")
+    connection.commit()
+    connection.execute("ANALYZE")
+
+
+def get_last_three_readings(connection: "Connection") -> list[dict]:
+    """Gets the average of the last 3 recorded readings for temperature and soil moisture."""
+    query = """WITH ranked_readings as
+                (
+                SELECT 
+                    p.plant_id, 
+                    p.plant_name, 
+                    sr.temperature, 
+                    sr.soil_moisture, 
+                    sr.taken_at,
+                ROW_NUMBER() OVER (PARTITION BY p.plant_id ORDER BY taken_at DESC) AS rank
+                FROM plant AS p
+                JOIN sensor_reading AS sr
+                ON p.plant_id = sr.plant_id
+                )
+                SELECT plant_id, plant_name, AVG(temperature), AVG(soil_moisture) 
+                FROM ranked_readings
+                WHERE rank <= 3
+                GROUP BY plant_id, plant_name"""
+    curs = connection.cursor()
+    try:
+        curs.execute(query)
+        results = curs.fetchall()
+    finally:
+        curs.close()
+
+    avg_last_3_readings = []
+    for result in results:
+        avg_last_3_readings.append({
+            "plant_id": result[0], "plant_name": result[1],
+            "avg_temp": round(float(result[2]), 2),
+            "avg_soil_moisture": round(float(result[3]), 2)})
+
+    return avg_last_3_readings
+
+
+def recent_alert_sent(plant_id: int, connection: "Connection", alert_type_id: int) -> bool:
+    """
+    Checks if a recent alert was sent for the 
+    plant_id and alert type provided within the alert type's cooldown,
+    from the cooldown cache rather than a query per check.
+    """
+
+    COOLDOWN_CACHE.ensure_warm(connection)
+    return COOLDOWN_CACHE.is_cooling_down(plant_id, alert_type_id, datetime.now())
+
+
+def get_plant_id(connection: "Connection", plant_data: dict) -> dict:
+    """Gets the corresponding origin ID from database using longitude and latitude."""
+
+    curs = connection.cursor()
+
+    curs.execute(f"""SELECT plant_id
+                    FROM plant
+                    WHERE plant_name = ? AND plant_name = ? {BACKEND.case_sensitive}""",
+                 (plant_data["plant_name"], plant_data["plant_name"]))
+    result = curs.fetchone()[0]
+
+    return result
+
+
+def temp_alert_required(reading: dict, connection: "Connection") -> bool:
+    """Checks if plants require an alert for temp."""
+
+    optimum_temp = OPTIMUM_TEMP
+    temp = reading["avg_temp"]
+
+    plant_id = get_plant_id(connection, reading)
+
+    temp_alert = not optimum_temp[0] <= temp <= optimum_temp[1]
+
+    if temp_alert:
+        if not recent_alert_sent(
+                plant_id, connection, 1):
+            return True
+
+    return False
+
+
+def soil_moisture_alert_required(reading: dict, connection: "Connection") -> bool:
+    """Checks if plants require an alert for soil moisture."""
+
+    soil_moisture_threshold = SOIL_MOISTURE_THRESHOLD
+
+    soil_moisture = reading["avg_soil_moisture"]
+    plant_id = get_plant_id(connection, reading)
+
+    soil_moisture_alert = soil_moisture < soil_moisture_threshold
+
+    if soil_moisture_alert:
+        if not recent_alert_sent(
+                plant_id, connection, 2):
+            return True
+
+    return False
+
+
+def per_plant_alerts(connection: "Connection") -> list[tuple]:
+    """Decides alerts the old way, with the queries the if/elif chain ran for each plant."""
+    alerts = []
+    for plant in get_last_three_readings(connection):
+        if temp_alert_required(plant, connection) and soil_moisture_alert_required(
+                plant, connection):
+            alerts.append((plant["plant_id"], ["temperature", "soil moisture"]))
+        elif temp_alert_required(plant, connection):
+            alerts.append((plant["plant_id"], ["temperature"]))
+        elif soil_moisture_alert_required(plant, connection):
+            alerts.append((plant["plant_id"], ["soil moisture"]))
+    return alerts
+
+
+def set_based_alerts(connection: "Connection") -> list[tuple]:
+    """Decides alerts from one query, with every decision made in one vectorised pass."""
+    ALERT_RULES.ensure_warm(connection)
+    plants = get_alert_state(connection)
+    rules = ALERT_RULES.compile([plant["plant_id"] for plant in plants],
+                                [plant["scientific_name"] for plant in plants])
+    decisions, _ = decide_alerts(plants, datetime.now(), rules)
+    return [(plant["plant_id"], [ALERT_TYPE_NAMES[alert_type_id]
+                                 for alert_type_id in alert_type_ids])
+            for plant, alert_type_ids in zip(plants, decisions) if alert_type_ids]
+
+
+def measure(decide: "Callable", connection: "Connection", repeats: int) -> tuple[float, int]:
+    """Returns the median seconds and the number of queries one decision run takes,
+    counting the queries that warm the cooldown cache and rules."""
+    COOLDOWN_CACHE.clear()
+    statements = []
+    connection.set_trace_callback(statements.append)
+    decide(connection)
+    connection.set_trace_callback(None)
+
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        decide(connection)
+        times.append(perf_counter() - start)
+    return median(times), len(statements)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--plants", type=int, default=50)
+    parser.add_argument("--readings", type=int, default=1440,
+                        help="Readings per plant (one a minute)")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    if BACKEND.name != SQLITE:
+        parser.error("set DB_BACKEND=sqlite, as the seeded database is SQLite")
+
+    with TemporaryDirectory() as directory:
+        conn = SQLiteBackend(str(Path(directory) / "plants.db"), str(SCHEMA_PATH)).connect()
+        seed_database(conn, args.plants, args.readings, datetime.now())
+        for name, path in [("per plant", per_plant_alerts), ("set based", set_based_alerts)]:
+            seconds, queries = measure(path, conn, args.repeats)
+            print(f"{name:>9}: {seconds * 1000:8.1f} ms, {queries} queries")
+        conn.close()
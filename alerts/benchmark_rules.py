@@ -0,0 +1,83 @@
+"""Benchmarks per-plant rule checks against the compiled, vectorised alert rules.
+
+Random averages are made for a large number of plants of a few hundred
+species, with a rule per species and for some single plants."""
+from argparse import ArgumentParser
+from random import Random
+from statistics import median
+from time import perf_counter
+
+import numpy as np
+
+from alert_rules import SOIL_MOISTURE_ALERT, TEMP_ALERT, AlertRules, get_alert_masks
+
+
+SPECIES_COUNT = 300
+
+
+def make_rules(plant_count: int, rng: Random) -> AlertRules:
+    """Makes a default rule, a rule per species and a rule for one plant in a hundred."""
+    rows = [(None, None, 15, 30, 20, 100, 1, 2)]
+    rows += [(None, f"Species {species}", rng.uniform(5, 15), rng.uniform(25, 40),
+              rng.uniform(0, 30), 100, 1, 2) for species in range(SPECIES_COUNT)]
+    rows += [(plant_id, None, rng.uniform(5, 15), rng.uniform(25, 40), rng.uniform(0, 30),
+              100, 0, 0) for plant_id in range(0, plant_count, 100)]
+    rules = AlertRules()
+    rules.load(rows)
+    return rules
+
+
+def check_each_plant(rules: AlertRules, plant_ids: list, species: list,
+                     avg_temp: list, avg_soil_moisture: list) -> list[tuple[bool, bool]]:
+    """Checks one plant at a time against its rule."""
+    results = []
+    for plant_id, scientific_name, temp, soil_moisture in zip(plant_ids, species, avg_temp,
+                                                              avg_soil_moisture):
+        rule = rules.get_rule(plant_id, scientific_name)
+        results.append((not rule.min_temperature <= temp <= rule.max_temperature,
+                        not rule.min_soil_moisture <= soil_moisture <= rule.max_soil_moisture))
+    return results
+
+
+def time_median(run: "Callable", repeats: int) -> float:
+    """Returns the median seconds a call takes."""
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        run()
+        times.append(perf_counter() - start)
+    return median(times)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--plants", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    random = Random(0)
+    alert_rules = make_rules(args.plants, random)
+    ids = list(range(args.plants))
+    plant_species = [f"Species {random.randrange(SPECIES_COUNT)}" for _ in ids]
+    temps = [random.uniform(0, 45) for _ in ids]
+    soil_moistures = [random.uniform(0, 100) for _ in ids]
+    temp_array, soil_moisture_array = np.array(temps), np.array(soil_moistures)
+
+    compile_start = perf_counter()
+    compiled = alert_rules.compile(ids, plant_species)
+    compile_seconds = perf_counter() - compile_start
+
+    loop_seconds = time_median(lambda: check_each_plant(alert_rules, ids, plant_species,
+                                                        temps, soil_moistures), args.repeats)
+    vector_seconds = time_median(lambda: get_alert_masks(compiled, temp_array,
+                                                         soil_moisture_array), args.repeats)
+
+    masks = get_alert_masks(compiled, temp_array, soil_moisture_array)
+    assert [tuple(pair) for pair in zip(masks[TEMP_ALERT].tolist(),
+                                        masks[SOIL_MOISTURE_ALERT].tolist())] == \
+        check_each_plant(alert_rules, ids, plant_species, temps, soil_moistures)
+
+    print(f"{args.plants} plants")
+    print(f"   per plant: {loop_seconds * 1000:8.1f} ms")
+    print(f"     compile: {compile_seconds * 1000:8.1f} ms (once per set of plants)")
+    print(f"  vectorised: {vector_seconds * 1000:8.1f} ms")
@@ -0,0 +1,41 @@
+"""Factories shared by the alerts tests."""
+
+from datetime import datetime
+
+import pytest
+
+from alert_rules import SOIL_MOISTURE_ALERT, TEMP_ALERT
+
+NOW = datetime(2025, 6, 3, 12)
+
+
+@pytest.fixture(name="make_plant_state")
+def fixture_make_plant_state() -> "Callable[..., dict]":
+    """Gets a factory of plant alert state rows."""
+
+    def make_plant_state(avg_temp: float, avg_soil_moisture: float,
+                         last_temp_alert: datetime = None,
+                         last_soil_moisture_alert: datetime = None) -> dict:
+        """Makes a row of plant alert state as returned by get_alert_state."""
+
+        return {"plant_id": 1, "plant_name": "Epipremnum Aureum", "scientific_name": None,
+                "avg_temp": avg_temp, "avg_soil_moisture": avg_soil_moisture,
+                "temperature": avg_temp, "soil_moisture": avg_soil_moisture,
+                "last_alerts": {TEMP_ALERT: last_temp_alert,
+                                SOIL_MOISTURE_ALERT: last_soil_moisture_alert}}
+
+    return make_plant_state
+
+
+@pytest.fixture(name="make_alert")
+def fixture_make_alert() -> "Callable[..., dict]":
+    """Gets a factory of alerted plants."""
+
+    def make_alert(plant_id: int, plant_name: str = "Begonia") -> dict:
+        """Makes an alerted plant as evaluate_alerts returns them."""
+
+        return {"plant_id": plant_id, "plant_name": plant_name, "avg_temp": 31.0,
+                "avg_soil_moisture": 50.0, "alert_sent_at": NOW,
+                "alert_type": ["temperature"]}
+
+    return make_alert
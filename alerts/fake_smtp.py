@@ -0,0 +1,96 @@
+"""A local stand-in SMTP server, for sending alert digests offline.
+
+It accepts every message and keeps it, printing who it was for when run
+as a script. Only the commands smtplib uses to send mail are handled."""
+from argparse import ArgumentParser
+from email import message_from_bytes
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread
+
+
+class FakeSMTPServer(ThreadingTCPServer):
+    """A threaded SMTP server that keeps every message it is sent."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], verbose: bool = False):
+        super().__init__(address, FakeSMTPHandler)
+        self.verbose = verbose
+        self.messages = []
+        self.connections = 0
+        self.lock = Lock()
+
+    def keep(self, recipients: list[str], data: bytes) -> None:
+        """Keeps a received message."""
+        message = message_from_bytes(data)
+        with self.lock:
+            self.messages.append(message)
+        if self.verbose:
+            print(f"Message for {', '.join(recipients)}: {message['Subject']}")
+
+
+class FakeSMTPHandler(StreamRequestHandler):
+    """Answers one SMTP connection."""
+
+    def reply(self, line: str) -> None:
+        """Sends a reply line."""
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def read_data(self) -> bytes:
+        """Reads a message up to the line holding a single full stop."""
+        lines = []
+        for line in self.rfile:
+            if line.rstrip(b"\r\n") == b".":
+                break
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+    def handle(self) -> None:
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 localhost fake SMTP")
+        recipients = []
+        for line in self.rfile:
+            command = line.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 8BITMIME")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.server.keep(recipients, self.read_data())
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip(" <>"))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            elif verb in ("HELO", "MAIL", "RSET", "NOOP"):
+                recipients = [] if verb in ("MAIL", "RSET") else recipients
+                self.reply("250 OK")
+            else:
+                self.reply("502 Command not implemented")
+
+
+def start_server(port: int = 0, verbose: bool = False) -> FakeSMTPServer:
+    """Starts the fake SMTP server on a background thread, on a free port if none
+    is given, and returns the server."""
+    server = FakeSMTPServer(("127.0.0.1", port), verbose)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Runs a local stand-in SMTP server.")
+    parser.add_argument("--port", type=int, default=8025)
+    options = parser.parse_args()
+
+    fake_server = FakeSMTPServer(("127.0.0.1", options.port), verbose=True)
+    print(f"Accepting mail at 127.0.0.1:{options.port}")
+    try:
+        fake_server.serve_forever()
+    except KeyboardInterrupt:
+        fake_server.server_close()
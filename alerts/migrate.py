@@ -0,0 +1,94 @@
+"""Applies the versioned migrations in the migrations folder to the plants database.
+
+Migration files are named like 001_add_hot_path_indexes.sql and are applied
+in version order. Applied versions are recorded in the schema_migration table,
+so running this script again only applies new migrations."""
+from datetime import datetime
+from pathlib import Path
+import re
+
+from dotenv import load_dotenv
+
+from storage import BACKEND, DB_ERRORS, SQLITE, SQLiteBackend
+
+
+MIGRATIONS_PATH = Path(__file__).with_name("migrations")
+
+CREATE_MIGRATION_TABLE = """
+    CREATE TABLE schema_migration (
+        version SMALLINT NOT NULL,
+        migration_name VARCHAR(100) NOT NULL,
+        applied_at DATETIME2(0) NOT NULL,
+        PRIMARY KEY (version)
+    )"""
+
+
+def get_migrations(path: Path = MIGRATIONS_PATH) -> list[tuple[int, Path]]:
+    """Gets every migration file with its version number, in version order."""
+    migrations = []
+    for migration in path.glob("*.sql"):
+        match = re.match(r"(\d+)_", migration.name)
+        if match:
+            migrations.append((int(match.group(1)), migration))
+    return sorted(migrations)
+
+
+def split_statements(sql: str) -> list[str]:
+    """Splits a migration into its statements, dropping comment lines."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";")
+            if statement.strip()]
+
+
+def get_applied_versions(connection: "Connection") -> set[int]:
+    """Gets the versions already applied, creating the migration table if it is missing."""
+    curs = connection.cursor()
+    try:
+        curs.execute("SELECT version FROM schema_migration")
+        return {version for (version,) in curs.fetchall()}
+    except DB_ERRORS:
+        connection.rollback()
+        curs.execute(CREATE_MIGRATION_TABLE)
+        connection.commit()
+        return set()
+    finally:
+        curs.close()
+
+
+def apply_migration(connection: "Connection", version: int, migration: Path,
+                    backend: "SQLServerBackend | SQLiteBackend" = BACKEND) -> None:
+    """Runs every statement in a migration and records it as applied."""
+    curs = connection.cursor()
+    try:
+        for statement in split_statements(migration.read_text(encoding="utf-8")):
+            curs.execute(backend.translate(statement))
+        curs.execute("""INSERT INTO schema_migration (version, migration_name, applied_at)
+                        VALUES (?, ?, ?)""",
+                     (version, migration.stem, datetime.now().replace(microsecond=0)))
+        connection.commit()
+    except DB_ERRORS:
+        connection.rollback()
+        raise
+    finally:
+        curs.close()
+
+
+def migrate(connection: "Connection", path: Path = MIGRATIONS_PATH,
+            backend: "SQLServerBackend | SQLiteBackend" = BACKEND) -> list[str]:
+    """Applies every migration not yet applied, returning their names."""
+    applied = get_applied_versions(connection)
+    names = []
+    for version, migration in get_migrations(path):
+        if version not in applied:
+            apply_migration(connection, version, migration, backend)
+            names.append(migration.stem)
+    return names
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    main_backend = SQLiteBackend(auto_migrate=False) if BACKEND.name == SQLITE else BACKEND
+    conn = main_backend.connect()
+    applied_migrations = migrate(conn, backend=main_backend)
+    conn.close()
+    print(f"Applied {len(applied_migrations)} migrations: {applied_migrations}")
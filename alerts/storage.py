@@ -0,0 +1,243 @@
+"""Storage backends for the plants database.
+
+SQL Server is used in production. An embedded SQLite database, built from
+schema.sql and the migrations, can be used instead to run the pipeline and
+alerts locally. Choose one with the DB_BACKEND environment variable."""
+from datetime import datetime
+from os import environ as ENV
+from pathlib import Path
+import re
+import sqlite3
+
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+
+SQLSERVER = "sqlserver"
+SQLITE = "sqlite"
+
+SQLITE_PATH = ENV.get("SQLITE_PATH", "plants.db")
+SCHEMA_PATH = ENV.get("DB_SCHEMA_PATH", str(Path(__file__).with_name("schema.sql")))
+
+DB_ERRORS = (sqlite3.Error,) if pyodbc is None else (pyodbc.Error, sqlite3.Error)
+# Errors from the database being unreachable or busy, rather than from the data
+# sent to it, which are worth retrying later with the same data.
+TRANSIENT_DB_ERRORS = ((sqlite3.OperationalError, sqlite3.InterfaceError) if pyodbc is None
+                       else (pyodbc.OperationalError, pyodbc.InterfaceError,
+                             sqlite3.OperationalError, sqlite3.InterfaceError))
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+def translate_schema(schema: str) -> str:
+    """Converts the T-SQL in schema.sql and migrations into SQLite.
+
+    IDENTITY columns become INTEGER primary keys, which SQLite numbers
+    automatically, and trailing commas before a closing bracket are removed.
+    SQLite has no INCLUDE, so included columns are appended to the key of an
+    index, or dropped from a unique index where they would change the key."""
+    schema = re.sub(r"\w+ IDENTITY\(1,\s*1\)", "INTEGER", schema)
+    schema = re.sub(r",(\s*)\)", r"\1)", schema)
+    schema = re.sub(r"DROP INDEX (\w+) ON \w+", r"DROP INDEX \1", schema)
+    schema = re.sub(r"(CREATE UNIQUE INDEX[^;]*?\([^()]*\))\s*INCLUDE \([^()]*\)", r"\1", schema)
+    return re.sub(r"\(([^()]*)\)\s*INCLUDE \(([^()]*)\)", r"(\1, \2)", schema)
+
+
+class SQLServerBackend:
+    """The production SQL Server database, reached through pyodbc."""
+
+    name = SQLSERVER
+    case_sensitive = "COLLATE SQL_Latin1_General_CP1_CS_AS"
+    # Locks the key range a NOT EXISTS check reads until the transaction
+    # ends, so overlapping runs cannot both insert the same row.
+    key_lock = "WITH (UPDLOCK, HOLDLOCK)"
+
+    def connect(self, **options: str) -> "Connection":
+        """Gets a connection to the SQL Server plants database.
+
+        Any options, e.g. Encrypt="no", are added to the connection string."""
+        return pyodbc.connect(driver=ENV["DB_DRIVER"],
+                              server=ENV["DB_HOST"],
+                              database=ENV["DB_NAME"],
+                              TrustServerCertificate='yes',
+                              UID=ENV["DB_USER"],
+                              PWD=ENV["DB_PASSWORD"],
+                              **options)
+
+    @staticmethod
+    def translate(sql: str) -> str:
+        """Returns T-SQL unchanged, as schema.sql and migrations are written in it."""
+        return sql
+
+    @staticmethod
+    def explain(connection: "Connection", query: str, params: tuple = ()) -> list[str]:
+        """Gets the estimated plan SQL Server would use for a query, without running it."""
+        curs = connection.cursor()
+        curs.execute("SET SHOWPLAN_TEXT ON")
+        try:
+            curs.execute(query, params)
+            plan = []
+            while True:
+                plan.extend(row[0].strip() for row in curs.fetchall())
+                if not curs.nextset():
+                    return plan
+        finally:
+            curs.execute("SET SHOWPLAN_TEXT OFF")
+            curs.close()
+
+    @staticmethod
+    def staging_table(name: str) -> str:
+        """Gets the name of a temporary table private to the connection."""
+        return f"#{name}"
+
+    @staticmethod
+    def prepare_bulk_insert(curs: "Cursor") -> None:
+        """Makes executemany send all rows in one round trip."""
+        curs.fast_executemany = True
+
+    @staticmethod
+    def upsert_query(table: str, staging: str, keys: list[str], values: list[str]) -> str:
+        """Makes a statement that inserts staged rows, updating rows whose keys exist."""
+        columns = keys + values
+        matches = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+        updates = ", ".join(f"{value} = s.{value}" for value in values)
+        return f"""
+                MERGE {table} AS t
+                USING {staging} AS s
+                    ON {matches}
+                WHEN MATCHED THEN
+                    UPDATE SET {updates}
+                WHEN NOT MATCHED THEN
+                    INSERT ({', '.join(columns)})
+                    VALUES ({', '.join(f's.{column}' for column in columns)});
+                """
+
+    @staticmethod
+    def insert_new_query(table: str, staging: str, keys: list[str], columns: list[str]) -> str:
+        """Makes a statement that inserts staged rows, skipping any whose keys exist.
+
+        The key range is locked until the transaction ends, so overlapping
+        runs cannot both insert the same row."""
+        matches = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+        return f"""
+                INSERT INTO {table} ({', '.join(columns)})
+                SELECT {', '.join(f's.{column}' for column in columns)}
+                FROM {staging} AS s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} AS t {SQLServerBackend.key_lock}
+                    WHERE {matches})
+                """
+
+
+class SQLiteBackend:
+    """An embedded SQLite database file, created from schema.sql if it is new,
+    with the migrations next to schema.sql applied."""
+
+    name = SQLITE
+    case_sensitive = "COLLATE BINARY"
+    # A write transaction already locks the whole database file.
+    key_lock = ""
+
+    def __init__(self, path: str = SQLITE_PATH, schema_path: str = SCHEMA_PATH,
+                 auto_migrate: bool = True):
+        self.path = path
+        self.schema_path = schema_path
+        self.migrations_path = Path(schema_path).with_name("migrations")
+        self.auto_migrate = auto_migrate
+
+    def connect(self, **_options: str) -> sqlite3.Connection:
+        """Gets a connection to the SQLite plants database, creating its tables if needed.
+
+        Migrations the database has not had yet are applied, unless
+        auto_migrate is False, so it never lags the schema the code expects.
+        Connections may be used by any thread, as pooled connections are
+        handed to whichever load stage needs one. SQL Server connection
+        options are ignored."""
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        if not self.has_schema(connection) and Path(self.schema_path).exists():
+            self.create_schema(connection)
+        if self.auto_migrate and self.has_schema(connection) and self.migrations_path.is_dir():
+            self.migrate(connection)
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    def migrate(self, connection: sqlite3.Connection) -> list[str]:
+        """Applies the pending migrations with migrate.py, which imports this
+        module, so it is only imported when a database needs it."""
+        from migrate import migrate  # pylint: disable=import-outside-toplevel
+        return migrate(connection, self.migrations_path, self)
+
+    @staticmethod
+    def has_schema(connection: sqlite3.Connection) -> bool:
+        """Returns True if the plants tables already exist."""
+        return connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'plant'"
+        ).fetchone() is not None
+
+    def create_schema(self, connection: sqlite3.Connection) -> None:
+        """Creates every table from schema.sql."""
+        with open(self.schema_path, "r", encoding="utf-8") as f:
+            connection.executescript(self.translate(f.read()))
+        connection.commit()
+
+    @staticmethod
+    def translate(sql: str) -> str:
+        """Converts T-SQL from schema.sql or a migration into SQLite."""
+        return translate_schema(sql)
+
+    @staticmethod
+    def explain(connection: sqlite3.Connection, query: str, params: tuple = ()) -> list[str]:
+        """Gets the plan SQLite would use for a query, without running it."""
+        return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+    @staticmethod
+    def staging_table(name: str) -> str:
+        """Gets the name of a temporary table private to the connection."""
+        return f"temp.{name}"
+
+    @staticmethod
+    def prepare_bulk_insert(curs: sqlite3.Cursor) -> None:
+        """Does nothing, as SQLite executemany runs in process."""
+
+    @staticmethod
+    def upsert_query(table: str, staging: str, keys: list[str], values: list[str]) -> str:
+        """Makes a statement that inserts staged rows, updating rows whose keys exist."""
+        columns = ", ".join(keys + values)
+        updates = ", ".join(f"{value} = excluded.{value}" for value in values)
+        return f"""
+                INSERT INTO {table} ({columns})
+                SELECT {columns} FROM {staging} WHERE true
+                ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}
+                """
+
+    @staticmethod
+    def insert_new_query(table: str, staging: str, keys: list[str], columns: list[str]) -> str:
+        """Makes a statement that inserts staged rows, skipping any whose keys exist.
+
+        INSERT OR IGNORE is not used, as it would also skip rows that fail a
+        CHECK constraint."""
+        matches = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+        return f"""
+                INSERT INTO {table} ({', '.join(columns)})
+                SELECT {', '.join(f's.{column}' for column in columns)}
+                FROM {staging} AS s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} AS t
+                    WHERE {matches})
+                """
+
+
+BACKENDS = {SQLSERVER: SQLServerBackend, SQLITE: SQLiteBackend}
+
+
+def get_backend(name: str = None) -> "SQLServerBackend | SQLiteBackend":
+    """Gets the storage backend named by DB_BACKEND, SQL Server by default."""
+    name = name or ENV.get("DB_BACKEND", SQLSERVER)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND {name!r}, expected one of {list(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+BACKEND = get_backend()
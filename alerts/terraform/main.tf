@@ -38,6 +38,13 @@ data "aws_iam_policy_document" "lambda-role-permissions-policy-doc" {
       ]
       resources = [ "arn:aws:logs:eu-west-2:129033205317:*" ]
     }
+    statement {
+      effect = "Allow"
+      actions = [
+        "ses:SendRawEmail"
+      ]
+      resources = [ "*" ]
+    }
 }
 
 # Role
@@ -75,6 +82,8 @@ resource "aws_lambda_function" "simple-email-lambda" {
         DB_NAME = var.DB_NAME
         DB_SCHEMA = var.DB_SCHEMA
         DB_DRIVER = var.DB_DRIVER
+        DIGEST_TRANSPORT = var.DIGEST_TRANSPORT
+        DIGEST_SENDER = var.DIGEST_SENDER
     }
   }
 }
\ No newline at end of file
@@ -38,3 +38,13 @@ variable DB_SCHEMA {
 variable DB_DRIVER {
     type = string
 }
+
+variable DIGEST_TRANSPORT {
+    type = string
+    default = ""
+}
+
+variable DIGEST_SENDER {
+    type = string
+    default = "plant-alerts@lnhm.co.uk"
+}
@@ -1,118 +1,139 @@
 # pylint: disable=unused-argument
 """Tests for checking plant data for alerts."""
 
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
 
-from alert_data import temp_alert_required, soil_moisture_alert_required
+import pytest
 
-mock_conn = MagicMock()
-
-
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_temp_alert_required_temp_too_high(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the temp is too high."""
-
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 50, "avg_soil_moisture": 5.3}
-
-    assert temp_alert_required(plant, mock_conn)
+from alert_data import evaluate_alerts
+from alert_detectors import AnomalyDetectors
+from alert_evaluator import CooldownCache, RangeState, get_required_alerts
+from alert_rules import SOIL_MOISTURE_ALERT, TEMP_ALERT, AlertRules
 
+mock_conn = MagicMock()
+NOW = datetime(2025, 6, 3, 12)
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_temp_alert_required_temp_too_low(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the temp is too low."""
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 10, "avg_soil_moisture": 5.3}
+@pytest.mark.parametrize("avg_temp, avg_soil_moisture, alert_types", [
+    (50, 50, [TEMP_ALERT]), (10, 50, [TEMP_ALERT]), (25, 50, []), (15.0, 50, []),
+    (30.1, 50, [TEMP_ALERT]), (14.9, 50, [TEMP_ALERT]), (15.0, 19.9, [SOIL_MOISTURE_ALERT]),
+    (15.0, 0, [SOIL_MOISTURE_ALERT]), (15.0, 20.1, []), (15.0, 20.0, [])])
+def test_get_required_alerts_at_the_edges_of_the_default_ranges(avg_temp, avg_soil_moisture,
+                                                                alert_types, make_plant_state):
+    """Checks that a plant is alerted only outside the default ranges, not at their edges."""
 
-    assert temp_alert_required(plant, mock_conn)
+    assert get_required_alerts(make_plant_state(avg_temp, avg_soil_moisture), NOW) == alert_types
 
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_temp_alert_required_returns_false_temp_in_range(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the temp is within good range."""
+def test_get_required_alerts_returns_every_out_of_range_type(make_plant_state):
+    """Checks that a plant too hot and too dry needs both alerts."""
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 25, "avg_soil_moisture": 5.3}
+    assert get_required_alerts(make_plant_state(31, 19.9), NOW) == [
+        TEMP_ALERT, SOIL_MOISTURE_ALERT]
 
-    assert not temp_alert_required(plant, mock_conn)
 
+def test_get_required_alerts_returns_nothing_in_range(make_plant_state):
+    """Checks that a plant within both ranges needs no alerts."""
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_temp_alert_required_returns_false_temp_at_threshold(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the temp is at the lower threshold of good range."""
+    assert not get_required_alerts(make_plant_state(15.0, 20.0), NOW)
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 15.0, "avg_soil_moisture": 5.3}
 
-    assert not temp_alert_required(plant, mock_conn)
+def test_get_required_alerts_skips_alerts_sent_within_the_last_hour(make_plant_state):
+    """Checks that an alert sent recently is not repeated, but other types still are."""
 
+    plant = make_plant_state(31, 5, last_temp_alert=NOW - timedelta(minutes=59))
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_temp_alert_required_returns_true_temp_just_above_good_range(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the temp is just above upper threshold of good range."""
+    assert get_required_alerts(plant, NOW) == [SOIL_MOISTURE_ALERT]
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 30.1, "avg_soil_moisture": 5.3}
 
-    assert temp_alert_required(plant, mock_conn)
+def test_get_required_alerts_repeats_alerts_sent_over_an_hour_ago(make_plant_state):
+    """Checks that an alert is sent again once the last one is over an hour old."""
 
+    plant = make_plant_state(31, 50, last_temp_alert=NOW - timedelta(minutes=61))
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_temp_alert_required_returns_true_just_below_good_range(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the temp is just below lower threshold of good range."""
+    assert get_required_alerts(plant, NOW) == [TEMP_ALERT]
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 14.9, "avg_soil_moisture": 5.3}
 
-    assert temp_alert_required(plant, mock_conn)
+@patch("alert_data.observe_latest_readings")
+@patch("alert_data.ANOMALY_DETECTORS", AnomalyDetectors())
+@patch("alert_data.COOLDOWN_CACHE", CooldownCache())
+@patch("alert_data.RANGE_STATE", RangeState())
+@patch("alert_data.ALERT_RULES", AlertRules())
+@patch("alert_data.insert_alerts")
+@patch("alert_data.get_alert_state")
+def test_evaluate_alerts_inserts_every_required_alert_at_once(mock_state, mock_insert,
+                                                              mock_observe, make_plant_state):
+    """Checks that a plant needing both alerts gets both recorded in one insert."""
 
+    mock_state.return_value = [make_plant_state(31, 5), make_plant_state(20, 50)]
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_soil_moisture_alert_required_returns_true_just_too_low(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the soil moisture is just below lower threshold of good range."""
+    alerts = evaluate_alerts(mock_conn, NOW)
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 15.0, "avg_soil_moisture": 19.9}
+    assert [alert["alert_type"] for alert in alerts] == [["temperature", "soil moisture"]]
+    mock_insert.assert_called_once()
+    assert [alert_type_id for _, alert_type_id in mock_insert.call_args[0][1]] == [
+        TEMP_ALERT, SOIL_MOISTURE_ALERT]
 
-    assert soil_moisture_alert_required(plant, mock_conn)
 
+@patch("alert_data.observe_latest_readings")
+@patch("alert_data.ANOMALY_DETECTORS", AnomalyDetectors())
+@patch("alert_data.COOLDOWN_CACHE", CooldownCache())
+@patch("alert_data.ALERT_RULES", AlertRules())
+@patch("alert_data.RANGE_STATE", new_callable=RangeState)
+@patch("alert_data.insert_alerts")
+@patch("alert_data.get_alert_state")
+def test_evaluate_alerts_keeps_alerting_within_the_hysteresis(mock_state, mock_insert,
+                                                              mock_range_state, mock_observe,
+                                                              make_plant_state):
+    """Checks that a plant saved as out of range, such as by the pipeline before this
+    Lambda's cold start, stays in alert until it is back inside its range by the margin."""
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_soil_moisture_alert_required_returns_true_zero_reading(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the soil moisture is at lower threshold of good range."""
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.side_effect = [
+        [(None, None, 15, 30, 0, 100, 2, 0)], [], [(1, TEMP_ALERT, True)], [], []]
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 15.0, "avg_soil_moisture": 0}
+    mock_state.return_value = [make_plant_state(29, 50)]
+    assert evaluate_alerts(connection, NOW)[0]["alert_type"] == ["temperature"]
+    mock_state.return_value = [make_plant_state(27, 50)]
+    assert not evaluate_alerts(connection, NOW)
+    assert not mock_range_state.out_of_range[(1, TEMP_ALERT)]
 
-    assert soil_moisture_alert_required(plant, mock_conn)
 
+@patch("alert_data.observe_latest_readings")
+@patch("alert_data.ANOMALY_DETECTORS", AnomalyDetectors())
+@patch("alert_data.COOLDOWN_CACHE", CooldownCache())
+@patch("alert_data.ALERT_RULES", AlertRules())
+@patch("alert_data.RANGE_STATE", RangeState())
+@patch("alert_data.get_alert_state")
+def test_evaluate_alerts_rereads_cooldowns_for_alerts_sent_by_the_pipeline(mock_state,
+                                                                           mock_observe,
+                                                                           make_plant_state):
+    """Checks that an alert the pipeline recorded since the last run is not sent again."""
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_soil_moisture_alert_required_returns_false_in_good_range(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the soil moisture is just inside good range."""
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.side_effect = [
+        [], [], [], [(1, TEMP_ALERT, NOW - timedelta(minutes=1))]]
+    mock_state.side_effect = lambda conn, cooldowns: [
+        {**make_plant_state(31, 50), "last_alerts": cooldowns.get_last_alerts(1)}]
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 15.0, "avg_soil_moisture": 20.1}
+    assert not evaluate_alerts(connection, NOW)
 
-    assert not soil_moisture_alert_required(plant, mock_conn)
 
+@patch("alert_data.observe_latest_readings")
+@patch("alert_data.ANOMALY_DETECTORS", AnomalyDetectors())
+@patch("alert_data.COOLDOWN_CACHE", CooldownCache())
+@patch("alert_data.RANGE_STATE", RangeState())
+@patch("alert_data.ALERT_RULES", AlertRules())
+@patch("alert_data.insert_alerts")
+@patch("alert_data.get_alert_state")
+def test_evaluate_alerts_delivers_alerts_before_recording_them(mock_state, mock_insert,
+                                                               mock_observe, make_plant_state):
+    """Checks that alerts which fail to be delivered are neither recorded nor cooled down."""
 
-@patch("alert_data.recent_alert_sent", return_value=False)
-def test_soil_moisture_alert_required_returns_false_at_threshold(self):
-    """Checks that the function identifies a plant as needed
-    a temperature alert when the soil moisture is at lower threshold of good range."""
+    mock_state.return_value = [make_plant_state(31, 50)]
 
-    plant = {"plant_id": "", "plant_name": "",
-             "avg_temp": 15.0, "avg_soil_moisture": 20.0}
+    with pytest.raises(OSError):
+        evaluate_alerts(mock_conn, NOW, on_alerts=MagicMock(side_effect=OSError("down")))
 
-    assert not soil_moisture_alert_required(plant, mock_conn)
+    mock_insert.assert_not_called()
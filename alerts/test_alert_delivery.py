@@ -0,0 +1,141 @@
+"""Tests for the batched digest delivery, against the local fake SMTP server."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from time import monotonic
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from alert_delivery import (DeliveryError, RateLimiter, SMTPSender, deliver_alerts, get_sender,
+                            send_batches, send_digests)
+from alert_digest import Botanist, DigestQueue
+from fake_smtp import start_server
+
+NOW = datetime(2025, 6, 3, 12)
+
+
+@pytest.fixture(name="smtp_server")
+def fixture_smtp_server():
+    """Starts a fake SMTP server for the duration of a test."""
+
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_messages(count: int) -> list[EmailMessage]:
+    """Makes simple messages to numbered addresses."""
+
+    messages = []
+    for number in range(count):
+        message = EmailMessage()
+        message["From"] = "alerts@lnhm.co.uk"
+        message["To"] = f"botanist{number}@lnhm.co.uk"
+        message["Subject"] = "Plant alerts"
+        message.set_content("<p>Alert</p>", subtype="html")
+        messages.append(message)
+    return messages
+
+
+def test_send_batches_uses_one_connection_per_batch(smtp_server):
+
+    sender = SMTPSender("127.0.0.1", smtp_server.server_address[1])
+
+    result = asyncio.run(send_batches(sender, make_messages(5), batch_size=2,
+                                      limiter=RateLimiter(rate=0)))
+
+    assert result.sent == 5
+    assert smtp_server.connections == 3
+    assert sorted(message["To"] for message in smtp_server.messages) == [
+        f"botanist{number}@lnhm.co.uk" for number in range(5)]
+
+
+def test_send_batches_counts_an_unreachable_server_as_failed(smtp_server):
+
+    port = smtp_server.server_address[1]
+    smtp_server.shutdown()
+    smtp_server.server_close()
+
+    result = asyncio.run(send_batches(SMTPSender("127.0.0.1", port, timeout=1),
+                                      make_messages(3), limiter=RateLimiter(rate=0)))
+
+    assert result.sent == 0
+    assert len(result.failed) == 3
+
+
+def test_rate_limiter_spaces_out_each_message_across_threads():
+    """Checks that messages sent from several threads still go out one interval apart."""
+
+    limiter = RateLimiter(rate=100)
+    start = monotonic()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(lambda _: limiter.acquire(), range(6)))
+
+    assert monotonic() - start >= 0.045
+
+
+def test_send_batches_spaces_out_the_messages_of_a_batch(smtp_server):
+    """Checks that a batch is paced message by message rather than sent in a burst."""
+
+    sender = SMTPSender("127.0.0.1", smtp_server.server_address[1])
+    start = monotonic()
+
+    asyncio.run(send_batches(sender, make_messages(4), batch_size=4,
+                             limiter=RateLimiter(rate=50)))
+
+    assert monotonic() - start >= 0.055
+
+
+def test_send_digests_requeues_alerts_of_failed_digests(smtp_server, make_alert):
+    """Checks that sent botanists start their interval and failed ones are kept for next time."""
+
+    alice = Botanist(1, "Alice", "alice@lnhm.co.uk")
+    bob = Botanist(2, "Bob", "bob@lnhm.co.uk")
+    queue = DigestQueue()
+
+    class RefusesBob(SMTPSender):
+        """Refuses every message to Bob."""
+
+        def send_batch(self, messages, limiter=None):
+            failed = [message for message in messages if message["To"] == bob.email]
+            super().send_batch([message for message in messages if message not in failed],
+                               limiter)
+            return failed
+
+    sender = RefusesBob("127.0.0.1", smtp_server.server_address[1])
+    result = send_digests({alice: [make_alert(1)], bob: [make_alert(2)]}, sender, NOW, queue)
+
+    assert result.sent == 1
+    assert queue.last_sent == {alice: NOW}
+    assert queue.pending == {bob: [make_alert(2)]}
+
+
+@patch("alert_digest.get_assignments")
+def test_deliver_alerts_takes_back_alerts_when_no_digest_is_sent(mock_assignments,
+                                                                 smtp_server, make_alert):
+    """Checks that when the mail server is down the cycle's alerts are dropped from the
+    queue and DeliveryError is raised, so they are not recorded and are decided again."""
+
+    mock_assignments.return_value = {1: [Botanist(1, "Alice", "alice@lnhm.co.uk")]}
+    port = smtp_server.server_address[1]
+    smtp_server.shutdown()
+    smtp_server.server_close()
+    queue = DigestQueue()
+
+    with pytest.raises(DeliveryError):
+        deliver_alerts(MagicMock(), [make_alert(1)], SMTPSender("127.0.0.1", port, timeout=1),
+                       NOW, queue)
+
+    assert not queue.pending
+
+
+def test_get_sender_rejects_unknown_transports():
+
+    assert get_sender("") is None
+    assert isinstance(get_sender("smtp"), SMTPSender)
+    with pytest.raises(ValueError):
+        get_sender("pigeon")
@@ -0,0 +1,101 @@
+"""Tests for the streaming anomaly detectors."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from alert_detectors import AnomalyDetectors, DetectorSettings, SeriesDetector
+from alert_rules import SOIL_MOISTURE_ANOMALY_ALERT, TEMP_ANOMALY_ALERT
+
+START = datetime(2025, 6, 3, 12)
+SETTINGS = DetectorSettings(max_rate=2, min_std=0.5, alpha=0.1, z_limit=4, warmup=10)
+
+
+def minutes_later(minutes: int) -> datetime:
+    """Gets a time the given number of minutes after START."""
+
+    return START + timedelta(minutes=minutes)
+
+
+def feed(detector: SeriesDetector, values: list[float]) -> list[bool]:
+    """Adds a reading a minute for each value, returning which were anomalies."""
+
+    return [detector.update(minutes_later(minute), value, SETTINGS)
+            for minute, value in enumerate(values)]
+
+
+def test_steady_readings_are_not_anomalies():
+
+    detector = SeriesDetector()
+
+    assert not any(feed(detector, [20 + 0.3 * (minute % 3) for minute in range(30)]))
+    assert 20 < detector.mean < 20.6
+
+
+def test_spike_is_an_anomaly_once_warmed_up():
+    """Checks that a jump far outside the usual spread is flagged, but not while warming up."""
+
+    assert not feed(SeriesDetector(), [20, 20, 30])[-1]
+    assert feed(SeriesDetector(), [20] * 15 + [30])[-1]
+
+
+def test_steady_drift_is_an_anomaly():
+    """Checks that readings rising faster than the rate limit are flagged."""
+
+    flags = feed(SeriesDetector(), [20 + 3 * minute for minute in range(15)])
+
+    assert not flags[1]
+    assert flags[-1]
+
+
+def test_repeated_and_late_readings_are_ignored():
+
+    detector = SeriesDetector()
+    feed(detector, [20, 21])
+    state = detector.to_row()
+
+    assert not detector.update(minutes_later(1), 90, SETTINGS)
+    assert not detector.update(minutes_later(0), 90, SETTINGS)
+    assert detector.to_row() == state
+
+
+def test_detectors_round_trip_through_rows():
+    """Checks that state saved as rows, with SQLite's text timestamps, carries on unchanged."""
+
+    detectors = AnomalyDetectors()
+    detectors.observe(1, START, 20, 50)
+    detectors.observe(1, minutes_later(1), 21, 49)
+    rows = [(*row[:-1], row[-1].isoformat(" ")) for row in detectors.to_rows()]
+
+    restored = AnomalyDetectors()
+    restored.load(rows)
+
+    assert restored.to_rows() == detectors.to_rows()
+
+
+def test_get_anomalies_lines_up_flags_with_plants_until_they_are_cleared():
+
+    detectors = AnomalyDetectors()
+    detectors.flagged = {2: {TEMP_ANOMALY_ALERT}, 3: {TEMP_ANOMALY_ALERT}}
+
+    anomalies = detectors.get_anomalies([1, 2])
+
+    assert anomalies[TEMP_ANOMALY_ALERT].tolist() == [False, True]
+    assert anomalies[SOIL_MOISTURE_ANOMALY_ALERT].tolist() == [False, False]
+    assert detectors.get_anomalies([2])[TEMP_ANOMALY_ALERT].tolist() == [True]
+    detectors.clear_anomalies([1, 2])
+    assert detectors.flagged == {3: {TEMP_ANOMALY_ALERT}}
+
+
+def test_save_upserts_only_changed_plants():
+
+    detectors = AnomalyDetectors()
+    detectors.load([(1, TEMP_ANOMALY_ALERT, 5, 20, 1, 0, 20, START)])
+    detectors.observe(2, START, 20, 50)
+    connection = MagicMock()
+
+    detectors.save(connection)
+
+    rows = connection.cursor.return_value.executemany.call_args.args[1]
+    assert {row[:2] for row in rows} == {(2, TEMP_ANOMALY_ALERT), (2, SOIL_MOISTURE_ANOMALY_ALERT)}
+    connection.commit.assert_called_once()
+    assert not detectors.changed
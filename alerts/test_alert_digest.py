@@ -0,0 +1,84 @@
+"""Tests for the per-botanist alert digests."""
+
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from alert_digest import (Botanist, CompiledTemplate, DigestQueue, collect_digests,
+                          group_by_botanist, make_message, render_digest)
+
+NOW = datetime(2025, 6, 3, 12)
+ALICE = Botanist(1, "Alice", "alice@lnhm.co.uk")
+BOB = Botanist(2, "Bob", "bob@lnhm.co.uk")
+
+
+def test_compiled_template_escapes_fields():
+
+    fragments = []
+    CompiledTemplate("<p>{name}</p>").render_into(fragments, {"name": "<Fern & co>"})
+
+    assert "".join(fragments) == "<p>&lt;Fern &amp; co&gt;</p>"
+
+
+def test_render_digest_lists_every_plant_for_the_botanist(make_alert):
+
+    html = render_digest([make_alert(1), make_alert(2, "Orchid")], ALICE)
+
+    assert "Hello Alice, 2 of your plants need attention" in html
+    assert "Plant 2 (Orchid)" in html
+    assert html.endswith("</html>\n")
+
+
+def test_make_message_is_addressed_to_the_botanist(make_alert):
+
+    message = make_message(ALICE, [make_alert(1)], sender="alerts@lnhm.co.uk")
+
+    assert message["To"] == "alice@lnhm.co.uk"
+    assert message.get_content_subtype() == "html"
+
+
+def test_group_by_botanist_sends_one_digest_per_botanist(make_alert):
+    """Checks that a plant with two botanists is in both digests, and unowned plants are kept."""
+
+    assignments = {1: [ALICE], 2: [ALICE, BOB]}
+
+    groups, unassigned = group_by_botanist([make_alert(1), make_alert(2), make_alert(3)],
+                                           assignments, fallback_email=None)
+
+    assert {botanist: [alert["plant_id"] for alert in alerts]
+            for botanist, alerts in groups.items()} == {ALICE: [1, 2], BOB: [2]}
+    assert [alert["plant_id"] for alert in unassigned] == [3]
+
+
+def test_group_by_botanist_sends_unowned_plants_to_the_fallback(make_alert):
+
+    groups, unassigned = group_by_botanist([make_alert(3)], {}, fallback_email="team@lnhm.co.uk")
+
+    assert [botanist.email for botanist in groups] == ["team@lnhm.co.uk"]
+    assert not unassigned
+
+
+def test_queue_holds_alerts_until_the_botanists_interval_is_over(make_alert):
+    """Checks that a botanist gets no second digest within the interval, then gets both alerts."""
+
+    queue = DigestQueue(min_interval=timedelta(minutes=15))
+    queue.add({ALICE: [make_alert(1)]})
+    queue.mark_sent(queue.take_due(NOW), NOW)
+
+    queue.add({ALICE: [make_alert(2)], BOB: [make_alert(2)]})
+    assert list(queue.take_due(NOW + timedelta(minutes=5))) == [BOB]
+    queue.add({ALICE: [make_alert(3)]})
+
+    due = queue.take_due(NOW + timedelta(minutes=15))
+    assert [alert["plant_id"] for alert in due[ALICE]] == [2, 3]
+    assert not queue.pending
+
+
+def test_collect_digests_only_reads_assignments_when_there_are_alerts(make_alert):
+
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.return_value = [(1, 1, "Alice", "alice@lnhm.co.uk")]
+    queue = DigestQueue()
+
+    assert not collect_digests(connection, [], NOW, queue)
+    connection.cursor.assert_not_called()
+    assert collect_digests(connection, [make_alert(1)], NOW, queue) == {ALICE: [make_alert(1)]}
@@ -0,0 +1,256 @@
+"""Tests for the rolling alert state."""
+
+from datetime import datetime, timedelta
+from time import monotonic
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from alert_detectors import AnomalyDetectors
+from alert_evaluator import AlertEvaluator, CooldownCache, PlantWindow, RangeState
+from alert_rules import SOIL_MOISTURE_ALERT, TEMP_ALERT, AlertRules
+
+NOW = datetime(2025, 6, 3, 12)
+
+
+def minutes_ago(minutes: int) -> datetime:
+    """Gets a time the given number of minutes before NOW."""
+
+    return NOW - timedelta(minutes=minutes)
+
+
+def test_plant_window_keeps_running_sums_of_the_newest_readings():
+    """Checks that the oldest reading leaves the window and its sums once it is full."""
+
+    window = PlantWindow(size=3)
+    for minute, temperature in enumerate([10, 20, 30, 40]):
+        window.add(minutes_ago(10 - minute), temperature, 50)
+
+    assert [reading[1] for reading in window.readings] == [20, 30, 40]
+    assert window.get_averages() == (30.0, 50.0)
+
+
+def test_plant_window_ignores_repeated_and_late_readings():
+    """Checks that a reading already in the window, or older than a full window, is ignored."""
+
+    window = PlantWindow(size=2)
+    window.add(minutes_ago(2), 10, 50)
+    window.add(minutes_ago(1), 20, 50)
+    window.add(minutes_ago(1), 20, 50)
+    window.add(minutes_ago(5), 90, 50)
+
+    assert window.get_averages() == (15.0, 50.0)
+
+
+def test_plant_window_orders_out_of_order_readings():
+    """Checks that a reading arriving before a newer one still leaves in time order."""
+
+    window = PlantWindow(size=2)
+    window.add(minutes_ago(1), 20, 50)
+    window.add(minutes_ago(2), 10, 50)
+    window.add(minutes_ago(0), 30, 50)
+
+    assert window.get_averages() == (25.0, 50.0)
+
+
+def test_evaluate_only_checks_plants_with_new_readings():
+    """Checks that plants without new readings are not alerted again."""
+
+    evaluator = AlertEvaluator(rules=AlertRules(), cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+    evaluator.observe([(1, "Begonia", minutes_ago(1), 40, 50)])
+    connection = MagicMock()
+
+    assert [alert["plant_id"] for alert in evaluator.evaluate(connection, NOW)] == [1]
+    assert not evaluator.evaluate(connection, NOW)
+
+
+def test_evaluate_records_alerts_and_starts_their_cooldown():
+    """Checks that alerts are inserted in one batch and not repeated within the hour."""
+
+    evaluator = AlertEvaluator(rules=AlertRules(), cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+    evaluator.observe([(1, "Begonia", minutes_ago(1), 40, 5)])
+    connection = MagicMock()
+
+    alerts = evaluator.evaluate(connection, NOW)
+
+    assert alerts[0]["alert_type"] == ["temperature", "soil moisture"]
+    assert len(connection.cursor.return_value.executemany.call_args.args[1]) == 2
+    assert evaluator.cooldowns.last_sent == {(1, TEMP_ALERT): NOW, (1, SOIL_MOISTURE_ALERT): NOW}
+    connection.cursor.return_value.fetchall.return_value = [(1, TEMP_ALERT, NOW),
+                                                            (1, SOIL_MOISTURE_ALERT, NOW)]
+    evaluator.observe([(1, "Begonia", NOW, 40, 5)])
+    assert not evaluator.evaluate(connection, NOW + timedelta(minutes=30))
+
+
+def test_evaluate_rereads_cooldowns_for_alerts_sent_by_the_other_lambda():
+    """Checks that an alert the alerts Lambda has just recorded is not sent again."""
+
+    evaluator = AlertEvaluator(rules=AlertRules(), cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+    evaluator.cooldowns.warmed_at = monotonic()
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.return_value = [(1, TEMP_ALERT, minutes_ago(1))]
+    evaluator.observe([(1, "Begonia", minutes_ago(1), 40, 50)])
+
+    assert not evaluator.evaluate(connection, NOW)
+
+
+def test_evaluate_delivers_alerts_before_starting_their_cooldown():
+    """Checks that alerts which fail to be delivered are neither recorded nor cooled down."""
+
+    evaluator = AlertEvaluator(rules=AlertRules(), cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+    evaluator.observe([(1, "Begonia", minutes_ago(1), 40, 5)])
+    connection = MagicMock()
+    delivery = MagicMock(side_effect=OSError("mail server down"))
+
+    with pytest.raises(OSError):
+        evaluator.evaluate(connection, NOW, on_alerts=delivery)
+
+    connection.cursor.return_value.executemany.assert_not_called()
+    assert not evaluator.cooldowns.last_sent
+    delivery.side_effect = None
+    assert evaluator.evaluate(connection, NOW, on_alerts=delivery)
+    assert delivery.call_args.args[0][0]["plant_id"] == 1
+
+
+def test_warm_loads_windows_last_alerts_and_range_state():
+    """Checks that warming reads readings, alerts and which plants were out of range,
+    with SQLite's text timestamps."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.side_effect = [
+        [],
+        [(1, "Begonia", "Begonia x")],
+        [(1, "Begonia", "2025-06-03 11:58:00", 40, 50),
+         (1, "Begonia", "2025-06-03 11:59:00", 30, 50)],
+        [(1, TEMP_ALERT, datetime.now().isoformat(" "))],
+        [(None, "Begonia x", 10, 40, 20, 100, 0, 0)],
+        [(1, TEMP_ALERT, True)]]
+    evaluator = AlertEvaluator(rules=AlertRules(), cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+
+    evaluator.warm(connection)
+
+    assert evaluator.get_plant_state(1)["avg_temp"] == 35.0
+    assert evaluator.rules.get_rule(1, "Begonia x").max_temperature == 40
+    assert evaluator.range_state.get_active([1, 2])[TEMP_ALERT].tolist() == [True, False]
+    assert evaluator.cooldowns.get_last_sent(1, TEMP_ALERT) is not None
+    assert not evaluator.changed
+    assert not evaluator.is_stale()
+
+
+def test_evaluate_keeps_alerting_within_the_hysteresis():
+    """Checks that a plant stays in alert until it is back inside its range by the margin."""
+
+    rules = AlertRules()
+    rules.load([(None, None, 15, 30, 0, 100, 2, 0)])
+    evaluator = AlertEvaluator(rules=rules, cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+    connection = MagicMock()
+
+    evaluator.observe([(1, "Begonia", minutes_ago(120), 31, 50)])
+    assert evaluator.evaluate(connection, minutes_ago(120))
+    for minute in (119, 118):
+        evaluator.observe([(1, "Begonia", minutes_ago(minute), 29, 50)])
+    assert evaluator.evaluate(connection, NOW)
+    evaluator.observe([(1, "Begonia", minutes_ago(1), 20, 50)])
+    evaluator.evaluate(connection, NOW)
+
+    assert not evaluator.range_state.out_of_range[(1, TEMP_ALERT)]
+
+
+def test_range_state_saves_only_changed_plants():
+    """Checks that only plants whose range state changed are written back."""
+
+    range_state = RangeState()
+    range_state.update([1, 2], {TEMP_ALERT: np.array([True, False]),
+                                SOIL_MOISTURE_ALERT: np.array([False, False])})
+    connection = MagicMock()
+
+    range_state.save(connection)
+
+    assert connection.cursor.return_value.executemany.call_args.args[1] == [(1, TEMP_ALERT, True)]
+    connection.commit.assert_called_once()
+    assert not range_state.changed
+
+
+def test_cooldown_cache_uses_each_alert_types_cooldown():
+    """Checks that each alert type is held back for its own cooldown."""
+
+    cache = CooldownCache({TEMP_ALERT: timedelta(hours=1),
+                           SOIL_MOISTURE_ALERT: timedelta(minutes=10)})
+    cache.record([(1, TEMP_ALERT), (1, SOIL_MOISTURE_ALERT)], minutes_ago(30))
+
+    assert cache.is_cooling_down(1, TEMP_ALERT, NOW)
+    assert not cache.is_cooling_down(1, SOIL_MOISTURE_ALERT, NOW)
+    assert not cache.is_cooling_down(2, TEMP_ALERT, NOW)
+
+
+def test_cooldown_cache_evicts_alerts_once_their_cooldown_is_over():
+    """Checks that alerts past their cooldown are dropped from the cache."""
+
+    cache = CooldownCache({TEMP_ALERT: timedelta(hours=1),
+                           SOIL_MOISTURE_ALERT: timedelta(hours=1)})
+    cache.record([(1, TEMP_ALERT)], minutes_ago(61))
+    cache.record([(2, TEMP_ALERT)], minutes_ago(59))
+
+    cache.evict(NOW)
+
+    assert cache.last_sent == {(2, TEMP_ALERT): minutes_ago(59)}
+
+
+def test_cooldown_cache_warms_from_alerts_within_the_longest_cooldown():
+    """Checks that warming reads only recent alerts, with SQLite's text timestamps."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.return_value = [
+        (1, TEMP_ALERT, "2025-06-03 11:30:00"), (2, SOIL_MOISTURE_ALERT, "2025-06-03 11:55:00")]
+    cache = CooldownCache({TEMP_ALERT: timedelta(hours=2),
+                           SOIL_MOISTURE_ALERT: timedelta(minutes=10)})
+
+    cache.warm(connection, NOW)
+
+    assert connection.cursor.return_value.execute.call_args.args[1] == (minutes_ago(120),)
+    assert cache.get_last_sent(1, TEMP_ALERT) == minutes_ago(30)
+    assert cache.get_last_sent(1, SOIL_MOISTURE_ALERT) is None
+    assert cache.is_cooling_down(2, SOIL_MOISTURE_ALERT, NOW)
+    assert not cache.is_stale()
+
+
+def test_evaluate_alerts_anomalies_alongside_the_rules():
+    """Checks that a spike inside the plant's range is alerted as an anomaly."""
+
+    evaluator = AlertEvaluator(rules=AlertRules(), cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+    connection = MagicMock()
+    evaluator.observe([(1, "Begonia", minutes_ago(minute), 20, 50)
+                       for minute in range(20, 0, -1)])
+    evaluator.evaluate(connection, NOW)
+
+    evaluator.observe([(1, "Begonia", NOW, 29, 50)])
+
+    assert evaluator.evaluate(connection, NOW)[0]["alert_type"] == ["temperature anomaly"]
+
+
+def test_evaluate_keeps_anomalies_whose_alerts_fail_to_be_delivered():
+    """Checks that an anomaly is alerted again once delivery is back."""
+
+    evaluator = AlertEvaluator(rules=AlertRules(), cooldowns=CooldownCache(),
+                               anomaly_detectors=AnomalyDetectors(), range_state=RangeState())
+    connection = MagicMock()
+    evaluator.observe([(1, "Begonia", minutes_ago(minute), 20, 50)
+                       for minute in range(20, 0, -1)])
+    evaluator.evaluate(connection, NOW)
+    evaluator.observe([(1, "Begonia", NOW, 29, 50)])
+    delivery = MagicMock(side_effect=OSError("mail server down"))
+
+    with pytest.raises(OSError):
+        evaluator.evaluate(connection, NOW, on_alerts=delivery)
+    delivery.side_effect = None
+
+    assert evaluator.evaluate(connection, NOW, on_alerts=delivery)[0]["alert_type"] == [
+        "temperature anomaly"]
@@ -0,0 +1,47 @@
+"""Tests for the alerts Lambda handler."""
+
+from unittest.mock import MagicMock, patch
+
+from alert_delivery import DeliveryError, DeliveryResult
+from alert_lambda import lambda_handler
+
+
+@patch("alert_lambda.SENDER", None)
+@patch("alert_lambda.deliver_alerts")
+@patch("alert_lambda.evaluate_alerts")
+@patch("alert_lambda.DB_POOL", MagicMock())
+def test_lambda_handler_returns_one_html_page_without_a_transport(mock_evaluate,
+                                                                  mock_deliver):
+    """Checks that with no DIGEST_TRANSPORT the alerts come back as one HTML string."""
+
+    mock_evaluate.return_value = [{"plant_id": 1, "plant_name": "Begonia", "avg_temp": 31,
+                                   "avg_soil_moisture": 50, "alert_sent_at": "now",
+                                   "alert_type": ["temperature"]}]
+
+    result = lambda_handler(None, None)
+
+    assert isinstance(result["message"], str)
+    assert "Begonia" in result["message"]
+    mock_deliver.assert_not_called()
+
+
+@patch("alert_lambda.SENDER", None)
+@patch("alert_lambda.evaluate_alerts", return_value=[])
+@patch("alert_lambda.DB_POOL", MagicMock())
+def test_lambda_handler_returns_nothing_without_alerts(mock_evaluate):
+
+    assert lambda_handler(None, None) == {None: None}
+
+
+@patch("alert_lambda.SENDER", MagicMock())
+@patch("alert_lambda.deliver_alerts", side_effect=DeliveryError(DeliveryResult(0, [None])))
+@patch("alert_lambda.DB_POOL", MagicMock())
+@patch("alert_lambda.evaluate_alerts")
+def test_lambda_handler_reports_digests_that_could_not_be_sent(mock_evaluate, mock_deliver):
+    """Checks that a mail outage is reported rather than raised, with nothing recorded."""
+
+    mock_evaluate.side_effect = lambda conn, on_alerts: on_alerts([{"plant_id": 1}])
+
+    result = lambda_handler(None, None)
+
+    assert result == {"status_code": 502, "alerts": 0, "digests_sent": 0, "digests_failed": 1}
@@ -0,0 +1,60 @@
+"""Tests for the compiled alert rules."""
+
+import numpy as np
+
+from alert_rules import SOIL_MOISTURE_ALERT, TEMP_ALERT, AlertRules, get_alert_masks
+
+
+def make_rules() -> AlertRules:
+    """Makes rules with a default, a species rule and a rule for plant 3."""
+
+    rules = AlertRules()
+    rules.load([(None, None, 15, 30, 20, 100, 1, 0),
+                (None, "Cactus", 10, 40, 0, 30, 0, 0),
+                (3, None, 5, 35, 50, 100, 0, 5)])
+    return rules
+
+
+def test_plant_rules_win_over_species_rules_and_the_default():
+
+    rules = make_rules()
+
+    assert rules.get_rule(1, "Begonia").max_temperature == 30
+    assert rules.get_rule(2, "Cactus").max_temperature == 40
+    assert rules.get_rule(3, "Cactus").max_temperature == 35
+
+
+def test_compile_lines_rules_up_with_the_plants():
+
+    compiled = make_rules().compile([1, 2, 3], ["Begonia", "Cactus", None])
+
+    assert compiled.min_soil_moisture.tolist() == [20, 0, 50]
+    assert compiled.max_soil_moisture.tolist() == [100, 30, 100]
+
+
+def test_compile_reuses_the_arrays_for_the_same_plants():
+
+    rules = make_rules()
+
+    assert rules.compile([1, 2], ["a", "b"]) is rules.compile([1, 2], ["a", "b"])
+
+
+def test_alert_masks_check_each_plant_against_its_own_rule():
+    """Tests that a reading fine for one species is out of range for another."""
+
+    compiled = make_rules().compile([1, 2], ["Begonia", "Cactus"])
+
+    masks = get_alert_masks(compiled, np.array([35.0, 35.0]), np.array([50.0, 50.0]))
+
+    assert masks[TEMP_ALERT].tolist() == [True, False]
+    assert masks[SOIL_MOISTURE_ALERT].tolist() == [False, True]
+
+
+def test_alert_masks_apply_hysteresis_only_to_plants_already_alerting():
+
+    compiled = make_rules().compile([1, 1], [None, None])
+    active = {TEMP_ALERT: np.array([False, True])}
+
+    masks = get_alert_masks(compiled, np.array([29.5, 29.5]), np.array([50.0, 50.0]), active)
+
+    assert masks[TEMP_ALERT].tolist() == [False, True]
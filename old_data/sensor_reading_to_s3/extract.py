@@ -1,24 +1,19 @@
 """Python script to load the hour of data which was more than 24 hours ago."""
 from datetime import datetime, timedelta
 import os
-from os import environ as ENV
 
-import pyodbc
 from dotenv import load_dotenv
 
 import pandas as pd
 
+from storage import BACKEND
+
 
 def get_connection():
-    """Establish connection to database."""
-    conn = pyodbc.connect(f"DRIVER={{{ENV["DB_DRIVER"]}}};"
-                          f"Server={ENV["DB_HOST"]};"
-                          f"Database={ENV["DB_NAME"]};"
-                          f"UID={ENV["DB_USER"]};"
-                          f"PWD={ENV["DB_PASSWORD"]};"
-                          f"Encrypt=no")
-
-    return conn
+    """Establish connection to the database using the configured backend.
+
+    The connection is unencrypted, as it always has been for this Lambda."""
+    return BACKEND.connect(Encrypt="no")
 
 
 def get_time_range() -> tuple[datetime, datetime]:
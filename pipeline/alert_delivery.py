@@ -0,0 +1,195 @@
+"""Batched, concurrent delivery of alert digests over SMTP or SES.
+
+Digests are split into batches, each sent on a worker thread over one SMTP
+connection or SES client, with a few batches in flight at once and sends
+spaced out to stay under the provider's sending rate. Either transport can
+point at a local stand-in, such as fake_smtp.py or an SES emulator."""
+import asyncio
+import logging
+from datetime import datetime
+from email.message import EmailMessage
+from os import environ as ENV
+from smtplib import SMTP, SMTPException
+from threading import Lock
+from time import monotonic, sleep
+from typing import NamedTuple
+
+try:
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:
+    boto3 = None
+
+from alert_digest import DIGEST_QUEUE, Botanist, DigestQueue, collect_digests, make_message
+
+
+SMTP_TRANSPORT = "smtp"
+SES_TRANSPORT = "ses"
+
+DIGEST_TRANSPORT = ENV.get("DIGEST_TRANSPORT", "")
+DIGEST_BATCH_SIZE = int(ENV.get("DIGEST_BATCH_SIZE", "10"))
+DIGEST_CONCURRENCY = int(ENV.get("DIGEST_CONCURRENCY", "4"))
+DIGEST_SEND_RATE = float(ENV.get("DIGEST_SEND_RATE", "14"))
+
+LOGGER = logging.getLogger(__name__)
+
+DELIVERY_ERRORS = ((OSError, SMTPException) if boto3 is None
+                   else (OSError, SMTPException, BotoCoreError, ClientError))
+
+
+class SMTPSender:
+    """Sends each batch of messages over one connection to an SMTP server."""
+
+    def __init__(self, host: str = ENV.get("SMTP_HOST", "localhost"),
+                 port: int = int(ENV.get("SMTP_PORT", "25")), timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send_batch(self, messages: list[EmailMessage],
+                   limiter: "RateLimiter" = None) -> list[EmailMessage]:
+        """Sends the messages, each once the limiter allows, and returns those
+        the server refused."""
+        failed = []
+        with SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            for message in messages:
+                if limiter:
+                    limiter.acquire()
+                try:
+                    smtp.send_message(message)
+                except SMTPException:
+                    failed.append(message)
+        return failed
+
+
+class SESSender:
+    """Sends each message through SES, or an SES emulator at endpoint_url."""
+
+    def __init__(self, endpoint_url: str = ENV.get("SES_ENDPOINT_URL"),
+                 region: str = ENV.get("AWS_REGION", "eu-west-2")):
+        if boto3 is None:
+            raise ImportError("boto3 is needed to send digests through SES")
+        self.client = boto3.client("ses", endpoint_url=endpoint_url, region_name=region)
+
+    def send_batch(self, messages: list[EmailMessage],
+                   limiter: "RateLimiter" = None) -> list[EmailMessage]:
+        """Sends the messages, each once the limiter allows, and returns those
+        SES refused."""
+        failed = []
+        for message in messages:
+            if limiter:
+                limiter.acquire()
+            try:
+                self.client.send_raw_email(Source=message["From"], Destinations=[message["To"]],
+                                           RawMessage={"Data": message.as_bytes()})
+            except ClientError:
+                failed.append(message)
+        return failed
+
+
+def get_sender(transport: str = DIGEST_TRANSPORT) -> "SMTPSender | SESSender | None":
+    """Gets the sender for a transport, or None if digests are not to be sent."""
+
+    if not transport:
+        return None
+    if transport == SMTP_TRANSPORT:
+        return SMTPSender()
+    if transport == SES_TRANSPORT:
+        return SESSender()
+    raise ValueError(f"Unknown digest transport {transport!r}")
+
+
+class RateLimiter:
+    """Spaces out sends to at most rate messages a second, shared by the
+    threads sending batches, so messages go out evenly rather than a batch
+    at a time."""
+
+    def __init__(self, rate: float = DIGEST_SEND_RATE):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = Lock()
+
+    def acquire(self) -> None:
+        """Waits until one more message can be sent."""
+        with self.lock:
+            now = monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        sleep(start - now)
+
+
+class DeliveryResult(NamedTuple):
+    """How many messages were sent, and which were not."""
+    sent: int
+    failed: list[EmailMessage]
+
+
+class DeliveryError(Exception):
+    """Raised when none of a cycle's digests could be sent, so its alerts are
+    not recorded and are decided again next cycle."""
+
+    def __init__(self, result: DeliveryResult):
+        super().__init__(f"All {len(result.failed)} digests failed to send")
+        self.result = result
+
+
+async def send_batches(sender: "SMTPSender | SESSender", messages: list[EmailMessage],
+                       batch_size: int = DIGEST_BATCH_SIZE,
+                       concurrency: int = DIGEST_CONCURRENCY,
+                       limiter: RateLimiter = None) -> DeliveryResult:
+    """Sends the messages in batches, with up to concurrency batches in flight.
+
+    A batch that fails as a whole, such as when the server cannot be
+    reached, counts all of its messages as failed."""
+
+    limiter = limiter or RateLimiter()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(batch: list[EmailMessage]) -> list[EmailMessage]:
+        async with slots:
+            try:
+                return await asyncio.to_thread(sender.send_batch, batch, limiter)
+            except DELIVERY_ERRORS as err:
+                LOGGER.error("Digest batch of %s failed: %s", len(batch), err)
+                return batch
+
+    batches = [messages[start:start + batch_size]
+               for start in range(0, len(messages), batch_size)]
+    failed = [message for batch_failed in await asyncio.gather(*map(send, batches))
+              for message in batch_failed]
+    return DeliveryResult(len(messages) - len(failed), failed)
+
+
+def send_digests(digests: dict[Botanist, list[dict]], sender: "SMTPSender | SESSender",
+                 now: datetime = None, queue: DigestQueue = DIGEST_QUEUE) -> DeliveryResult:
+    """Sends each botanist their digest, queueing the alerts of any that fail for
+    the next cycle."""
+
+    now = now or datetime.now()
+    messages = {botanist: make_message(botanist, alerts) for botanist, alerts in digests.items()}
+    result = asyncio.run(send_batches(sender, list(messages.values())))
+
+    failed = {id(message) for message in result.failed}
+    queue.mark_sent((botanist for botanist, message in messages.items()
+                     if id(message) not in failed), now)
+    queue.add({botanist: digests[botanist] for botanist, message in messages.items()
+               if id(message) in failed})
+    return result
+
+
+def deliver_alerts(connection: "Connection", alerts: list[dict],
+                   sender: "SMTPSender | SESSender", now: datetime = None,
+                   queue: DigestQueue = DIGEST_QUEUE) -> DeliveryResult:
+    """Queues a cycle's alerts by botanist and sends the digests that are due.
+
+    Called before the alerts are recorded, so if every digest fails, such as
+    when the mail server is down, the cycle's alerts are taken back out of
+    the queue and DeliveryError is raised, leaving them to be decided again.
+    If only some fail, those botanists' alerts are kept for their next digest."""
+
+    digests = collect_digests(connection, alerts, now, queue)
+    result = send_digests(digests, sender, now, queue)
+    if digests and not result.sent:
+        queue.discard(alerts)
+        raise DeliveryError(result)
+    return result
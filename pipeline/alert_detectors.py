@@ -0,0 +1,223 @@
+"""Streaming anomaly detectors for each plant's readings, updated in constant time.
+
+The fixed ranges in alert_rules.py only see a plant's average, so they miss
+a spike that the average smooths over and a steady drift still inside the
+range. Each plant's temperature and soil moisture keep an exponentially
+weighted moving average, variance and rate of change instead, so every new
+reading is checked without re-reading any history.
+
+This file is kept identical in alerts/ and pipeline/."""
+from datetime import datetime
+from math import sqrt
+from os import environ as ENV
+from time import monotonic
+from typing import NamedTuple
+
+import numpy as np
+
+from alert_rules import SOIL_MOISTURE_ANOMALY_ALERT, TEMP_ANOMALY_ALERT
+from storage import BACKEND
+
+
+ANOMALY_ALPHA = float(ENV.get("ANOMALY_EWMA_ALPHA", "0.1"))
+ANOMALY_Z_LIMIT = float(ENV.get("ANOMALY_Z_LIMIT", "4"))
+ANOMALY_WARMUP = int(ENV.get("ANOMALY_WARMUP_READINGS", "10"))
+STATE_TTL = float(ENV.get("ALERT_STATE_TTL", "900"))
+
+STATE_COLUMNS = ["plant_id", "alert_type_id", "reading_count", "ewma_mean", "ewma_variance",
+                 "ewma_rate", "last_value", "last_taken_at"]
+STATE_QUERY = f"SELECT {', '.join(STATE_COLUMNS)} FROM anomaly_state"
+
+
+class DetectorSettings(NamedTuple):
+    """How a detector weighs new readings and when it flags one.
+
+    A reading is flagged once the detector has seen warmup readings and the
+    reading is more than z_limit standard deviations from the moving
+    average, or whenever the moving rate of change is faster than max_rate
+    per minute. min_std stops a sensor that has held one value from making
+    every small change look like a spike."""
+    max_rate: float
+    min_std: float
+    alpha: float = ANOMALY_ALPHA
+    z_limit: float = ANOMALY_Z_LIMIT
+    warmup: int = ANOMALY_WARMUP
+
+
+DETECTOR_SETTINGS = {
+    TEMP_ANOMALY_ALERT: DetectorSettings(
+        max_rate=float(ENV.get("TEMP_ANOMALY_MAX_RATE", "2")), min_std=0.5),
+    SOIL_MOISTURE_ANOMALY_ALERT: DetectorSettings(
+        max_rate=float(ENV.get("SOIL_MOISTURE_ANOMALY_MAX_RATE", "10")), min_std=1),
+}
+
+
+class SeriesDetector:
+    """The moving average, variance and rate of change of one plant's readings
+    of one kind, with the last reading."""
+
+    __slots__ = ("count", "mean", "variance", "rate", "last_value", "last_taken_at")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, variance: float = 0.0,
+                 rate: float = 0.0, last_value: float = None, last_taken_at: datetime = None):
+        self.count = count
+        self.mean = mean
+        self.variance = variance
+        self.rate = rate
+        self.last_value = last_value
+        self.last_taken_at = last_taken_at
+
+    def update(self, taken_at: datetime, value: float, settings: DetectorSettings) -> bool:
+        """Adds a reading and returns True if it is an anomaly.
+
+        Readings no newer than the last are ignored, so repeated and late
+        readings do not change the state. The rate is per minute, and
+        readings less than a minute apart count as a minute apart."""
+        if self.last_taken_at is not None and taken_at <= self.last_taken_at:
+            return False
+
+        value = float(value)
+        spike = False
+        if self.count:
+            minutes = max((taken_at - self.last_taken_at).total_seconds() / 60, 1.0)
+            self.rate += settings.alpha * ((value - self.last_value) / minutes - self.rate)
+            deviation = value - self.mean
+            std = max(sqrt(self.variance), settings.min_std)
+            spike = self.count >= settings.warmup and abs(deviation) > settings.z_limit * std
+            self.mean += settings.alpha * deviation
+            self.variance = (1 - settings.alpha) * (self.variance
+                                                    + settings.alpha * deviation ** 2)
+        else:
+            self.mean = value
+
+        self.count += 1
+        self.last_value, self.last_taken_at = value, taken_at
+        return spike or abs(self.rate) > settings.max_rate
+
+    def to_row(self) -> tuple:
+        """Gets the state as the values of an anomaly_state row, after its keys."""
+        return (self.count, self.mean, self.variance, self.rate, self.last_value,
+                self.last_taken_at)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "SeriesDetector":
+        """Makes a detector from the values of an anomaly_state row, after its keys.
+
+        SQLite returns timestamps as text, so they are converted back."""
+        count, mean, variance, rate, last_value, last_taken_at = row
+        if isinstance(last_taken_at, str):
+            last_taken_at = datetime.fromisoformat(last_taken_at)
+        return cls(int(count), float(mean), float(variance), float(rate),
+                   None if last_value is None else float(last_value), last_taken_at)
+
+
+class AnomalyDetectors:
+    """A detector for each plant's temperature and soil moisture, keyed by
+    (plant_id, alert_type_id) like the alerts they raise.
+
+    The detectors live at module level so they survive warm Lambda
+    invocations. They are read with one query, re-read once older than the
+    TTL, and those updated since are written back after each evaluation, so
+    a cold start carries on where the last run stopped. Plants flagged since
+    the last evaluation keep their flags until its alerts are recorded, so
+    an anomaly is not lost if they fail to be delivered."""
+
+    def __init__(self, settings: dict[int, DetectorSettings] = None, ttl: float = STATE_TTL):
+        self.settings = settings or DETECTOR_SETTINGS
+        self.ttl = ttl
+        self.warmed_at = None
+        self.detectors = {}
+        self.flagged = {}
+        self.changed = set()
+
+    def is_stale(self) -> bool:
+        """Returns True if the detectors have never been read or are older than the TTL."""
+        return self.warmed_at is None or monotonic() - self.warmed_at > self.ttl
+
+    def warm(self, connection: "Connection") -> None:
+        """Reads every detector's state from the database."""
+        curs = connection.cursor()
+        try:
+            curs.execute(STATE_QUERY)
+            rows = curs.fetchall()
+        finally:
+            curs.close()
+
+        self.load(rows)
+        self.warmed_at = monotonic()
+
+    def ensure_warm(self, connection: "Connection") -> None:
+        """Reads the detectors if they are stale."""
+        if self.is_stale():
+            self.warm(connection)
+
+    def clear(self) -> None:
+        """Empties the detectors so the next run re-reads them."""
+        self.warmed_at = None
+        self.detectors.clear()
+        self.flagged.clear()
+        self.changed.clear()
+
+    def load(self, rows: "Iterable[tuple]") -> None:
+        """Replaces the detectors with anomaly_state rows."""
+        self.detectors = {(plant_id, alert_type_id): SeriesDetector.from_row(state)
+                          for plant_id, alert_type_id, *state in rows}
+        self.flagged.clear()
+        self.changed.clear()
+
+    def to_rows(self, plant_ids: "Iterable[int]" = None) -> list[tuple]:
+        """Gets the detectors of the given plants, or all of them, as anomaly_state rows."""
+        plant_ids = None if plant_ids is None else set(plant_ids)
+        return [(plant_id, alert_type_id, *detector.to_row())
+                for (plant_id, alert_type_id), detector in self.detectors.items()
+                if plant_ids is None or plant_id in plant_ids]
+
+    def observe(self, plant_id: int, taken_at: datetime, temperature: float,
+                soil_moisture: float) -> None:
+        """Adds a reading to the plant's detectors, flagging the plant for any anomaly."""
+        for alert_type_id, value in ((TEMP_ANOMALY_ALERT, temperature),
+                                     (SOIL_MOISTURE_ANOMALY_ALERT, soil_moisture)):
+            key = (plant_id, alert_type_id)
+            if key not in self.detectors:
+                self.detectors[key] = SeriesDetector()
+            if self.detectors[key].update(taken_at, value, self.settings[alert_type_id]):
+                self.flagged.setdefault(plant_id, set()).add(alert_type_id)
+        self.changed.add(plant_id)
+
+    def get_anomalies(self, plant_ids: list[int]) -> dict[int, np.ndarray]:
+        """Gets which of the given plants were flagged for each anomaly type,
+        lined up with them. The flags are kept until clear_anomalies."""
+        return {alert_type_id: np.array([alert_type_id in self.flagged.get(plant_id, ())
+                                         for plant_id in plant_ids], dtype=bool)
+                for alert_type_id in self.settings}
+
+    def clear_anomalies(self, plant_ids: "Iterable[int]") -> None:
+        """Clears the given plants' flags once their alerts have been recorded."""
+        for plant_id in plant_ids:
+            self.flagged.pop(plant_id, None)
+
+    def save(self, connection: "Connection") -> None:
+        """Upserts the detectors of every plant updated since the last save."""
+        rows = self.to_rows(self.changed)
+        if not rows:
+            return
+
+        curs = connection.cursor()
+        try:
+            staging = BACKEND.staging_table("anomaly_staging")
+            curs.execute(f"DROP TABLE IF EXISTS {staging}")
+            curs.execute(f"""CREATE TABLE {staging} (
+                             plant_id SMALLINT, alert_type_id SMALLINT, reading_count INT,
+                             ewma_mean FLOAT, ewma_variance FLOAT, ewma_rate FLOAT,
+                             last_value FLOAT, last_taken_at DATETIME2(0))""")
+            BACKEND.prepare_bulk_insert(curs)
+            curs.executemany(f"INSERT INTO {staging} VALUES ({', '.join('?' * 8)})", rows)
+            curs.execute(BACKEND.upsert_query("anomaly_state", staging, STATE_COLUMNS[:2],
+                                              STATE_COLUMNS[2:]))
+            connection.commit()
+        finally:
+            curs.close()
+        self.changed.clear()
+
+
+ANOMALY_DETECTORS = AnomalyDetectors()
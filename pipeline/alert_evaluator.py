@@ -0,0 +1,464 @@
+"""Alert decisions, and rolling alert state per plant updated from just-loaded readings.
+
+This file is kept identical in alerts/ and pipeline/, so the pipeline can
+decide alerts as it loads readings and the alerts Lambda can still poll."""
+from collections import deque
+from datetime import datetime, timedelta
+from os import environ as ENV
+from time import monotonic
+
+import numpy as np
+
+from alert_detectors import ANOMALY_DETECTORS, AnomalyDetectors
+from alert_rules import (ALERT_RULES, ALERT_TYPE_NAMES, SOIL_MOISTURE_ALERT,
+                         SOIL_MOISTURE_ANOMALY_ALERT, TEMP_ALERT, TEMP_ANOMALY_ALERT,
+                         AlertRules, CompiledRules, get_alert_masks)
+from storage import BACKEND
+
+
+ALERT_VALUES = {TEMP_ALERT: "avg_temp", SOIL_MOISTURE_ALERT: "avg_soil_moisture",
+                TEMP_ANOMALY_ALERT: "temperature", SOIL_MOISTURE_ANOMALY_ALERT: "soil_moisture"}
+ALERT_WINDOW = 3
+STATE_TTL = float(ENV.get("ALERT_STATE_TTL", "900"))
+
+
+def get_cooldown(variable: str) -> timedelta:
+    """Reads a cooldown in minutes from the environment, defaulting to ALERT_COOLDOWN_MINUTES."""
+
+    return timedelta(minutes=float(ENV.get(variable, ENV.get("ALERT_COOLDOWN_MINUTES", "60"))))
+
+
+ALERT_COOLDOWNS = {
+    TEMP_ALERT: get_cooldown("TEMP_ALERT_COOLDOWN_MINUTES"),
+    SOIL_MOISTURE_ALERT: get_cooldown("SOIL_MOISTURE_ALERT_COOLDOWN_MINUTES"),
+    TEMP_ANOMALY_ALERT: get_cooldown("TEMP_ANOMALY_ALERT_COOLDOWN_MINUTES"),
+    SOIL_MOISTURE_ANOMALY_ALERT: get_cooldown("SOIL_MOISTURE_ANOMALY_ALERT_COOLDOWN_MINUTES"),
+}
+
+RANGE_ALERTS = (TEMP_ALERT, SOIL_MOISTURE_ALERT)
+RANGE_STATE_QUERY = "SELECT plant_id, alert_type_id, out_of_range FROM range_state"
+
+COOLDOWN_QUERY = """SELECT plant_id, alert_type_id, MAX(sent_at)
+                    FROM alert
+                    WHERE sent_at >= ?
+                    GROUP BY plant_id, alert_type_id"""
+
+WARM_QUERIES = {
+    "plants": "SELECT plant_id, plant_name, scientific_name FROM plant",
+    "readings": """SELECT lr.plant_id, p.plant_name, lr.taken_at,
+                   lr.temperature, lr.soil_moisture
+                   FROM latest_reading AS lr
+                   JOIN plant AS p ON p.plant_id = lr.plant_id
+                   ORDER BY lr.plant_id, lr.taken_at""",
+}
+
+
+def to_datetime(value: "datetime | str | None") -> "datetime | None":
+    """Converts a timestamp to a datetime, as SQLite returns them as text."""
+
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def decide_alerts(plants: list[dict], now: datetime, rules: CompiledRules,
+                  active: dict[int, np.ndarray] = None, cooldowns: dict[int, timedelta] = None,
+                  anomalies: dict[int, np.ndarray] = None) -> tuple[list[list[int]], dict]:
+    """Decides the alert types each plant needs, from its averages, its rule,
+    the anomalies flagged by its detectors and when each alert was last sent.
+
+    The range checks and cooldowns of every plant are evaluated as arrays.
+    An alert is only required if its reading is out of range and the same
+    type of alert has not been sent for the plant within that type's
+    cooldown. Returns each plant's required alert types, and the out-of-range masks."""
+
+    avg_temp = np.array([plant["avg_temp"] for plant in plants], dtype=float)
+    avg_soil_moisture = np.array([plant["avg_soil_moisture"] for plant in plants], dtype=float)
+    out_of_range = {**get_alert_masks(rules, avg_temp, avg_soil_moisture, active),
+                    **(anomalies or {})}
+
+    cooldowns = cooldowns or ALERT_COOLDOWNS
+    required = {}
+    for alert_type_id, mask in out_of_range.items():
+        cooldown_start = np.datetime64(now - cooldowns[alert_type_id], "s")
+        last_sent = np.array([plant["last_alerts"].get(alert_type_id) for plant in plants],
+                             dtype="datetime64[s]")
+        required[alert_type_id] = mask & ~(last_sent >= cooldown_start)
+
+    return ([[alert_type_id for alert_type_id, mask in required.items() if mask[index]]
+             for index in range(len(plants))], out_of_range)
+
+
+def get_required_alerts(plant: dict, now: datetime, rules: AlertRules = ALERT_RULES) -> list[int]:
+    """Gets the alert types a single plant needs."""
+
+    compiled = rules.compile([plant["plant_id"]], [plant.get("scientific_name")])
+    return decide_alerts([plant], now, compiled)[0][0]
+
+
+def insert_alerts(connection: "Connection", alerts: list[tuple[dict, int]],
+                  sent_at: datetime) -> None:
+    """Adds every (plant, alert type) alert into the alert table with one commit."""
+
+    if not alerts:
+        return
+
+    curs = connection.cursor()
+    curs.executemany(""" INSERT INTO alert
+                        (plant_id, sent_at, alert_type_id, alert_value)
+                        VALUES (?, ?, ?, ?); """,
+                     [(plant["plant_id"], sent_at, alert_type_id,
+                       plant[ALERT_VALUES[alert_type_id]])
+                      for plant, alert_type_id in alerts])
+    connection.commit()
+    curs.close()
+
+
+class CooldownCache:
+    """When each type of alert was last sent for each plant, keyed by
+    (plant_id, alert_type_id), so cooldowns are checked without querying.
+
+    The cache lives at module level so it survives warm Lambda invocations.
+    It is warmed with one grouped query over the alerts still within the
+    longest cooldown, updated as alerts are inserted, and re-read once older
+    than the TTL so alerts sent by another run are picked up. Entries are
+    evicted once their alert type's cooldown is over."""
+
+    def __init__(self, cooldowns: dict[int, timedelta] = None, ttl: float = STATE_TTL):
+        self.cooldowns = cooldowns or ALERT_COOLDOWNS
+        self.ttl = ttl
+        self.warmed_at = None
+        self.last_sent = {}
+
+    def is_stale(self) -> bool:
+        """Returns True if the cache has never been warmed or is older than the TTL."""
+        return self.warmed_at is None or monotonic() - self.warmed_at > self.ttl
+
+    def warm(self, connection: "Connection", now: datetime = None) -> None:
+        """Reads the last alert of each type for each plant still in its cooldown."""
+        now = now or datetime.now()
+        curs = connection.cursor()
+        try:
+            curs.execute(COOLDOWN_QUERY, (now - max(self.cooldowns.values()),))
+            rows = curs.fetchall()
+        finally:
+            curs.close()
+
+        self.last_sent = {(plant_id, alert_type_id): to_datetime(sent_at)
+                          for plant_id, alert_type_id, sent_at in rows}
+        self.evict(now)
+        self.warmed_at = monotonic()
+
+    def ensure_warm(self, connection: "Connection") -> None:
+        """Warms the cache if it is stale."""
+        if self.is_stale():
+            self.warm(connection)
+
+    def clear(self) -> None:
+        """Empties the cache so the next run re-warms it."""
+        self.warmed_at = None
+        self.last_sent.clear()
+
+    def record(self, alerts: "Iterable[tuple[int, int]]", sent_at: datetime) -> None:
+        """Starts the cooldown of each inserted (plant_id, alert_type_id) alert."""
+        self.last_sent.update((key, sent_at) for key in alerts)
+
+    def evict(self, now: datetime) -> None:
+        """Drops the alerts whose cooldown is over."""
+        self.last_sent = {(plant_id, alert_type_id): sent_at
+                          for (plant_id, alert_type_id), sent_at in self.last_sent.items()
+                          if sent_at >= now - self.cooldowns[alert_type_id]}
+
+    def get_last_sent(self, plant_id: int, alert_type_id: int) -> "datetime | None":
+        """Gets when an alert was last sent for a plant, if still in its cooldown."""
+        return self.last_sent.get((plant_id, alert_type_id))
+
+    def get_last_alerts(self, plant_id: int) -> dict[int, "datetime | None"]:
+        """Gets when each type of alert was last sent for a plant, as decide_alerts takes."""
+        return {alert_type_id: self.last_sent.get((plant_id, alert_type_id))
+                for alert_type_id in ALERT_TYPE_NAMES}
+
+    def is_cooling_down(self, plant_id: int, alert_type_id: int, now: datetime) -> bool:
+        """Returns True if the same alert was sent for the plant within its cooldown."""
+        last_sent = self.get_last_sent(plant_id, alert_type_id)
+        return last_sent is not None and last_sent >= now - self.cooldowns[alert_type_id]
+
+
+COOLDOWN_CACHE = CooldownCache()
+
+
+class RangeState:
+    """Whether each plant was out of range for each range alert type when it was
+    last checked, keyed by (plant_id, alert_type_id), for the rules' hysteresis.
+
+    The state lives at module level so it survives warm Lambda invocations.
+    It is read with one query, re-read once older than the TTL so checks made
+    by another Lambda are picked up, and the plants checked since are written
+    back after each evaluation, so a cold start keeps plants in alert."""
+
+    def __init__(self, ttl: float = STATE_TTL):
+        self.ttl = ttl
+        self.warmed_at = None
+        self.out_of_range = {}
+        self.changed = set()
+
+    def is_stale(self) -> bool:
+        """Returns True if the state has never been read or is older than the TTL."""
+        return self.warmed_at is None or monotonic() - self.warmed_at > self.ttl
+
+    def warm(self, connection: "Connection") -> None:
+        """Reads every plant's range state from the database."""
+        curs = connection.cursor()
+        try:
+            curs.execute(RANGE_STATE_QUERY)
+            rows = curs.fetchall()
+        finally:
+            curs.close()
+
+        self.out_of_range = {(plant_id, alert_type_id): bool(out)
+                             for plant_id, alert_type_id, out in rows}
+        self.changed.clear()
+        self.warmed_at = monotonic()
+
+    def ensure_warm(self, connection: "Connection") -> None:
+        """Reads the state if it is stale."""
+        if self.is_stale():
+            self.warm(connection)
+
+    def clear(self) -> None:
+        """Empties the state so the next run re-reads it."""
+        self.warmed_at = None
+        self.out_of_range.clear()
+        self.changed.clear()
+
+    def get_active(self, plant_ids: list[int]) -> dict[int, np.ndarray]:
+        """Gets which of the given plants were out of range for each range alert
+        type, lined up with them, as get_alert_masks takes."""
+        return {alert_type_id: np.array([self.out_of_range.get((plant_id, alert_type_id), False)
+                                         for plant_id in plant_ids], dtype=bool)
+                for alert_type_id in RANGE_ALERTS}
+
+    def update(self, plant_ids: list[int], out_of_range: dict[int, np.ndarray]) -> None:
+        """Records which of the given plants are out of range for each range alert type."""
+        for alert_type_id in RANGE_ALERTS:
+            for plant_id, out in zip(plant_ids, out_of_range[alert_type_id]):
+                key = (plant_id, alert_type_id)
+                if self.out_of_range.get(key, False) != bool(out):
+                    self.out_of_range[key] = bool(out)
+                    self.changed.add(key)
+
+    def save(self, connection: "Connection") -> None:
+        """Upserts the range state of every plant whose state changed since the last save."""
+        if not self.changed:
+            return
+
+        curs = connection.cursor()
+        try:
+            staging = BACKEND.staging_table("range_staging")
+            curs.execute(f"DROP TABLE IF EXISTS {staging}")
+            curs.execute(f"""CREATE TABLE {staging} (
+                             plant_id SMALLINT, alert_type_id SMALLINT, out_of_range BIT)""")
+            BACKEND.prepare_bulk_insert(curs)
+            curs.executemany(f"INSERT INTO {staging} VALUES (?, ?, ?)",
+                             [(*key, self.out_of_range[key]) for key in sorted(self.changed)])
+            curs.execute(BACKEND.upsert_query("range_state", staging,
+                                              ["plant_id", "alert_type_id"], ["out_of_range"]))
+            connection.commit()
+        finally:
+            curs.close()
+        self.changed.clear()
+
+
+RANGE_STATE = RangeState()
+
+
+class PlantWindow:
+    """A plant's newest readings, oldest first, with running sums of their values."""
+
+    __slots__ = ("size", "readings", "temperature_sum", "soil_moisture_sum")
+
+    def __init__(self, size: int = ALERT_WINDOW):
+        self.size = size
+        self.readings = deque()
+        self.temperature_sum = 0.0
+        self.soil_moisture_sum = 0.0
+
+    def add(self, taken_at: datetime, temperature: float, soil_moisture: float) -> None:
+        """Adds a reading, dropping the oldest once the window is full.
+
+        Readings already in the window, or older than all of a full window,
+        are ignored, so repeated and late readings do not change it."""
+        if any(reading[0] == taken_at for reading in self.readings):
+            return
+        if len(self.readings) == self.size and taken_at < self.readings[0][0]:
+            return
+
+        self.readings.append((taken_at, float(temperature), float(soil_moisture)))
+        if len(self.readings) > 1 and taken_at < self.readings[-2][0]:
+            self.readings = deque(sorted(self.readings))
+        self.temperature_sum += float(temperature)
+        self.soil_moisture_sum += float(soil_moisture)
+        if len(self.readings) > self.size:
+            _, old_temperature, old_soil_moisture = self.readings.popleft()
+            self.temperature_sum -= old_temperature
+            self.soil_moisture_sum -= old_soil_moisture
+
+    def get_averages(self) -> tuple[float, float]:
+        """Gets the average temperature and soil moisture of the window, to 2dp."""
+        count = len(self.readings)
+        return (round(self.temperature_sum / count, 2),
+                round(self.soil_moisture_sum / count, 2))
+
+
+class AlertEvaluator:
+    """Each plant's window of newest readings, with the cooldown cache of when
+    each alert was last sent.
+
+    The state lives at module level so it survives warm Lambda invocations.
+    It is warmed from latest_reading and the alert table, updated with each
+    batch of readings as it is loaded and with each alert as it is sent, and
+    re-warmed once it is older than the TTL. Only plants with new readings
+    since the last evaluation are evaluated. Whether each plant was out of
+    range at its last evaluation is kept in the range state, for the rules'
+    hysteresis."""
+
+    def __init__(self, ttl: float = STATE_TTL, window_size: int = ALERT_WINDOW,
+                 rules: AlertRules = ALERT_RULES, cooldowns: CooldownCache = COOLDOWN_CACHE,
+                 anomaly_detectors: AnomalyDetectors = ANOMALY_DETECTORS,
+                 range_state: RangeState = RANGE_STATE):
+        self.ttl = ttl
+        self.window_size = window_size
+        self.rules = rules
+        self.cooldowns = cooldowns
+        self.anomaly_detectors = anomaly_detectors
+        self.range_state = range_state
+        self.warmed_at = None
+        self.windows = {}
+        self.plant_names = {}
+        self.species = {}
+        self.changed = set()
+
+    def is_stale(self) -> bool:
+        """Returns True if the state has never been warmed or is older than the TTL."""
+        return self.warmed_at is None or monotonic() - self.warmed_at > self.ttl
+
+    def warm(self, connection: "Connection") -> None:
+        """Loads the plants, their windows, their anomaly detectors, the cooldown
+        cache, the alert rules and the range state from the database, one query each.
+
+        Detectors skip the window readings they have already seen, and any
+        anomaly found while catching up on the rest is not alerted."""
+        self.anomaly_detectors.warm(connection)
+        curs = connection.cursor()
+        try:
+            rows = {}
+            for name, query in WARM_QUERIES.items():
+                curs.execute(query)
+                rows[name] = curs.fetchall()
+        finally:
+            curs.close()
+
+        self.plant_names = {plant_id: name for plant_id, name, _ in rows["plants"]}
+        self.species = {plant_id: species for plant_id, _, species in rows["plants"]}
+        self.windows.clear()
+        self.observe((plant_id, plant_name, to_datetime(taken_at), temperature, soil_moisture)
+                     for plant_id, plant_name, taken_at, temperature, soil_moisture
+                     in rows["readings"])
+        self.changed.clear()
+        self.anomaly_detectors.flagged.clear()
+        self.cooldowns.warm(connection)
+        self.rules.warm(connection)
+        self.range_state.warm(connection)
+        self.warmed_at = monotonic()
+
+    def ensure_warm(self, connection: "Connection") -> None:
+        """Warms the state if it is stale."""
+        if self.is_stale():
+            self.warm(connection)
+
+    def clear(self) -> None:
+        """Empties the state so the next run re-warms it."""
+        self.warmed_at = None
+        self.windows.clear()
+        self.plant_names.clear()
+        self.species.clear()
+        self.cooldowns.clear()
+        self.anomaly_detectors.clear()
+        self.range_state.clear()
+        self.changed.clear()
+
+    def observe(self, readings: "Iterable[tuple]") -> None:
+        """Adds (plant_id, plant_name, taken_at, temperature, soil_moisture) readings
+        to their plants' windows and anomaly detectors, marking the plants to
+        be evaluated.
+
+        A plant first seen since the last warm has no species until the next,
+        so it is held to its own or the default rule until then."""
+        for plant_id, plant_name, taken_at, temperature, soil_moisture in readings:
+            if plant_id not in self.windows:
+                self.windows[plant_id] = PlantWindow(self.window_size)
+            self.windows[plant_id].add(taken_at, temperature, soil_moisture)
+            self.anomaly_detectors.observe(plant_id, taken_at, temperature, soil_moisture)
+            self.plant_names[plant_id] = plant_name
+            self.changed.add(plant_id)
+
+    def get_plant_state(self, plant_id: int) -> dict:
+        """Gets a plant's averages, newest reading and last alerts, in the form
+        get_required_alerts takes."""
+        window = self.windows[plant_id]
+        avg_temp, avg_soil_moisture = window.get_averages()
+        _, temperature, soil_moisture = window.readings[-1]
+        return {"plant_id": plant_id, "plant_name": self.plant_names[plant_id],
+                "scientific_name": self.species.get(plant_id),
+                "avg_temp": avg_temp, "avg_soil_moisture": avg_soil_moisture,
+                "temperature": temperature, "soil_moisture": soil_moisture,
+                "last_alerts": self.cooldowns.get_last_alerts(plant_id)}
+
+    def evaluate(self, connection: "Connection", now: datetime = None,
+                 on_alerts: "Callable[[list[dict]], None]" = None) -> list[dict]:
+        """Decides and records the alerts for every plant with new readings.
+
+        No readings are queried, the plants' rules are checked in one
+        vectorised pass alongside their detectors' anomalies, and the new
+        alerts are written in one batch, then the updated detectors and range
+        state. The cooldowns are re-read first whenever there are plants to
+        check, so alerts just sent by the alerts Lambda are not repeated.
+        If given, on_alerts is handed the alerts before they are recorded, so
+        they are delivered before their cooldown starts, and if it raises
+        they are decided again next time.
+        Returns the plants that were alerted, with their alert types."""
+        now = now or datetime.now()
+        if self.changed:
+            self.cooldowns.warm(connection, now)
+        else:
+            self.cooldowns.evict(now)
+        plant_ids = sorted(self.changed)
+        plants = [self.get_plant_state(plant_id) for plant_id in plant_ids]
+        rules = self.rules.compile(plant_ids, [plant["scientific_name"] for plant in plants])
+        decisions, out_of_range = decide_alerts(
+            plants, now, rules, self.range_state.get_active(plant_ids), self.cooldowns.cooldowns,
+            self.anomaly_detectors.get_anomalies(plant_ids))
+
+        alerts, to_insert = [], []
+        for plant, alert_type_ids in zip(plants, decisions):
+            if alert_type_ids:
+                to_insert.extend((plant, alert_type_id) for alert_type_id in alert_type_ids)
+                del plant["last_alerts"]
+                alerts.append({**plant, "alert_sent_at": now,
+                               "alert_type": [ALERT_TYPE_NAMES[alert_type_id]
+                                              for alert_type_id in alert_type_ids]})
+
+        if on_alerts and alerts:
+            on_alerts(alerts)
+        insert_alerts(connection, to_insert, now)
+        self.anomaly_detectors.clear_anomalies(plant_ids)
+        self.anomaly_detectors.save(connection)
+        self.cooldowns.record(((plant["plant_id"], alert_type_id)
+                               for plant, alert_type_id in to_insert), now)
+        self.range_state.update(plant_ids, out_of_range)
+        self.range_state.save(connection)
+        self.changed.clear()
+        return alerts
+
+
+ALERT_EVALUATOR = AlertEvaluator()
@@ -0,0 +1,152 @@
+"""Per-plant and per-species alert thresholds, compiled into NumPy arrays.
+
+This file is kept identical in alerts/ and pipeline/."""
+from os import environ as ENV
+from time import monotonic
+from typing import NamedTuple
+
+import numpy as np
+
+
+TEMP_ALERT = 1
+SOIL_MOISTURE_ALERT = 2
+TEMP_ANOMALY_ALERT = 3
+SOIL_MOISTURE_ANOMALY_ALERT = 4
+ALERT_TYPE_NAMES = {TEMP_ALERT: "temperature", SOIL_MOISTURE_ALERT: "soil moisture",
+                    TEMP_ANOMALY_ALERT: "temperature anomaly",
+                    SOIL_MOISTURE_ANOMALY_ALERT: "soil moisture anomaly"}
+OPTIMUM_TEMP = (15, 30)
+SOIL_MOISTURE_THRESHOLD = 20
+RULES_TTL = float(ENV.get("ALERT_RULES_TTL", "900"))
+
+RULES_QUERY = """SELECT plant_id, scientific_name, min_temperature, max_temperature,
+                 min_soil_moisture, max_soil_moisture,
+                 temperature_hysteresis, soil_moisture_hysteresis
+                 FROM alert_rule"""
+
+
+class AlertRule(NamedTuple):
+    """The range a plant's average readings should stay in.
+
+    Once a plant is alerting, it only stops once its average is back inside
+    the range by more than the hysteresis, so a reading hovering on a
+    limit does not flip in and out of alert."""
+    min_temperature: float = OPTIMUM_TEMP[0]
+    max_temperature: float = OPTIMUM_TEMP[1]
+    min_soil_moisture: float = SOIL_MOISTURE_THRESHOLD
+    max_soil_moisture: float = 100
+    temperature_hysteresis: float = 0
+    soil_moisture_hysteresis: float = 0
+
+
+DEFAULT_RULE = AlertRule()
+
+
+class CompiledRules(NamedTuple):
+    """The rule of each of a list of plants, as one array per rule field."""
+    min_temperature: np.ndarray
+    max_temperature: np.ndarray
+    min_soil_moisture: np.ndarray
+    max_soil_moisture: np.ndarray
+    temperature_hysteresis: np.ndarray
+    soil_moisture_hysteresis: np.ndarray
+
+
+class AlertRules:
+    """The alert_rule table: a default rule, rules per species and rules per plant.
+
+    A plant's own rule wins over its species' rule, which wins over the
+    default, the rule with neither a plant nor a species. The rules live at
+    module level so they survive warm Lambda invocations, are read with one
+    query, and are re-read once older than the TTL. The last compiled set of
+    plants is kept, so evaluating the same plants again compiles nothing."""
+
+    def __init__(self, ttl: float = RULES_TTL):
+        self.ttl = ttl
+        self.warmed_at = None
+        self.default = DEFAULT_RULE
+        self.by_species = {}
+        self.by_plant = {}
+        self.compiled_key = None
+        self.compiled = None
+
+    def is_stale(self) -> bool:
+        """Returns True if the rules have never been read or are older than the TTL."""
+        return self.warmed_at is None or monotonic() - self.warmed_at > self.ttl
+
+    def warm(self, connection: "Connection") -> None:
+        """Reads every rule from the database."""
+        curs = connection.cursor()
+        try:
+            curs.execute(RULES_QUERY)
+            rows = curs.fetchall()
+        finally:
+            curs.close()
+
+        self.load(rows)
+        self.warmed_at = monotonic()
+
+    def ensure_warm(self, connection: "Connection") -> None:
+        """Reads the rules if they are stale."""
+        if self.is_stale():
+            self.warm(connection)
+
+    def load(self, rows: list[tuple]) -> None:
+        """Replaces the rules with (plant_id, scientific_name, *AlertRule) rows."""
+        self.default, self.by_species, self.by_plant = DEFAULT_RULE, {}, {}
+        for plant_id, scientific_name, *values in rows:
+            rule = AlertRule(*(float(value) for value in values))
+            if plant_id is not None:
+                self.by_plant[plant_id] = rule
+            elif scientific_name is not None:
+                self.by_species[scientific_name] = rule
+            else:
+                self.default = rule
+        self.compiled_key = self.compiled = None
+
+    def get_rule(self, plant_id: int, scientific_name: str = None) -> AlertRule:
+        """Gets the rule that applies to a plant."""
+        return self.by_plant.get(plant_id) or self.by_species.get(scientific_name, self.default)
+
+    def compile(self, plant_ids: list[int], species: list[str]) -> CompiledRules:
+        """Gets the rules of the given plants as arrays, in the same order.
+
+        Each distinct rule is one row of a small table, and each plant is
+        given the index of its row, so the arrays are built with one gather."""
+        key = (tuple(plant_ids), tuple(species))
+        if key != self.compiled_key:
+            table = np.array([self.default, *self.by_species.values(), *self.by_plant.values()],
+                             dtype=float)
+            species_rows = {name: row for row, name in enumerate(self.by_species, 1)}
+            plant_rows = {plant_id: row
+                          for row, plant_id in enumerate(self.by_plant, 1 + len(species_rows))}
+            rows = np.fromiter((plant_rows.get(plant_id) or species_rows.get(scientific_name, 0)
+                                for plant_id, scientific_name in zip(plant_ids, species)),
+                               dtype=np.intp, count=len(plant_ids))
+            self.compiled = CompiledRules(*np.ascontiguousarray(table[rows].T))
+            self.compiled_key = key
+        return self.compiled
+
+
+def get_alert_masks(rules: CompiledRules, avg_temp: np.ndarray, avg_soil_moisture: np.ndarray,
+                    active: dict[int, np.ndarray] = None) -> dict[int, np.ndarray]:
+    """Finds the plants out of range for each alert type, in one vectorised pass.
+
+    active gives the plants already alerting for each type, whose range is
+    narrowed by the hysteresis. Without it no plant is treated as alerting."""
+
+    active = active or {}
+    no_plants = np.zeros(len(avg_temp), dtype=bool)
+    temp_margin = np.where(active.get(TEMP_ALERT, no_plants), rules.temperature_hysteresis, 0)
+    soil_margin = np.where(active.get(SOIL_MOISTURE_ALERT, no_plants),
+                           rules.soil_moisture_hysteresis, 0)
+
+    return {
+        TEMP_ALERT: ((avg_temp < rules.min_temperature + temp_margin)
+                     | (avg_temp > rules.max_temperature - temp_margin)),
+        SOIL_MOISTURE_ALERT: ((avg_soil_moisture < rules.min_soil_moisture + soil_margin)
+                              | (avg_soil_moisture > rules.max_soil_moisture - soil_margin)),
+    }
+
+
+ALERT_RULES = AlertRules()
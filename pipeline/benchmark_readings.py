@@ -0,0 +1,66 @@
+"""Benchmarks memory and transform time of reading dicts against reading batches."""
+from random import random, seed
+from time import perf_counter
+import tracemalloc
+
+from benchmark_validate import convert_int_to_2dp, check_negative_moisture
+from readings import PlantReading, ReadingBatch
+
+
+PLANT_COUNT = 10_000
+
+
+def make_plants(count: int) -> list[dict]:
+    """Makes validated API data for the given number of plants."""
+    seed(0)
+    return [{"plant_id": plant_id, "name": f"Plant {plant_id}",
+             "temperature": random() * 40, "soil_moisture": random() * 110 - 10,
+             "origin_location": {"latitude": random() * 90, "longitude": random() * 180},
+             "last_watered": "2025-06-03T13:32:05.000Z",
+             "recording_taken": "2025-06-03T15:18:44.108Z"} for plant_id in range(count)]
+
+
+def measure_memory(build: "Callable") -> int:
+    """Returns the bytes allocated by building a collection of readings."""
+    tracemalloc.start()
+    readings = build()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del readings
+    return allocated
+
+
+def transform_dicts(plants: list[dict]) -> None:
+    """Clamps and rounds each reading dict the way the pipeline used to."""
+    for plant in plants:
+        if check_negative_moisture(plant):
+            plant["soil_moisture"] = 0
+        convert_int_to_2dp(plant)
+
+
+if __name__ == "__main__":
+    plant_data = make_plants(PLANT_COUNT)
+
+    memory = {
+        "dict": measure_memory(lambda: [{"taken_at": plant["recording_taken"],
+                                         "temperature": plant["temperature"],
+                                         "last_watered": plant["last_watered"],
+                                         "soil_moisture": plant["soil_moisture"],
+                                         "plant_id": plant["plant_id"]}
+                                        for plant in plant_data]),
+        "PlantReading": measure_memory(
+            lambda: [PlantReading.from_plant(plant) for plant in plant_data]),
+        "ReadingBatch": measure_memory(lambda: ReadingBatch.from_plants(plant_data)),
+    }
+    for name, size in memory.items():
+        print(f"{name:>12}: {size / PLANT_COUNT:.0f} bytes per reading")
+
+    dict_plants = make_plants(PLANT_COUNT)
+    start = perf_counter()
+    transform_dicts(dict_plants)
+    print(f"dict transform: {(perf_counter() - start) * 1000:.2f}ms")
+
+    batch = ReadingBatch.from_plants(plant_data)
+    start = perf_counter()
+    batch.normalise()
+    print(f"batch transform: {(perf_counter() - start) * 1000:.2f}ms")
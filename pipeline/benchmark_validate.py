@@ -0,0 +1,171 @@
+"""Benchmarks the single-pass validator against the original validation functions."""
+from copy import deepcopy
+from random import choice, random, seed
+from time import perf_counter
+
+from readings import ReadingBatch
+from validate import validate_plant_record
+
+
+RECORD_COUNT = 100_000
+
+
+# The pipeline's original validation functions, kept as the benchmark's baseline.
+def get_dict_of_missing_info(plant_dict: dict, keys: list):
+    """Returns a dict of missing keys and values."""
+    missing_info = {}
+    missing_keys = []
+    missing_values = []
+    for key in keys:
+        if key not in plant_dict:
+            missing_keys.append(key)
+        else:
+            if not plant_dict[key]:
+                missing_values.append(key)
+
+    if missing_keys:
+        missing_info["missing_keys"] = missing_keys
+    if missing_values:
+        missing_info["missing_values"] = missing_values
+
+    return missing_info
+
+
+def check_missing_keys(data: dict) -> dict:
+    """Check that the plant data has all valid keys."""
+
+    required_keys = ["plant_id", "name", "temperature", "origin_location", "botanist",
+                     "last_watered", "soil_moisture", "recording_taken"]
+
+    missing_info = get_dict_of_missing_info(data, required_keys)
+
+    return missing_info
+
+
+def check_missing_location_details(data: dict) -> dict:
+    """Checks that data has all relevant location details."""
+    location_details = data["origin_location"]
+
+    required_keys = ["latitude", "longitude", "country", "city"]
+    missing_info = get_dict_of_missing_info(location_details, required_keys)
+    return missing_info
+
+
+def check_missing_botanist_details(data: dict) -> dict:
+    """Checks that data has all relevant botanist details."""
+    botanist_details = data["botanist"]
+
+    required_keys = ["name", "email", "phone"]
+    missing_info = get_dict_of_missing_info(botanist_details, required_keys)
+    return missing_info
+
+
+def convert_int_to_2dp(data: dict) -> dict:
+    """Converts int to 2 decimal places."""
+    data["temperature"] = round(data["temperature"], 2)
+    data["soil_moisture"] = round(data["soil_moisture"], 2)
+    location = data["origin_location"]
+    location["latitude"] = round(location["latitude"], 2)
+    location["longitude"] = round(location["longitude"], 2)
+    return data
+
+
+def has_null_images_key(data: dict) -> bool:
+    """Returns True if the images key is present but is null in plant data."""
+
+    if "images" in data:
+        if not data["images"]:
+            return True
+
+    return False
+
+
+def validate_plant_data(data: dict) -> list[dict]:
+    """Checks that relevant keys are not missing from the plant data."""
+    all_missing_keys = []
+
+    missing_keys = check_missing_keys(data)
+
+    if missing_keys:
+        all_missing_keys.append(
+            f"Plant data is missing the following: {missing_keys}")
+        return all_missing_keys
+
+    missing_location_details = check_missing_location_details(data)
+    missing_botanist_details = check_missing_botanist_details(data)
+
+    if missing_location_details:
+        all_missing_keys.append(
+            f"Missing keys for location: {missing_location_details}")
+    if missing_botanist_details:
+        all_missing_keys.append(
+            f"Missing keys for botanist: {missing_botanist_details}")
+
+    return all_missing_keys
+
+
+def check_negative_moisture(data: dict) -> bool:
+    """Returns True if the soil moisture level is below 0."""
+    return data["soil_moisture"] < 0
+
+
+def make_synthetic_records(count: int) -> list[dict]:
+    """Makes plant records with a mix of null images, negative moisture and missing keys."""
+    seed(0)
+    records = []
+    for plant_id in range(count):
+        record = {
+            "plant_id": plant_id, "name": "Begonia", "temperature": random() * 40,
+            "origin_location": {"latitude": random() * 90, "longitude": random() * 180,
+                                "city": "South Julianview", "country": "Chad"},
+            "botanist": {"name": "Nathan Kuhic", "email": "nathan.kuhic@lnhm.co.uk",
+                         "phone": "(470) 586-3930 x591"},
+            "last_watered": "2025-06-03T13:32:05.000Z",
+            "soil_moisture": random() * 110 - 10,
+            "recording_taken": "2025-06-03T15:18:44.108Z",
+            "images": choice([None, {"original_url": "https://perenual.com/a.jpg"}])}
+        if plant_id % 50 == 0:
+            del record["botanist"]
+        records.append(record)
+    return records
+
+
+def validate_with_original_functions(records: list[dict]) -> int:
+    """Validates records the way the pipeline used to, returning the number of valid ones."""
+    valid = 0
+    for record in records:
+        if validate_plant_data(record):
+            continue
+        if has_null_images_key(record):
+            record.pop("images")
+        if check_negative_moisture(record):
+            record["soil_moisture"] = 0
+        convert_int_to_2dp(record)
+        valid += 1
+    return valid
+
+
+def validate_with_compiled_schema(records: list[dict]) -> int:
+    """Validates records with the single-pass validator and normalises their readings
+    as a batch, returning the number of valid ones."""
+    valid_records = [record for record in records if not validate_plant_record(record)]
+    ReadingBatch.from_plants(valid_records).normalise()
+    return len(valid_records)
+
+
+def time_validator(validator: "Callable", records: list[dict]) -> tuple[float, int]:
+    """Times a validator over a fresh copy of the records."""
+    records = deepcopy(records)
+    start = perf_counter()
+    valid = validator(records)
+    return perf_counter() - start, valid
+
+
+if __name__ == "__main__":
+    synthetic_records = make_synthetic_records(RECORD_COUNT)
+
+    for name, function in [("original", validate_with_original_functions),
+                           ("compiled", validate_with_compiled_schema)]:
+        seconds, valid_count = time_validator(function, synthetic_records)
+        print(f"{name:>9}: {seconds:.3f}s, {RECORD_COUNT / seconds:,.0f} records/s, "
+              f"{valid_count} valid")
@@ -0,0 +1,22 @@
+"""Factories shared by the pipeline tests."""
+
+import pytest
+
+
+@pytest.fixture(name="make_plant")
+def fixture_make_plant() -> "Callable[..., dict]":
+    """Gets a factory of plant records as returned by the API."""
+
+    def make_plant(plant_id: int = 7, temperature: float = 17.3512,
+                   soil_moisture: float = 93.861, phone: str = "(470) 586-3930 x591") -> dict:
+        """Makes a valid plant record as returned by the API, with the given readings."""
+
+        return {"plant_id": plant_id, "name": f"Plant {plant_id}", "temperature": temperature,
+                "origin_location": {"latitude": 14.3121, "longitude": 21.8912,
+                                    "city": "South Julianview", "country": "Chad"},
+                "botanist": {"name": "Nathan Kuhic", "email": "nathan.kuhic@lnhm.co.uk",
+                             "phone": phone},
+                "last_watered": "2025-06-03T13:32:05.000Z", "soil_moisture": soil_moisture,
+                "recording_taken": "2025-06-03T15:18:44.108Z"}
+
+    return make_plant
@@ -0,0 +1,119 @@
+"""A pool of database connections reused across warm Lambda invocations."""
+from collections import deque
+from contextlib import contextmanager
+from os import environ as ENV
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+from storage import DB_ERRORS
+
+
+POOL_SIZE = int(ENV.get("DB_POOL_SIZE", "4"))
+MAX_IDLE_SECONDS = float(ENV.get("DB_POOL_MAX_IDLE", "300"))
+PING_AFTER_SECONDS = float(ENV.get("DB_POOL_PING_AFTER", "30"))
+
+
+def is_alive(connection: "Connection") -> bool:
+    """Returns True if the connection can still run a query."""
+    try:
+        curs = connection.cursor()
+        curs.execute("SELECT 1")
+        curs.fetchone()
+        curs.close()
+        return True
+    except DB_ERRORS:
+        return False
+
+
+def close_quietly(connection: "Connection") -> None:
+    """Closes a connection, ignoring errors from one that is already broken."""
+    try:
+        connection.close()
+    except DB_ERRORS:
+        pass
+
+
+class ConnectionPool:
+    """Keeps idle connections open between runs so they skip the login handshake.
+
+    Connections idle for longer than max_idle are closed rather than reused.
+    A connection idle for longer than ping_after is checked with a cheap query
+    before it is reused, so a dropped connection is replaced by a new one
+    instead of failing the run. Connections handed straight back out, as
+    between the stages of one load, are not checked."""
+
+    def __init__(self, connect: Callable, max_size: int = POOL_SIZE,
+                 max_idle: float = MAX_IDLE_SECONDS, ping_after: float = PING_AFTER_SECONDS):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.idle = deque()
+        self.lock = Lock()
+        self.metrics = {"reused": 0, "opened": 0, "discarded": 0}
+
+    def acquire(self) -> "Connection":
+        """Gets a live connection, reusing an idle one if possible."""
+        while True:
+            with self.lock:
+                if not self.idle:
+                    self.metrics["opened"] += 1
+                    break
+                connection, released_at = self.idle.pop()
+
+            idle_for = monotonic() - released_at
+            if idle_for <= self.max_idle and (idle_for < self.ping_after
+                                              or is_alive(connection)):
+                with self.lock:
+                    self.metrics["reused"] += 1
+                return connection
+
+            close_quietly(connection)
+            with self.lock:
+                self.metrics["discarded"] += 1
+
+        return self.connect()
+
+    def release(self, connection: "Connection", healthy: bool = True) -> None:
+        """Returns a connection to the pool, or closes it if unhealthy or the pool is full."""
+        if healthy:
+            try:
+                connection.rollback()
+            except DB_ERRORS:
+                healthy = False
+
+        with self.lock:
+            if healthy and len(self.idle) < self.max_size:
+                self.idle.append((connection, monotonic()))
+                return
+            self.metrics["discarded"] += 1
+        close_quietly(connection)
+
+    @contextmanager
+    def connection(self):
+        """Lends a connection for the duration of a with block.
+
+        If the block raises, the connection is closed rather than returned."""
+        connection = self.acquire()
+        try:
+            yield connection
+        except Exception:
+            self.release(connection, healthy=False)
+            raise
+        self.release(connection)
+
+    def get_metrics(self) -> dict:
+        """Gets how often connections have been reused versus newly opened."""
+        with self.lock:
+            metrics = dict(self.metrics)
+        total = metrics["reused"] + metrics["opened"]
+        metrics["reuse_ratio"] = round(metrics["reused"] / total, 2) if total else 0.0
+        return metrics
+
+    def close_all(self) -> None:
+        """Closes every idle connection."""
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+        for connection, _ in idle:
+            close_quietly(connection)
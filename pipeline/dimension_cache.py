@@ -0,0 +1,77 @@
+"""In-memory cache of dimension table surrogate keys."""
+from os import environ as ENV
+from time import monotonic
+
+
+CACHE_TTL = float(ENV.get("DIMENSION_CACHE_TTL", "900"))
+
+WARM_QUERIES = {
+    "countries": "SELECT country_name, country_id FROM country",
+    "origins": "SELECT latitude, longitude, origin_id FROM origin",
+    "plants": "SELECT plant_name, plant_id FROM plant",
+    "botanists": "SELECT botanist_name, email, botanist_id FROM botanist",
+    "assignments": "SELECT botanist_id, plant_id FROM botanist_assignment",
+}
+
+
+def get_origin_key(latitude: float, longitude: float) -> tuple[float, float]:
+    """Gets a cache key for an origin, so DECIMAL and float coordinates match."""
+    return round(float(latitude), 4), round(float(longitude), 4)
+
+
+class DimensionCache:
+    """Surrogate keys for the dimension tables, keyed by their natural keys.
+
+    The cache lives at module level so it survives warm Lambda invocations. It
+    is warmed with one SELECT per table, updated as new rows are inserted and
+    re-warmed once it is older than the TTL."""
+
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self.warmed_at = None
+        self.countries = {}
+        self.origins = {}
+        self.plants = {}
+        self.botanists = {}
+        self.assignments = set()
+
+    def is_stale(self) -> bool:
+        """Returns True if the cache has never been warmed or is older than the TTL."""
+        return self.warmed_at is None or monotonic() - self.warmed_at > self.ttl
+
+    def warm(self, connection: "Connection") -> None:
+        """Loads every dimension key from the database, one query per table."""
+        curs = connection.cursor()
+        try:
+            rows = {}
+            for name, query in WARM_QUERIES.items():
+                curs.execute(query)
+                rows[name] = curs.fetchall()
+        finally:
+            curs.close()
+
+        self.countries = dict(rows["countries"])
+        self.origins = {get_origin_key(latitude, longitude): origin_id
+                        for latitude, longitude, origin_id in rows["origins"]}
+        self.plants = dict(rows["plants"])
+        self.botanists = {(name, email): botanist_id
+                          for name, email, botanist_id in rows["botanists"]}
+        self.assignments = set(map(tuple, rows["assignments"]))
+        self.warmed_at = monotonic()
+
+    def ensure_warm(self, connection: "Connection") -> None:
+        """Warms the cache if it is stale."""
+        if self.is_stale():
+            self.warm(connection)
+
+    def clear(self) -> None:
+        """Empties the cache so the next run re-warms it."""
+        self.warmed_at = None
+        self.countries.clear()
+        self.origins.clear()
+        self.plants.clear()
+        self.botanists.clear()
+        self.assignments.clear()
+
+
+DIMENSION_CACHE = DimensionCache()
@@ -1,21 +1,61 @@
 """Access the api and retrieve all plant data"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import count
+from os import environ as ENV
+from time import perf_counter, sleep
+from typing import Callable
 import json
 import logging
 from logging import Logger
 
 import requests
-from joblib import Parallel, delayed
+from requests.adapters import HTTPAdapter
 
-from validate import (check_status_code, validate_plant_data, convert_int_to_2dp,
-                      has_null_images_key, check_negative_moisture)
+from resilience import CircuitBreaker, Deadline, get_backoff_delay
+from validate import check_status_code, validate_plant_record
+
+
+API_URL = ENV.get("PLANT_API_URL", "https://sigma-labs-bot.herokuapp.com/api/plants")
+MAX_WORKERS = int(ENV.get("EXTRACT_MAX_WORKERS", "10"))
+MAX_MISSES = int(ENV.get("EXTRACT_MAX_MISSES", "5"))
+MAX_RETRIES = int(ENV.get("EXTRACT_MAX_RETRIES", "3"))
+REQUEST_TIMEOUT = float(ENV.get("EXTRACT_REQUEST_TIMEOUT", "5"))
+DEADLINE_SECONDS = float(ENV.get("EXTRACT_DEADLINE_SECONDS", "45"))
+
+BREAKER = CircuitBreaker()
+
+
+@dataclass
+class FetchResult:
+    """The outcome of fetching a single plant from the api."""
+    plant_id: int
+    data: dict = None
+    status_code: int = None
+    error: str = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """Returns True if plant data was returned."""
+        return self.error is None and self.status_code == 200
+
+    @property
+    def missing(self) -> bool:
+        """Returns True if the api has no plant for the ID."""
+        return self.error is None and self.status_code == 404
 
 
 def add_logger() -> Logger:
     """Sets a logger that logs to invalid_plant_data file."""
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
-    stream_handler = logging.StreamHandler()
-    logger.addHandler(stream_handler)
+    if not logger.handlers:
+        stream_handler = logging.StreamHandler()
+        logger.addHandler(stream_handler)
     return logger
 
 
@@ -25,42 +65,144 @@ def load_to_json(output: list[dict]) -> None:
         json.dump(output, file, indent=4)
 
 
-def get_data(plant_id: str, logger: Logger) -> dict:
-    """Retrieve data from api for a given ID."""
-    res = requests.get(
-        f"https://sigma-labs-bot.herokuapp.com/api/plants/{plant_id}", timeout=5)
-    try:
-        check_status_code(res)
-        data = res.json()
-        return data
-    except (ValueError, RuntimeError, PermissionError) as e:
-        logger.error(f"Error fetching data: {e}")
-
-
-def retrieve_all_data(logger: Logger) -> list[dict]:
-    """Fetches all plant data from the api for a given range."""
-    output_data = []
-    plant_ids = range(1, 54)
-    fetched_data = Parallel(n_jobs=10)(
-        delayed(get_data)(i, logger) for i in plant_ids)
-    logger.info("Plant data fetched from API.")
-    for plant_data in fetched_data:
+@lru_cache
+def get_session(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """Returns a keep-alive session with a connection pool per host.
+
+    The session is cached so warm Lambda invocations reuse open connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_data(plant_id: str, logger: Logger, session: requests.Session = None,
+             deadline: Deadline = None) -> FetchResult:
+    """Retrieve data from api for a given ID.
+
+    Server errors and timeouts are retried with jittered exponential backoff
+    while the circuit breaker is closed and the deadline allows it. A 404 is
+    a missing plant whatever its body holds, so the body is not parsed. Any
+    other request error is returned in the result rather than raised."""
+    client = session or requests
+    deadline = deadline or Deadline(DEADLINE_SECONDS)
+    result = FetchResult(plant_id)
+    start = perf_counter()
+
+    while result.attempts <= MAX_RETRIES:
+        if deadline.expired():
+            result.error = "Extract deadline exceeded."
+            break
+        if not BREAKER.allow_request():
+            result.error = "Circuit breaker is open."
+            break
+
+        result.attempts += 1
         try:
-            if validate_plant_data(plant_data):
-                logger.error(f"Plant data is invalid: {plant_data}")
-            else:
-                if has_null_images_key(plant_data):
-                    plant_data.pop("images")
-                if check_negative_moisture(plant_data):
-                    plant_data["soil_moisture"] = 0
-                converted_data = convert_int_to_2dp(plant_data)
-                output_data.append(converted_data)
-        except TypeError as e:
-            logger.error(f"Error when validating plant data: {e}")
+            res = client.get(f"{API_URL}/{plant_id}",
+                             timeout=deadline.timeout(REQUEST_TIMEOUT))
+            result.status_code = res.status_code
+            if res.status_code != 404:
+                check_status_code(res)
+                result.data = res.json()
+            result.error = None
+            BREAKER.record_success()
+            break
+        except (RuntimeError, requests.Timeout, requests.ConnectionError) as e:
+            BREAKER.record_failure()
+            result.error = str(e)
+            delay = get_backoff_delay(result.attempts)
+            if result.attempts > MAX_RETRIES or delay >= deadline.remaining():
+                break
+            sleep(delay)
+        except (ValueError, PermissionError, requests.RequestException) as e:
+            result.error = str(e)
+            break
+        finally:
+            BREAKER.release_trial()
+
+    result.elapsed = perf_counter() - start
+    if result.error:
+        logger.error(f"Error fetching data for plant {plant_id}: {result.error}")
+    return result
+
+
+def get_shard_plant_ids(shard: int = 0, shard_count: int = 1):
+    """Returns an endless iterator of the plant IDs belonging to a shard.
+
+    IDs are striped across shards so each shard gets an even share of the ID space."""
+    if not 0 <= shard < shard_count:
+        raise ValueError(f"Shard {shard} is out of range for {shard_count} shards.")
+    return count(1 + shard, shard_count)
+
+
+def clean_plant_data(plant_data: dict, logger: Logger) -> dict:
+    """Validates and converts a single plant's data, returning None if it is invalid."""
+    errors = validate_plant_record(plant_data)
+    if errors:
+        logger.error(f"Plant data is invalid: {errors}")
+        return None
+    return plant_data
+
+
+def stream_plant_data(logger: Logger, shard: int = 0, shard_count: int = 1,
+                      max_workers: int = MAX_WORKERS, max_misses: int = MAX_MISSES,
+                      deadline: Deadline = None, on_fetch: Callable = None):
+    """Yields each plant's validated data as soon as its response arrives.
+
+    At most max_workers requests are in flight, so memory does not grow with the
+    number of plants. IDs are submitted in order until a run of max_misses missing
+    plants is seen, the deadline passes or the circuit breaker opens. Submission
+    runs at most max_workers + max_misses IDs ahead of the last resolved ID, so a
+    slow ID in backoff cannot let the workers probe far past the last plant. If
+    given, on_fetch is called with every FetchResult, e.g. to record latencies."""
+    plant_ids = get_shard_plant_ids(shard, shard_count)
+    deadline = deadline or Deadline(DEADLINE_SECONDS)
+    session = get_session(max_workers)
+    max_ahead = max_workers + max_misses
+    submitted = deque()
+    missing = {}
+    misses = 0
+    in_flight = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            while len(in_flight) < max_workers and len(submitted) < max_ahead \
+                    and misses < max_misses and not deadline.expired() \
+                    and not BREAKER.is_open:
+                plant_id = next(plant_ids)
+                submitted.append(plant_id)
+                in_flight.add(executor.submit(
+                    get_data, plant_id, logger, session, deadline))
+            if not in_flight:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if on_fetch:
+                    on_fetch(result)
+                missing[result.plant_id] = result.missing
+                if result.ok:
+                    plant_data = clean_plant_data(result.data, logger)
+                    if plant_data:
+                        yield plant_data
+
+            while misses < max_misses and submitted and submitted[0] in missing:
+                misses = misses + 1 if missing.pop(submitted.popleft()) else 0
+
+
+def retrieve_all_data(logger: Logger, shard: int = 0, shard_count: int = 1,
+                      max_workers: int = MAX_WORKERS, on_fetch: Callable = None) -> list[dict]:
+    """Fetches all plant data from the api for the given shard of plant IDs."""
+    output_data = list(stream_plant_data(logger, shard, shard_count, max_workers,
+                                         on_fetch=on_fetch))
+    logger.info(f"{len(output_data)} plants fetched from API.")
     return output_data
 
 
 if __name__ == "__main__":
     terminal_logger = add_logger()
-    plant_data = retrieve_all_data(terminal_logger)
-    load_to_json(plant_data)
+    plants = retrieve_all_data(terminal_logger)
+    load_to_json(plants)
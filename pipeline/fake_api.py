@@ -0,0 +1,142 @@
+"""A local stand-in for the LMNH plants API, for testing the extractor offline."""
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from random import Random
+from threading import Thread
+from time import sleep
+import json
+
+
+COUNTRIES = ["Chad", "Saint Kitts and Nevis", "Heard Island and McDonald Islands",
+             "Brazil", "Japan", "Peru"]
+PLANT_NAMES = ["Begonia", "Pitcher plant", "Venus flytrap", "Bird of paradise",
+               "Cactus", "Orchid", "Snake plant", "Fern"]
+BOTANISTS = [("Nathan Kuhic", "(470) 586-3930 x591"), ("Benny Block", "687-647-1094"),
+             ("Gertrude Jekyll", "001-481-273-3691x127")]
+
+
+def make_plant(plant_id: int, rng: Random) -> dict:
+    """Makes a realistic API payload for a plant.
+
+    A plant's details, such as its origin, come from a generator seeded with
+    its ID, so they are the same on every request. Only its readings are drawn
+    from the shared rng. Some plants deliberately have null images, negative
+    soil moisture or a missing botanist, so every case handled by validate.py
+    is exercised."""
+    botanist_name, phone = BOTANISTS[plant_id % len(BOTANISTS)]
+    details = Random(plant_id)
+    plant = {
+        "plant_id": plant_id,
+        "name": f"{PLANT_NAMES[plant_id % len(PLANT_NAMES)]} {plant_id}",
+        "temperature": rng.uniform(8, 35),
+        "origin_location": {
+            "latitude": details.uniform(-90, 90),
+            "longitude": details.uniform(-180, 180),
+            "city": f"City {plant_id % 20}",
+            "country": COUNTRIES[plant_id % len(COUNTRIES)],
+        },
+        "botanist": {
+            "name": botanist_name,
+            "email": f"{botanist_name.lower().replace(' ', '.')}@lnhm.co.uk",
+            "phone": phone,
+        },
+        "last_watered": "2025-06-03T13:32:05.000Z",
+        "soil_moisture": rng.uniform(10, 100),
+        "recording_taken": "2025-06-03T15:18:44.108Z",
+        "scientific_name": [f"Plantae {plant_id}"],
+        "images": {"original_url": f"https://perenual.com/storage/image/{plant_id}.jpg"},
+    }
+
+    if plant_id % 7 == 0:
+        plant["images"] = None
+    if plant_id % 11 == 0:
+        plant["soil_moisture"] = -rng.uniform(0, 5)
+    if plant_id % 13 == 0:
+        del plant["botanist"]
+
+    return plant
+
+
+def make_handler(plant_count: int, latency: float, error_rate: float,
+                 seed: int = None) -> type:
+    """Makes a request handler class serving /api/plants/{id} with the given behaviour."""
+    rng = Random(seed)
+
+    class PlantHandler(BaseHTTPRequestHandler):
+        """Serves plant payloads, 404s for unknown plants and random 500s."""
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Responds to a request for a single plant."""
+            sleep(latency)
+            prefix = "/api/plants/"
+            if not self.path.startswith(prefix) or not self.path[len(prefix):].isdigit():
+                self.send_json(404, {"error": "not found"})
+                return
+
+            plant_id = int(self.path[len(prefix):])
+            if rng.random() < error_rate:
+                self.send_json(500, {"error": "internal server error"})
+            elif not 1 <= plant_id <= plant_count:
+                self.send_json(404, {"error": "plant not found", "plant_id": plant_id})
+            else:
+                self.send_json(200, make_plant(plant_id, rng))
+
+        def send_json(self, status_code: int, body: dict) -> None:
+            """Sends a JSON response."""
+            payload = json.dumps(body).encode()
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            """Silences per-request logging."""
+
+    return PlantHandler
+
+
+class FakeAPIServer(ThreadingHTTPServer):
+    """A threaded server with a backlog large enough for bursts of concurrent requests."""
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(plant_count: int = 53, latency: float = 0.0, error_rate: float = 0.0,
+                port: int = 0, seed: int = None) -> FakeAPIServer:
+    """Makes a fake API server, on a free port if none is given."""
+    return FakeAPIServer(("127.0.0.1", port),
+                         make_handler(plant_count, latency, error_rate, seed))
+
+
+def start_server(plant_count: int = 53, latency: float = 0.0, error_rate: float = 0.0,
+                 port: int = 0, seed: int = None) -> FakeAPIServer:
+    """Starts the fake API on a background thread and returns the server."""
+    server = make_server(plant_count, latency, error_rate, port, seed)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_api_url(server: FakeAPIServer) -> str:
+    """Gets the base URL for plants served by the fake API."""
+    return f"http://127.0.0.1:{server.server_port}/api/plants"
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Runs a local stand-in for the plants API.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--plants", type=int, default=53)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds to wait before each response.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with a 500.")
+    options = parser.parse_args()
+
+    fake_server = make_server(options.plants, options.latency, options.error_rate, options.port)
+    print(f"Serving {options.plants} plants at {get_api_url(fake_server)}")
+    try:
+        fake_server.serve_forever()
+    except KeyboardInterrupt:
+        fake_server.server_close()
@@ -0,0 +1,85 @@
+"""Fingerprints of each plant's dimension data, used to skip unchanged rows."""
+from hashlib import blake2b
+
+
+def get_botanist_slice(plant: dict) -> tuple:
+    """Gets the botanist fields of a plant."""
+    botanist = plant["botanist"]
+    return botanist["name"], botanist["email"], botanist["phone"]
+
+
+def get_origin_slice(plant: dict) -> tuple:
+    """Gets the origin location fields of a plant."""
+    location = plant["origin_location"]
+    return location["latitude"], location["longitude"], location["city"], location["country"]
+
+
+def get_plant_slice(plant: dict) -> tuple:
+    """Gets the plant master fields of a plant."""
+    return (plant["name"], plant.get("scientific_name"),
+            (plant.get("images") or {}).get("original_url"))
+
+
+DIMENSION_SLICES = {
+    "botanist": get_botanist_slice,
+    "origin": get_origin_slice,
+    "plant": get_plant_slice,
+}
+
+
+def get_fingerprint(values: tuple) -> bytes:
+    """Hashes a slice of plant fields into a 16 byte fingerprint."""
+    return blake2b(repr(values).encode(), digest_size=16).digest()
+
+
+class FingerprintStore:
+    """The fingerprint of every plant's botanist, origin and plant master data
+    from previous runs, keyed by (plant_id, dimension).
+
+    Fingerprints are kept in memory across warm Lambda invocations and
+    persisted to the load_fingerprint table for cold starts."""
+
+    def __init__(self):
+        self.fingerprints = {}
+        self.loaded = False
+
+    def ensure_loaded(self, connection: "Connection") -> None:
+        """Reads the stored fingerprints from the database if not yet in memory."""
+        if self.loaded:
+            return
+        curs = connection.cursor()
+        try:
+            curs.execute("SELECT plant_id, dimension, fingerprint FROM load_fingerprint")
+            self.fingerprints = {(plant_id, dimension): bytes(fingerprint)
+                                 for plant_id, dimension, fingerprint in curs.fetchall()}
+        finally:
+            curs.close()
+        self.loaded = True
+
+    def get_changes(self, plants_data: list[dict]) -> tuple[dict, dict]:
+        """Finds the plants whose dimension data has changed since the last run.
+
+        Returns the changed plants per dimension, and the new fingerprints to
+        save once they have been loaded."""
+        changed = {dimension: [] for dimension in DIMENSION_SLICES}
+        pending = {}
+        for plant in plants_data:
+            for dimension, get_slice in DIMENSION_SLICES.items():
+                key = (plant["plant_id"], dimension)
+                fingerprint = get_fingerprint(get_slice(plant))
+                if self.fingerprints.get(key) != fingerprint:
+                    changed[dimension].append(plant)
+                    pending[key] = fingerprint
+        return changed, pending
+
+    def update(self, pending: dict) -> None:
+        """Records fingerprints that have been saved."""
+        self.fingerprints.update(pending)
+
+    def clear(self) -> None:
+        """Forgets every fingerprint so the next run reloads them."""
+        self.fingerprints = {}
+        self.loaded = False
+
+
+FINGERPRINTS = FingerprintStore()
@@ -1,45 +1,68 @@
-"""Script for loading data into the SQL Server database."""
+"""Script for loading data into the plants database."""
 
 from os import environ as ENV
+from contextlib import nullcontext
+from functools import partial
+from itertools import islice
+from typing import NamedTuple
 import json
 
 from dotenv import load_dotenv
-import pyodbc
+
+from db_pool import ConnectionPool
+from dimension_cache import DIMENSION_CACHE, get_origin_key
+from fingerprint import FINGERPRINTS
+from readings import PlantReading, ReadingBatch
+from scheduler import Stage, run_stages
+from storage import BACKEND, DB_ERRORS
+
+
+BATCH_SIZE = int(ENV.get("LOAD_BATCH_SIZE", "25"))
+MAX_WORKERS = int(ENV.get("LOAD_MAX_WORKERS", "3"))
+
+ALL_OR_NOTHING = "all_or_nothing"
+SKIP_BAD_ROWS = "skip_bad_rows"
+FAILURE_MODE = ENV.get("LOAD_FAILURE_MODE", ALL_OR_NOTHING)
+
+READING_KEY = ["plant_id", "taken_at"]
+READING_COLUMNS = ["taken_at", "temperature", "last_watered", "soil_moisture", "plant_id"]
+WINDOW_COLUMNS = ["plant_id", "taken_at", "temperature", "soil_moisture"]
+WINDOW_SIZE = int(ENV.get("READING_WINDOW_SIZE", "3"))
+
+
+class ReadingCounts(NamedTuple):
+    """Numbers of readings inserted, and skipped because they were already loaded."""
+    new: int = 0
+    duplicate: int = 0
+
+
+class BatchReport(NamedTuple):
+    """The reading counts of a loaded batch, and the timing of each load stage."""
+    readings: ReadingCounts
+    stages: dict
 
 
 def get_db_connection():
-    """Gets a connection to the SQL Server plants database."""
+    """Gets a connection to the plants database using the configured backend."""
 
-    connection = pyodbc.connect(driver=ENV["DB_DRIVER"],
-                                server=ENV["DB_HOST"],
-                                database=ENV["DB_NAME"],
-                                TrustServerCertificate='yes',
-                                UID=ENV["DB_USER"],
-                                PWD=ENV["DB_PASSWORD"],)
+    return BACKEND.connect()
 
-    return connection
+
+DB_POOL = ConnectionPool(get_db_connection)
 
 
 def get_db_cursor(connection: "Connection") -> "Cursor":
-    """Gets a cursor for the SQL Server plants database."""
+    """Gets a cursor for the plants database."""
 
     cursor = connection.cursor()
 
     return cursor
 
 
-def get_sensor_reading_data(plant: dict) -> dict:
+def get_sensor_reading_data(plant: dict) -> PlantReading:
     """Gets the sensor reading data from API data for a single plant."""
 
-    sensor_reading = {}
-
-    sensor_reading["taken_at"] = plant["recording_taken"]
-    sensor_reading["temperature"] = plant["temperature"]
-    sensor_reading["last_watered"] = plant["last_watered"]
-    sensor_reading["soil_moisture"] = plant["soil_moisture"]
-    sensor_reading["plant_id"] = plant["plant_id"]
-
-    return sensor_reading
+    return PlantReading.from_plant(plant)
 
 
 def get_plant_master_data(plant: dict) -> dict:
@@ -60,210 +83,487 @@ def get_plant_master_data(plant: dict) -> dict:
     return plant_master
 
 
-def get_country_id(connection: "Connection", plant: dict) -> dict:
-    """Gets the corresponding country ID from database using country name."""
+def get_country_id(connection: "Connection", plant: dict) -> int:
+    """Gets the corresponding country ID using country name, from the cache if possible."""
 
-    curs = get_db_cursor(connection)
+    country = plant["origin_location"]["country"]
 
-    curs.execute("SELECT country_id FROM country WHERE country_name = ?",
-                 plant["origin_location"]["country"])
-    result = curs.fetchone()[0]
+    if country not in DIMENSION_CACHE.countries:
+        curs = get_db_cursor(connection)
+        curs.execute("SELECT country_id FROM country WHERE country_name = ?",
+                     (country,))
+        DIMENSION_CACHE.countries[country] = curs.fetchone()[0]
 
-    return result
+    return DIMENSION_CACHE.countries[country]
 
 
-def get_origin_id(connection: "Connection", location_data: dict) -> dict:
-    """Gets the corresponding origin ID from database using longitude and latitude."""
+def get_origin_id(connection: "Connection", location_data: dict) -> int:
+    """Gets the corresponding origin ID using longitude and latitude, from the cache if possible."""
 
-    curs = get_db_cursor(connection)
+    key = get_origin_key(location_data["latitude"], location_data["longitude"])
 
-    curs.execute("SELECT country_id FROM origin WHERE longitude = ? AND latitude = ?",
-                 (location_data["longitude"], location_data["latitude"]))
-    result = curs.fetchone()[0]
+    if key not in DIMENSION_CACHE.origins:
+        curs = get_db_cursor(connection)
+        curs.execute("SELECT origin_id FROM origin WHERE longitude = ? AND latitude = ?",
+                     (location_data["longitude"], location_data["latitude"]))
+        DIMENSION_CACHE.origins[key] = curs.fetchone()[0]
 
-    return result
+    return DIMENSION_CACHE.origins[key]
 
 
-def get_plant_id(connection: "Connection", plant_data: dict) -> dict:
-    """Gets the corresponding origin ID from database using longitude and latitude."""
+def match_plant_name(column: str, value: str) -> str:
+    """Makes a case-sensitive match of a plant name column to a value.
 
-    curs = get_db_cursor(connection)
+    The plain comparison can seek ix_plant_plant_name, and the collated one then
+    rejects names that only differ in case. A collated comparison on its own
+    would scan the whole index."""
 
-    curs.execute("""SELECT plant_id
-                    FROM plant 
-                    WHERE plant_name 
-                    COLLATE SQL_Latin1_General_CP1_CS_AS 
-                    LIKE ?""",
-                 plant_data["name"])
-    result = curs.fetchone()[0]
+    return f"{column} = {value} AND {column} = {value} {BACKEND.case_sensitive}"
 
-    return result
 
+def get_plant_id(connection: "Connection", plant_data: dict) -> int:
+    """Gets the corresponding plant ID using plant name, from the cache if possible."""
 
-def get_botanist_id(connection: "Connection", plant_data: dict) -> dict:
-    """Gets the corresponding botanist ID from database using botanist name and email."""
+    plant_name = plant_data["name"]
 
-    curs = get_db_cursor(connection)
+    if plant_name not in DIMENSION_CACHE.plants:
+        curs = get_db_cursor(connection)
+        curs.execute(f"""SELECT plant_id
+                        FROM plant
+                        WHERE {match_plant_name("plant_name", "?")}""",
+                     (plant_name, plant_name))
+        DIMENSION_CACHE.plants[plant_name] = curs.fetchone()[0]
+
+    return DIMENSION_CACHE.plants[plant_name]
+
+
+def get_botanist_id(connection: "Connection", plant_data: dict) -> int:
+    """Gets the corresponding botanist ID using botanist name and email,
+    from the cache if possible."""
+
+    key = (plant_data["botanist"]["name"], plant_data["botanist"]["email"])
+
+    if key not in DIMENSION_CACHE.botanists:
+        curs = get_db_cursor(connection)
+        curs.execute("""SELECT botanist_id
+                        FROM botanist
+                        WHERE botanist_name = ?
+                        AND email = ?""",
+                     key)
+        DIMENSION_CACHE.botanists[key] = curs.fetchone()[0]
 
-    curs.execute("""SELECT botanist_id
-                    FROM botanist
-                    WHERE botanist_name = ?
-                    AND email = ?""",
-                 (plant_data["botanist"]["name"],
-                  plant_data["botanist"]["email"]))
-    result = curs.fetchone()[0]
+    return DIMENSION_CACHE.botanists[key]
 
-    return result
+
+def stage_rows(curs: "Cursor", table: str, columns: str, rows: list[tuple]) -> None:
+    """Bulk-copies rows into a fresh temporary staging table in one batched statement."""
+
+    curs.execute(f"DROP TABLE IF EXISTS {table}")
+    curs.execute(f"CREATE TABLE {table} ({columns})")
+    BACKEND.prepare_bulk_insert(curs)
+    curs.executemany(
+        f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
 
 
 def load_botanist_assignment_data(connection: "Connection", plants_data: list[dict]) -> None:
-    """Loads botanist assignment data from dictionary to botanist assignment table in database."""
-
-    insert_query = """
-                IF NOT EXISTS (
-                    SELECT 1 FROM botanist_assignment
-                    WHERE botanist_id = ?
-                    AND plant_id = ?)
-                BEGIN
-                    INSERT INTO botanist_assignment
-                    VALUES (?, ?)
-                END
-                """
+    """Loads botanist assignment data from dictionary to botanist assignment table in database.
 
-    curs = get_db_cursor(connection)
+    Plant and botanist IDs are resolved by joining the staged names in the insert."""
+
+    staged = {}
     for plant in plants_data:
-        plant_id = get_plant_id(connection, plant)
-        botanist_id = get_botanist_id(connection, plant)
-        curs.execute(
-            insert_query, (botanist_id,
-                           plant_id,
-                           botanist_id,
-                           plant_id)
-        )
-        connection.commit()
+        plant_id = DIMENSION_CACHE.plants.get(plant["name"])
+        botanist = plant["botanist"]
+        botanist_id = DIMENSION_CACHE.botanists.get((botanist["name"], botanist["email"]))
+        if (botanist_id, plant_id) not in DIMENSION_CACHE.assignments:
+            staged[plant["name"], botanist["name"], botanist["email"]] = None
+    if not staged:
+        return
+
+    curs = get_db_cursor(connection)
+    staging = BACKEND.staging_table("assignment_staging")
+    stage_rows(curs, staging,
+               "plant_name VARCHAR(40), botanist_name VARCHAR(40), email VARCHAR(50)",
+               list(staged))
+    curs.execute(f"""
+                INSERT INTO botanist_assignment (botanist_id, plant_id)
+                SELECT DISTINCT b.botanist_id, p.plant_id
+                FROM {staging} AS s
+                JOIN plant AS p
+                    ON {match_plant_name("p.plant_name", "s.plant_name")}
+                JOIN botanist AS b
+                    ON b.botanist_name = s.botanist_name AND b.email = s.email
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM botanist_assignment AS ba {BACKEND.key_lock}
+                    WHERE ba.botanist_id = b.botanist_id
+                    AND ba.plant_id = p.plant_id)
+                """)
+    curs.execute(f"""
+                SELECT ba.botanist_id, ba.plant_id
+                FROM botanist_assignment AS ba
+                JOIN plant AS p ON p.plant_id = ba.plant_id
+                JOIN botanist AS b ON b.botanist_id = ba.botanist_id
+                JOIN {staging} AS s
+                    ON {match_plant_name("p.plant_name", "s.plant_name")}
+                    AND b.botanist_name = s.botanist_name AND b.email = s.email
+                """)
+    DIMENSION_CACHE.assignments.update(
+        (botanist_id, plant_id) for botanist_id, plant_id in curs.fetchall())
+    connection.commit()
 
 
 def load_botanist_data(connection: "Connection", plants_data: list[dict]) -> None:
     """Loads botanist data from dictionary to botanist table in database."""
 
-    insert_query = """
-                IF NOT EXISTS (
-                    SELECT 1 FROM botanist
-                    WHERE botanist_name = ?
-                    AND email = ?)
-                BEGIN
-                    INSERT INTO botanist
-                    VALUES (?, ?, ?)
-                END
-                """
-
-    curs = get_db_cursor(connection)
+    staged = {}
     for plant in plants_data:
         botanist = plant["botanist"]
-        curs.execute(
-            insert_query, (botanist["name"],
-                           botanist["email"],
-                           botanist["name"],
-                           botanist["email"],
-                           botanist["phone"]))
-        connection.commit()
+        key = (botanist["name"], botanist["email"])
+        if key not in DIMENSION_CACHE.botanists:
+            staged[key] = (botanist["name"], botanist["email"], botanist["phone"])
+    if not staged:
+        return
+
+    curs = get_db_cursor(connection)
+    staging = BACKEND.staging_table("botanist_staging")
+    stage_rows(curs, staging,
+               "botanist_name VARCHAR(40), email VARCHAR(50), phone VARCHAR(21)",
+               list(staged.values()))
+    curs.execute(BACKEND.insert_new_query("botanist", staging, ["botanist_name", "email"],
+                                          ["botanist_name", "email", "phone"]))
+    curs.execute(f"""
+                SELECT b.botanist_name, b.email, b.botanist_id
+                FROM botanist AS b
+                JOIN {staging} AS s
+                    ON b.botanist_name = s.botanist_name AND b.email = s.email
+                """)
+    DIMENSION_CACHE.botanists.update(
+        ((name, email), botanist_id) for name, email, botanist_id in curs.fetchall())
+    connection.commit()
 
 
 def load_plant_master_data(connection: "Connection", plants_data: list[dict]) -> None:
-    """Loads plant master data from dictionary to plant table in SQL Server database."""
-
-    insert_query = """
-                IF NOT EXISTS (
-                    SELECT 1 FROM plant
-                    WHERE plant_name = ?
-                    AND origin_id = ?)
-                BEGIN
-                    INSERT INTO plant
-                    VALUES (?, ?, ?, ?)
-                END
-                """
+    """Loads plant master data from dictionary to plant table in database.
 
-    curs = get_db_cursor(connection)
+    Origin IDs are resolved by joining the staged coordinates in the insert."""
+
+    staged = {}
     for plant in plants_data:
+        if plant["name"] in DIMENSION_CACHE.plants:
+            continue
         data = get_plant_master_data(plant)
-        origin_id = get_origin_id(connection, plant["origin_location"])
-
-        curs.execute(
-            insert_query, (data["plant_name"],
-                           origin_id,
-                           data["plant_name"],
-                           origin_id,
-                           data["scientific_name"],
-                           data["image_link"]))
-        connection.commit()
-
-
-def load_sensor_reading_data(connection: "Connection", plants_data: list[dict]) -> None:
-    """Loads sensor reading data from dictionary to sensor reading table in SQL Server database."""
+        location = plant["origin_location"]
+        staged[data["plant_name"]] = (data["plant_name"],
+                                      location["latitude"],
+                                      location["longitude"],
+                                      data["scientific_name"],
+                                      data["image_link"])
+    if not staged:
+        return
 
-    insert_query = """
-                INSERT INTO sensor_reading
-                VALUES (?, ?, ?, ?, ?)
-                """
+    curs = get_db_cursor(connection)
+    staging = BACKEND.staging_table("plant_staging")
+    stage_rows(curs, staging,
+               """plant_name VARCHAR(40), latitude DECIMAL(6, 4), longitude DECIMAL(7, 4),
+               scientific_name VARCHAR(40), image_link VARCHAR(255)""",
+               list(staged.values()))
+    curs.execute(f"""
+                INSERT INTO plant (plant_name, origin_id, scientific_name, image_link)
+                SELECT s.plant_name, o.origin_id, s.scientific_name, s.image_link
+                FROM {staging} AS s
+                JOIN origin AS o
+                    ON o.latitude = s.latitude AND o.longitude = s.longitude
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM plant AS p {BACKEND.key_lock}
+                    WHERE p.plant_name = s.plant_name
+                    AND p.origin_id = o.origin_id)
+                """)
+    curs.execute(f"""
+                SELECT p.plant_name, p.plant_id
+                FROM plant AS p
+                JOIN {staging} AS s
+                    ON {match_plant_name("p.plant_name", "s.plant_name")}
+                """)
+    DIMENSION_CACHE.plants.update(
+        (plant_name, plant_id) for plant_name, plant_id in curs.fetchall())
+    connection.commit()
+
+
+def get_loaded_readings(rows: "Iterable[tuple]", plant_names: dict) -> list[tuple]:
+    """Gets (plant_id, plant_name, taken_at, temperature, soil_moisture) from staged rows."""
+
+    return [(plant_id, plant_names[plant_id], taken_at, temperature, soil_moisture)
+            for taken_at, temperature, _, soil_moisture, plant_id in rows]
+
+
+def update_reading_window(curs: "Cursor", staging: str, window_size: int = WINDOW_SIZE) -> None:
+    """Adds staged readings to latest_reading, keeping only the newest window_size per plant.
+
+    Only the staged plants' rows are trimmed, so the cost depends on the
+    batch and the window size, not on how many readings have been loaded."""
+
+    curs.execute(BACKEND.insert_new_query("latest_reading", staging,
+                                          READING_KEY, WINDOW_COLUMNS))
+    curs.execute(f"""
+                DELETE FROM latest_reading
+                WHERE plant_id IN (SELECT plant_id FROM {staging})
+                AND (SELECT COUNT(*) FROM latest_reading AS newer
+                    WHERE newer.plant_id = latest_reading.plant_id
+                    AND newer.taken_at > latest_reading.taken_at) >= ?
+                """, (window_size,))
+
+
+def load_sensor_reading_data(connection: "Connection", plants_data: list[dict],
+                             failure_mode: str = FAILURE_MODE,
+                             on_readings: "Callable" = None) -> ReadingCounts:
+    """Loads sensor reading data from dictionary to sensor reading table in database.
+
+    Readings are staged and inserted with one statement that skips any whose
+    (plant_id, taken_at) is already in the table, so repeated polls and
+    overlapping runs do not create duplicates, and are committed once with
+    the update to each plant's window of latest readings. In
+    all_or_nothing mode any bad row rolls back the batch and raises. In
+    skip_bad_rows mode out-of-range readings are dropped up front and, if the
+    batch still fails, rows are retried one by one within a single commit.
+    If given, on_readings is called once the batch is committed with its
+    (plant_id, plant_name, taken_at, temperature, soil_moisture) readings, so
+    alerts can be decided without reading them back. Returns the number of
+    new and duplicate readings."""
+
+    readings = ReadingBatch.from_plants(plants_data).normalise()
+    if failure_mode == SKIP_BAD_ROWS:
+        readings = readings.select(readings.valid_mask())
+
+    rows, plant_names = {}, {}
+    for taken_at, temperature, last_watered, soil_moisture, plant_name in readings.rows():
+        plant_id = get_plant_id(connection, {"name": plant_name})
+        plant_names[plant_id] = plant_name
+        rows.setdefault((plant_id, taken_at),
+                        (taken_at, temperature, last_watered, soil_moisture, plant_id))
+    if not rows:
+        return ReadingCounts(0, len(readings))
 
     curs = get_db_cursor(connection)
-    for plant in plants_data:
-        reading = get_sensor_reading_data(plant)
-        curs.execute(
-            insert_query, (reading["taken_at"],
-                           reading["temperature"],
-                           reading["last_watered"],
-                           reading["soil_moisture"],
-                           get_plant_id(connection, plant)))
+    staging = BACKEND.staging_table("reading_staging")
+    columns = """taken_at DATETIME2(0), temperature DECIMAL(5, 2), last_watered DATETIME2(0),
+               soil_moisture DECIMAL(5, 2), plant_id SMALLINT"""
+    insert_query = BACKEND.insert_new_query("sensor_reading", staging,
+                                            READING_KEY, READING_COLUMNS)
+    try:
+        stage_rows(curs, staging, columns, list(rows.values()))
+        curs.execute(insert_query)
+        new = curs.rowcount
+        update_reading_window(curs, staging)
         connection.commit()
+        if on_readings:
+            on_readings(get_loaded_readings(rows.values(), plant_names))
+        return ReadingCounts(new, len(readings) - new)
+    except DB_ERRORS:
+        connection.rollback()
+        if failure_mode != SKIP_BAD_ROWS:
+            raise
+
+    new = duplicate = 0
+    loaded = []
+    for row in rows.values():
+        try:
+            stage_rows(curs, staging, columns, [row])
+            curs.execute(insert_query)
+        except DB_ERRORS:
+            continue
+        inserted = curs.rowcount
+        update_reading_window(curs, staging)
+        loaded.append(row)
+        new += inserted
+        duplicate += 1 - inserted
+    connection.commit()
+    if on_readings:
+        on_readings(get_loaded_readings(loaded, plant_names))
+    return ReadingCounts(new, duplicate + len(readings) - len(rows))
 
 
 def load_origin_data(connection: "Connection", plants_data: list[dict]) -> None:
-    """Loads origin location data from dictionary to origin table in database."""
-
-    insert_query = """
-                IF NOT EXISTS (
-                    SELECT 1 FROM origin
-                    WHERE latitude = ?
-                    AND longitude = ?)
-                BEGIN
-                    INSERT INTO origin
-                    VALUES (?, ?, ?, ?)
-                END
-                """
+    """Loads origin location data from dictionary to origin table in database.
 
-    curs = get_db_cursor(connection)
+    Country IDs are resolved by joining the staged country names in the insert."""
+
+    staged = {}
     for plant in plants_data:
         location = plant["origin_location"]
-        curs.execute(
-            insert_query, (location["latitude"],
-                           location["longitude"],
-                           location["latitude"],
+        key = get_origin_key(location["latitude"], location["longitude"])
+        if key not in DIMENSION_CACHE.origins:
+            staged[key] = (location["latitude"],
                            location["longitude"],
                            location["city"],
-                           get_country_id(connection, plant)))
-        connection.commit()
+                           location["country"])
+    if not staged:
+        return
+
+    curs = get_db_cursor(connection)
+    staging = BACKEND.staging_table("origin_staging")
+    stage_rows(curs, staging,
+               """latitude DECIMAL(6, 4), longitude DECIMAL(7, 4),
+               city_name VARCHAR(50), country_name VARCHAR(60)""",
+               list(staged.values()))
+    curs.execute(f"""
+                INSERT INTO origin (latitude, longitude, city_name, country_id)
+                SELECT s.latitude, s.longitude, s.city_name, c.country_id
+                FROM {staging} AS s
+                JOIN country AS c ON c.country_name = s.country_name
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM origin AS o {BACKEND.key_lock}
+                    WHERE o.latitude = s.latitude
+                    AND o.longitude = s.longitude)
+                """)
+    curs.execute(f"""
+                SELECT o.latitude, o.longitude, o.origin_id
+                FROM origin AS o
+                JOIN {staging} AS s
+                    ON o.latitude = s.latitude AND o.longitude = s.longitude
+                """)
+    DIMENSION_CACHE.origins.update(
+        (get_origin_key(latitude, longitude), origin_id)
+        for latitude, longitude, origin_id in curs.fetchall())
+    connection.commit()
 
 
 def load_country_data(connection: "Connection", plants_data: list[dict]) -> None:
-    """Loads country origin data from to country table in SQL Server database."""
-
-    insert_query = """
-                IF NOT EXISTS (
-                    SELECT 1
-                    FROM country
-                    WHERE country_name = ?)
-                BEGIN
-                    INSERT INTO country VALUES (?)
-                END
-                """
+    """Loads country origin data from to country table in database."""
+
+    staged = {plant["origin_location"]["country"] for plant in plants_data} \
+        - DIMENSION_CACHE.countries.keys()
+    if not staged:
+        return
 
     curs = get_db_cursor(connection)
-    for plant in plants_data:
-        country = plant["origin_location"]["country"]
-        curs.execute(
-            insert_query, (country, country))
-        connection.commit()
+    staging = BACKEND.staging_table("country_staging")
+    stage_rows(curs, staging, "country_name VARCHAR(60)",
+               [(country,) for country in staged])
+    curs.execute(BACKEND.insert_new_query("country", staging, ["country_name"],
+                                          ["country_name"]))
+    curs.execute(f"""
+                SELECT c.country_name, c.country_id
+                FROM country AS c
+                JOIN {staging} AS s ON c.country_name = s.country_name
+                """)
+    DIMENSION_CACHE.countries.update(
+        (country, country_id) for country, country_id in curs.fetchall())
+    connection.commit()
+
+
+def save_fingerprints(connection: "Connection", pending: dict) -> None:
+    """Upserts the fingerprints of newly loaded dimension data into the database."""
+
+    if not pending:
+        return
+
+    curs = get_db_cursor(connection)
+    staging = BACKEND.staging_table("fingerprint_staging")
+    stage_rows(curs, staging,
+               "plant_id SMALLINT, dimension VARCHAR(20), fingerprint BINARY(16)",
+               [(plant_id, dimension, fingerprint)
+                for (plant_id, dimension), fingerprint in pending.items()])
+    curs.execute(BACKEND.upsert_query("load_fingerprint", staging,
+                                      ["plant_id", "dimension"], ["fingerprint"]))
+    connection.commit()
+    FINGERPRINTS.update(pending)
+
+
+def combine_plants(*plant_lists: list[dict]) -> list[dict]:
+    """Combines lists of plants, keeping each plant once."""
+
+    return list({plant["plant_id"]: plant
+                 for plants in plant_lists for plant in plants}.values())
+
+
+def get_load_stages(plants_data: list[dict], changed: dict, pending: dict,
+                    on_readings: "Callable" = None,
+                    failure_mode: str = FAILURE_MODE) -> list[Stage]:
+    """Describes the load of a batch as stages and the stages each one needs first.
+
+    The country, origin and plant chain runs alongside the botanist loader,
+    and sensor readings only wait for plant IDs."""
+
+    return [
+        Stage("botanist", partial(load_botanist_data, plants_data=changed["botanist"])),
+        Stage("country", partial(load_country_data, plants_data=changed["origin"])),
+        Stage("origin", partial(load_origin_data, plants_data=changed["origin"]),
+              ("country",)),
+        Stage("plant", partial(load_plant_master_data,
+                               plants_data=combine_plants(changed["plant"], changed["origin"])),
+              ("origin",)),
+        Stage("assignment", partial(load_botanist_assignment_data,
+                                    plants_data=combine_plants(changed["botanist"],
+                                                               changed["plant"])),
+              ("botanist", "plant")),
+        Stage("fingerprint", partial(save_fingerprints, pending=pending),
+              ("botanist", "origin", "plant", "assignment")),
+        Stage("sensor_reading", partial(load_sensor_reading_data, plants_data=plants_data,
+                                        failure_mode=failure_mode, on_readings=on_readings),
+              ("plant",)),
+    ]
+
+
+def load_plant_batch(connection: "Connection", plants_data: list[dict],
+                     pool: ConnectionPool = None, max_workers: int = MAX_WORKERS,
+                     on_readings: "Callable" = None,
+                     failure_mode: str = FAILURE_MODE) -> BatchReport:
+    """Loads a batch of plant data into every table in dependency order,
+    returning the number of new and duplicate sensor readings and the timing
+    of each stage.
+
+    Only plants whose botanist, origin or plant master data has a different
+    fingerprint from the last run are passed to the dimension loaders, so in
+    steady state only sensor readings are written. Dimension rows already in
+    the key cache are skipped without a query, and the rest are staged and
+    inserted with one set-based statement per table. Given a pool, independent
+    stages run in parallel, each on a connection from the pool; otherwise they
+    run one at a time on the given connection. If the batch fails the cache
+    and fingerprints are cleared, in case they no longer match the database.
+    on_readings and failure_mode are passed on to load_sensor_reading_data."""
+
+    DIMENSION_CACHE.ensure_warm(connection)
+    FINGERPRINTS.ensure_loaded(connection)
+    changed, pending = FINGERPRINTS.get_changes(plants_data)
+    if pool is None:
+        lend_connection, max_workers = partial(nullcontext, connection), 1
+    else:
+        lend_connection = pool.connection
+    try:
+        results, timings = run_stages(get_load_stages(plants_data, changed, pending,
+                                                      on_readings, failure_mode),
+                                      lend_connection, max_workers)
+    except DB_ERRORS:
+        DIMENSION_CACHE.clear()
+        FINGERPRINTS.clear()
+        raise
+
+    return BatchReport(results["sensor_reading"], timings)
+
+
+def load_in_batches(connection: "Connection", plants: "Iterable[dict]",
+                    batch_size: int = BATCH_SIZE, on_load: "Callable" = None,
+                    pool: ConnectionPool = None, on_readings: "Callable" = None,
+                    failure_mode: str = FAILURE_MODE) -> int:
+    """Loads plants from a stream in batches as they arrive, returning the number loaded.
+
+    Only one batch is held in memory at a time. The stream is not read
+    while a batch is written, so with stream_plant_data only the requests
+    already in flight finish meanwhile, and no new ones are sent until the
+    next batch is read. If given, on_load is called with the
+    BatchReport of each batch, and on_readings with each batch's loaded
+    readings. failure_mode is how bad sensor readings are handled."""
+
+    plants = iter(plants)
+    loaded = 0
+    while batch := list(islice(plants, batch_size)):
+        report = load_plant_batch(connection, batch, pool, on_readings=on_readings,
+                                  failure_mode=failure_mode)
+        loaded += len(batch)
+        if on_load:
+            on_load(report)
+
+    return loaded
 
 
 def read_json_data(filename: str) -> list[dict]:
@@ -283,11 +583,6 @@ if __name__ == "__main__":
 
     conn = get_db_connection()
 
-    load_botanist_data(conn, seed_data)
-    load_botanist_assignment_data(conn, seed_data)
-    load_country_data(conn, seed_data)
-    load_origin_data(conn, seed_data)
-    load_plant_master_data(conn, seed_data)
-    load_sensor_reading_data(conn, seed_data)
+    load_plant_batch(conn, seed_data)
 
     conn.close()
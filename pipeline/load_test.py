@@ -0,0 +1,54 @@
+"""Drives the extractor against the local fake API and reports its throughput."""
+from argparse import ArgumentParser
+from statistics import quantiles
+from time import perf_counter
+import logging
+
+import extract
+from fake_api import start_server, get_api_url
+
+
+def run_load_test(plant_count: int, latency: float, error_rate: float,
+                  max_workers: int, runs: int) -> dict:
+    """Runs retrieve_all_data against a fake API and returns throughput statistics."""
+    server = start_server(plant_count, latency, error_rate)
+    extract.API_URL = get_api_url(server)
+    logger = logging.getLogger("load_test")
+    logger.setLevel(logging.CRITICAL)
+
+    latencies = []
+    plants = 0
+    start = perf_counter()
+    try:
+        for _ in range(runs):
+            plants += len(extract.retrieve_all_data(
+                logger, max_workers=max_workers,
+                on_fetch=lambda result: latencies.append(result.elapsed)))
+    finally:
+        server.shutdown()
+        server.server_close()
+    elapsed = perf_counter() - start
+
+    percentiles = quantiles(latencies, n=100)
+    return {"plants": plants, "requests": len(latencies), "seconds": elapsed,
+            "plants_per_second": plants / elapsed,
+            "p50_ms": percentiles[49] * 1000, "p99_ms": percentiles[98] * 1000}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Load tests the extractor against the fake API.")
+    parser.add_argument("--plants", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Seconds the fake API waits before each response.")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests the fake API answers with a 500.")
+    parser.add_argument("--workers", type=int, default=extract.MAX_WORKERS)
+    parser.add_argument("--runs", type=int, default=1)
+    options = parser.parse_args()
+
+    stats = run_load_test(options.plants, options.latency, options.error_rate,
+                          options.workers, options.runs)
+    print(f"{stats['plants']} valid plants from {stats['requests']} requests "
+          f"in {stats['seconds']:.2f}s")
+    print(f"{stats['plants_per_second']:.1f} plants/sec, "
+          f"p50 {stats['p50_ms']:.1f}ms, p99 {stats['p99_ms']:.1f}ms")
@@ -0,0 +1,26 @@
+-- Covering indexes for the queries run on every pipeline, alert and archive run.
+
+-- Alerts rank each plant's readings by taken_at and average the latest three.
+CREATE INDEX ix_sensor_reading_plant_taken_at
+    ON sensor_reading (plant_id, taken_at DESC)
+    INCLUDE (temperature, soil_moisture);
+
+-- The archive job selects and then deletes the oldest hour of readings.
+CREATE INDEX ix_sensor_reading_taken_at
+    ON sensor_reading (taken_at)
+    INCLUDE (temperature, last_watered, soil_moisture, plant_id);
+
+-- Alerts check whether the same alert was sent for a plant in the last hour.
+CREATE INDEX ix_alert_plant_type_sent_at
+    ON alert (plant_id, alert_type_id, sent_at);
+
+-- Dimension lookups by natural key while loading.
+CREATE INDEX ix_plant_plant_name
+    ON plant (plant_name)
+    INCLUDE (origin_id);
+
+CREATE INDEX ix_botanist_name_email
+    ON botanist (botanist_name, email);
+
+CREATE INDEX ix_origin_latitude_longitude
+    ON origin (latitude, longitude);
@@ -0,0 +1,16 @@
+-- Each plant has at most one reading per taken_at, so repeated polls and
+-- overlapping runs cannot load the same reading twice.
+
+-- Keep the first copy of any readings already loaded more than once.
+DELETE FROM sensor_reading
+WHERE sensor_reading_id NOT IN (
+    SELECT MIN(sensor_reading_id)
+    FROM sensor_reading
+    GROUP BY plant_id, taken_at);
+
+-- The unique key replaces the alert window index, and still covers it.
+DROP INDEX ix_sensor_reading_plant_taken_at ON sensor_reading;
+
+CREATE UNIQUE INDEX uq_sensor_reading_plant_taken_at
+    ON sensor_reading (plant_id, taken_at DESC)
+    INCLUDE (temperature, soil_moisture);
@@ -0,0 +1,21 @@
+-- Alerts read each plant's newest readings from a small table kept up to date
+-- by the pipeline, instead of ranking every row of sensor_reading.
+
+CREATE TABLE latest_reading (
+    plant_id SMALLINT NOT NULL,
+    taken_at DATETIME2(0) NOT NULL,
+    temperature DECIMAL(5, 2) NOT NULL,
+    soil_moisture DECIMAL(5, 2) NOT NULL,
+    PRIMARY KEY (plant_id, taken_at),
+    FOREIGN KEY (plant_id)
+        REFERENCES plant(plant_id)
+);
+
+-- Fill it with the newest 3 readings of each plant, the default window size.
+INSERT INTO latest_reading (plant_id, taken_at, temperature, soil_moisture)
+SELECT plant_id, taken_at, temperature, soil_moisture
+FROM (
+    SELECT plant_id, taken_at, temperature, soil_moisture,
+    ROW_NUMBER() OVER (PARTITION BY plant_id ORDER BY taken_at DESC) AS reading_rank
+    FROM sensor_reading) AS ranked_readings
+WHERE reading_rank <= 3;
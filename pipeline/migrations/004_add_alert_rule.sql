@@ -0,0 +1,25 @@
+-- Alert thresholds move from the alert code into a table, so they can be set
+-- per plant or per species.
+
+CREATE TABLE alert_rule (
+    alert_rule_id SMALLINT IDENTITY(1,1),
+    plant_id SMALLINT,
+    scientific_name VARCHAR(40),
+    min_temperature DECIMAL(5, 2) NOT NULL,
+    max_temperature DECIMAL(5, 2) NOT NULL,
+    min_soil_moisture DECIMAL(5, 2) NOT NULL,
+    max_soil_moisture DECIMAL(5, 2) NOT NULL,
+    temperature_hysteresis DECIMAL(4, 2) NOT NULL DEFAULT 0,
+    soil_moisture_hysteresis DECIMAL(4, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (alert_rule_id),
+    FOREIGN KEY (plant_id)
+        REFERENCES plant(plant_id),
+    CHECK (
+        min_temperature <= max_temperature
+        AND min_soil_moisture <= max_soil_moisture
+    )
+);
+
+-- The default rule, matching the thresholds the alerts used before.
+INSERT INTO alert_rule (min_temperature, max_temperature, min_soil_moisture, max_soil_moisture)
+VALUES (15, 30, 20, 100);
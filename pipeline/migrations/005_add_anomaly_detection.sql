@@ -0,0 +1,25 @@
+-- Alerts flag readings that are anomalies for their plant, as well as averages
+-- outside its range, from detectors whose state is kept between runs.
+
+INSERT INTO alert_type (alert_type_name)
+VALUES
+('temperature anomaly'),
+('soil moisture anomaly');
+
+-- The state of each plant's streaming anomaly detectors, one row per plant and
+-- anomaly alert type, so detection carries on across cold starts.
+CREATE TABLE anomaly_state (
+    plant_id SMALLINT NOT NULL,
+    alert_type_id SMALLINT NOT NULL,
+    reading_count INT NOT NULL,
+    ewma_mean FLOAT NOT NULL,
+    ewma_variance FLOAT NOT NULL,
+    ewma_rate FLOAT NOT NULL,
+    last_value FLOAT,
+    last_taken_at DATETIME2(0),
+    PRIMARY KEY (plant_id, alert_type_id),
+    FOREIGN KEY (plant_id)
+        REFERENCES plant(plant_id),
+    FOREIGN KEY (alert_type_id)
+        REFERENCES alert_type(alert_type_id)
+);
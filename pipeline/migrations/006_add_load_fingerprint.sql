@@ -0,0 +1,14 @@
+-- The pipeline skips dimension loads for plants whose botanist, origin and plant
+-- data have not changed, comparing them with a hash kept from the last load.
+
+-- Databases reset from an older schema.sql already have the table. It only
+-- holds hashes, so dropping it costs one full dimension load.
+DROP TABLE IF EXISTS load_fingerprint;
+
+-- Hash of each API plant's botanist, origin and plant master data from the last load.
+CREATE TABLE load_fingerprint (
+    plant_id SMALLINT NOT NULL,
+    dimension VARCHAR(20) NOT NULL,
+    fingerprint BINARY(16) NOT NULL,
+    PRIMARY KEY (plant_id, dimension)
+);
@@ -0,0 +1,16 @@
+-- A rule's hysteresis keeps a plant in alert until it is back inside its range
+-- by a margin, which needs to know whether the plant was out of range when it
+-- was last checked. Both the alerts Lambda and the pipeline's push mode keep
+-- that here, so it survives cold starts and is shared between them.
+
+-- Whether each plant was out of range for each range alert type at its last check.
+CREATE TABLE range_state (
+    plant_id SMALLINT NOT NULL,
+    alert_type_id SMALLINT NOT NULL,
+    out_of_range BIT NOT NULL,
+    PRIMARY KEY (plant_id, alert_type_id),
+    FOREIGN KEY (plant_id)
+        REFERENCES plant(plant_id),
+    FOREIGN KEY (alert_type_id)
+        REFERENCES alert_type(alert_type_id)
+);
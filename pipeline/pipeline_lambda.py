@@ -1,29 +1,230 @@
 """Script that runs the pipeline on a lambda function."""
 
+from collections import Counter
+from os import environ as ENV
+
 from dotenv import load_dotenv
 
-from extract import add_logger, retrieve_all_data
-from load import (get_db_connection, load_origin_data, load_country_data,
-                  load_plant_master_data, load_sensor_reading_data,
-                  load_botanist_assignment_data, load_botanist_data)
+from alert_delivery import DeliveryError, deliver_alerts, get_sender
+from alert_evaluator import ALERT_EVALUATOR, AlertEvaluator
+from extract import add_logger, stream_plant_data
+from load import DB_POOL, SKIP_BAD_ROWS, load_in_batches
+from spool import FlushPolicy, Spool
+from storage import DB_ERRORS, TRANSIENT_DB_ERRORS
+
+
+SPOOL = Spool()
+FLUSH_POLICY = FlushPolicy()
+POLL = "poll"
+PUSH = "push"
+ALERT_MODE = ENV.get("ALERT_MODE", POLL)
+SENDER = get_sender()
+
+
+def get_shard(event: dict) -> tuple[int, int]:
+    """Gets the shard index and shard count from the lambda event.
+
+    Each of N invocations given shard 0..N-1 and shard_count N extracts and
+    loads a disjoint slice of the plant IDs."""
+
+    event = event or {}
+    shard = int(event.get("shard", 0))
+    shard_count = int(event.get("shard_count", 1))
+
+    return shard, shard_count
+
+
+def get_reading_hook(conn: "Connection",
+                     evaluator: "AlertEvaluator | None") -> "Callable | None":
+    """Gets the hook that hands loaded readings to the alert evaluator, warming it first."""
+
+    if evaluator is None:
+        return None
+    evaluator.ensure_warm(conn)
+    return evaluator.observe
+
+
+def get_delivery_hook(conn: "Connection", file_logger,
+                      sender: "SMTPSender | SESSender | None") -> "Callable | None":
+    """Gets the hook that sends each botanist a digest of their plants' alerts,
+    as the alerts Lambda does, or None if no digest transport is set."""
+
+    if sender is None:
+        return None
+
+    def deliver(alerts: list[dict]) -> None:
+        result = deliver_alerts(conn, alerts, sender)
+        if result.sent or result.failed:
+            file_logger.info(f"Digests sent: {result.sent}, failed: {len(result.failed)}")
+    return deliver
+
+
+def send_alerts(conn: "Connection", evaluator: "AlertEvaluator | None", file_logger,
+                sender: "SMTPSender | SESSender | None" = SENDER) -> list[dict]:
+    """Decides, delivers and records alerts for the plants whose readings were just loaded.
+
+    Alerts are sent as digests before they are recorded, so their cooldown
+    only starts once they have been handed over; if none can be sent they
+    are left unrecorded and decided again by the next run. Digests held back
+    by the per-botanist interval are sent by a later run, even one with no
+    alerts."""
+
+    if evaluator is None:
+        return []
+    deliver = get_delivery_hook(conn, file_logger, sender)
+    try:
+        alerts = evaluator.evaluate(conn, on_alerts=deliver)
+        if deliver and not alerts:
+            deliver([])
+    except DeliveryError as error:
+        file_logger.error(f"Alerts not sent: {error}")
+        return []
+    return [{"plant_id": alert["plant_id"], "plant_name": alert["plant_name"],
+             "alert_type": alert["alert_type"]} for alert in alerts]
+
+
+def get_quarantine_hook(file_logger) -> "Callable":
+    """Gets the hook that logs a spool segment set aside because it could not be loaded."""
+
+    def log_quarantine(path: "Path", error: Exception) -> None:
+        file_logger.error(f"Spool segment {path.name} could not be loaded and was "
+                          f"quarantined: {error!r}")
+    return log_quarantine
+
+
+def load_now(plant_stream: "Iterator[dict]", on_load: "Callable", file_logger,
+             evaluator: AlertEvaluator = None) -> dict:
+    """Loads this run's plants as they are extracted, then drains older spool segments.
+
+    Every plant is spooled before it is loaded, and if the load fails the
+    rest of the stream is spooled so it can be drained by a later run.
+    Spooled segments are loaded skipping bad readings, and are only kept for
+    another try on a transient database error; any other error quarantines
+    them, so one bad record cannot hold up the spool. Given an evaluator,
+    loaded readings are handed to it. Alerts for this run's readings are
+    sent before the spool is drained, so a backlog cannot hold them up, and
+    alerts for drained readings are sent after."""
+
+    segment = SPOOL.open_segment()
+    plants_loaded = plants_drained = 0
+    alerts = []
+    try:
+        with DB_POOL.connection() as conn:
+            on_readings = get_reading_hook(conn, evaluator)
+            plants_loaded = load_in_batches(conn, segment.tee(plant_stream), on_load=on_load,
+                                            pool=DB_POOL, on_readings=on_readings)
+            segment.discard()
+            alerts = send_alerts(conn, evaluator, file_logger)
+            plants_drained = SPOOL.drain(
+                lambda plants: load_in_batches(conn, plants, on_load=on_load, pool=DB_POOL,
+                                               on_readings=on_readings,
+                                               failure_mode=SKIP_BAD_ROWS),
+                TRANSIENT_DB_ERRORS, get_quarantine_hook(file_logger))
+            if plants_drained:
+                alerts += send_alerts(conn, evaluator, file_logger)
+    except DB_ERRORS as error:
+        file_logger.error(f"Load failed, spooling remaining plant data: {error}")
+        if not segment.closed:
+            segment.extend(plant_stream)
+    finally:
+        if not segment.closed:
+            segment.close()
+
+    spool_backlog = SPOOL.count_backlog()
+    spool_quarantined = len(SPOOL.get_quarantined())
+    file_logger.info(f"Spool: {segment.count} spooled, {plants_drained} drained, "
+                     f"{spool_backlog} waiting, {spool_quarantined} quarantined")
+
+    return {"plants_loaded": plants_loaded,
+            "plants_spooled": segment.count,
+            "plants_drained": plants_drained,
+            "spool_backlog": spool_backlog,
+            "spool_quarantined": spool_quarantined,
+            "alerts": alerts}
+
+
+def load_micro_batch(plant_stream: "Iterator[dict]", on_load: "Callable", file_logger,
+                     evaluator: AlertEvaluator = None) -> dict:
+    """Spools this run's plants and only loads the spool once the flush policy is due.
+
+    Runs that do not flush never connect to the database, and a flush writes
+    the readings of several runs in batches of up to max_readings plants. The
+    freshness lag is how long the oldest flushed reading waited in the spool.
+    Given an evaluator, alerts are sent after each flush."""
+
+    segment = SPOOL.open_segment()
+    segment.extend(plant_stream)
+    segment.close()
+
+    buffered = SPOOL.count_backlog()
+    oldest_age = SPOOL.get_oldest_age()
+    flushed = 0
+    alerts = []
+    if FLUSH_POLICY.is_due(buffered, oldest_age):
+        try:
+            with DB_POOL.connection() as conn:
+                on_readings = get_reading_hook(conn, evaluator)
+                flushed = SPOOL.flush(
+                    lambda plants: load_in_batches(conn, plants, FLUSH_POLICY.max_readings,
+                                                   on_load, DB_POOL, on_readings,
+                                                   SKIP_BAD_ROWS),
+                    TRANSIENT_DB_ERRORS, get_quarantine_hook(file_logger))
+                alerts = send_alerts(conn, evaluator, file_logger)
+        except DB_ERRORS as error:
+            file_logger.error(f"Load failed, keeping buffered plant data: {error}")
+
+    freshness_lag = round(oldest_age, 3) if flushed else None
+    spool_backlog = buffered - flushed
+    file_logger.info(f"Micro-batch: {segment.count} spooled, {flushed} flushed with "
+                     f"freshness lag {freshness_lag}s, {spool_backlog} waiting")
+
+    return {"plants_loaded": flushed,
+            "plants_spooled": segment.count,
+            "plants_drained": 0,
+            "spool_backlog": spool_backlog,
+            "flush_size": flushed,
+            "freshness_lag_seconds": freshness_lag,
+            "oldest_buffered_seconds": 0.0 if flushed else round(oldest_age, 3),
+            "spool_quarantined": len(SPOOL.get_quarantined()),
+            "alerts": alerts}
 
 
 def lambda_handler(event: dict, context: dict) -> dict:
     """Makes a lambda handler."""
 
+    shard, shard_count = get_shard(event)
     file_logger = add_logger()
-    plant_data = retrieve_all_data(file_logger)
-
-    conn = get_db_connection()
-    load_botanist_data(conn, plant_data)
-    load_botanist_assignment_data(conn, plant_data)
-    load_country_data(conn, plant_data)
-    load_origin_data(conn, plant_data)
-    load_plant_master_data(conn, plant_data)
-    load_sensor_reading_data(conn, plant_data)
-    conn.close()
-
-    return {None: None}
+    plant_stream = stream_plant_data(file_logger, shard, shard_count)
+
+    readings = Counter()
+    stage_seconds = {}
+
+    def record_batch(report: "BatchReport") -> None:
+        readings.update(report.readings._asdict())
+        for name, timing in report.stages.items():
+            total, critical = stage_seconds.get(name, (0.0, 0.0))
+            stage_seconds[name] = (total + timing.duration,
+                                   critical + timing.duration * timing.critical)
+
+    evaluator = ALERT_EVALUATOR if ALERT_MODE == PUSH else None
+    if FLUSH_POLICY.enabled:
+        result = load_micro_batch(plant_stream, record_batch, file_logger, evaluator)
+    else:
+        result = load_now(plant_stream, record_batch, file_logger, evaluator)
+
+    pool_metrics = DB_POOL.get_metrics()
+    stage_times = {name: {"seconds": round(total, 3), "critical_path_seconds": round(critical, 3)}
+                   for name, (total, critical) in stage_seconds.items()}
+    file_logger.info(f"Database connections: {pool_metrics}")
+    file_logger.info(f"Readings: {readings['new']} new, {readings['duplicate']} duplicate")
+    file_logger.info(f"Load stage times: {stage_times}")
+    file_logger.info(f"Alerts sent ({ALERT_MODE} mode): {len(result['alerts'])}")
+
+    return {**result,
+            "new_readings": readings["new"],
+            "duplicate_readings": readings["duplicate"],
+            "load_stages": stage_times,
+            "db_connections": pool_metrics}
 
 
 if __name__ == "__main__":
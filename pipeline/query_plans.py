@@ -0,0 +1,144 @@
+"""Captures query plans and timings of the hot queries before and after migrations.
+
+A fresh SQLite database, built from schema.sql alone, is seeded with plants from
+the fake API and a day of readings per plant, so the comparison can be run
+locally at realistic volume.
+Run it with DB_BACKEND=sqlite, so the seeding load uses SQLite syntax."""
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from fake_api import BOTANISTS, COUNTRIES, make_plant
+from migrate import migrate
+from storage import BACKEND, SQLITE, SQLiteBackend
+
+
+SEED_TIME = datetime(2025, 6, 3)
+
+HOT_QUERIES = {
+    "alert window": ("""
+        WITH ranked_readings AS (
+            SELECT p.plant_id, p.plant_name, sr.temperature, sr.soil_moisture,
+            ROW_NUMBER() OVER (PARTITION BY p.plant_id ORDER BY sr.taken_at DESC) AS rank
+            FROM plant AS p
+            JOIN sensor_reading AS sr ON p.plant_id = sr.plant_id)
+        SELECT plant_id, plant_name, AVG(temperature), AVG(soil_moisture)
+        FROM ranked_readings
+        WHERE rank <= 3
+        GROUP BY plant_id, plant_name""", ()),
+    "recent alert": ("""
+        SELECT COUNT(*) FROM alert
+        WHERE plant_id = ? AND sent_at >= ? AND alert_type_id = ?""",
+                     (7, SEED_TIME + timedelta(hours=23), 1)),
+    "archive range": ("""
+        SELECT * FROM sensor_reading
+        WHERE taken_at BETWEEN ? AND ?""",
+                      (SEED_TIME, SEED_TIME + timedelta(hours=1))),
+    "plant lookup": ("""
+        SELECT plant_id FROM plant
+        WHERE plant_name = ? AND plant_name = ? COLLATE BINARY""", ("Cactus 4", "Cactus 4")),
+    "botanist lookup": ("""
+        SELECT botanist_id FROM botanist
+        WHERE botanist_name = ? AND email = ?""",
+                        ("Benny Block", "benny.block@lnhm.co.uk")),
+    "origin lookup": ("""
+        SELECT origin_id FROM origin
+        WHERE latitude = ? AND longitude = ?""", (0.0, 0.0)),
+}
+
+
+def seed_database(connection: "Connection", backend: SQLiteBackend,
+                  plant_count: int, readings_per_plant: int) -> None:
+    """Fills the database with plants, a reading per minute for each, and some alerts.
+
+    Plants are inserted directly rather than loaded, as the load writes to tables
+    the migrations add."""
+    rng = Random(0)
+    plants = [make_plant(plant_id, rng) for plant_id in range(1, plant_count + 1)]
+    connection.executemany("INSERT INTO country (country_name) VALUES (?)",
+                           [(country,) for country in COUNTRIES])
+    connection.executemany("""INSERT INTO origin (latitude, longitude, city_name, country_id)
+                              VALUES (?, ?, ?, ?)""",
+                           [(round(origin["latitude"], 2), round(origin["longitude"], 2),
+                             origin["city"], COUNTRIES.index(origin["country"]) + 1)
+                            for origin in (plant["origin_location"] for plant in plants)])
+    connection.executemany("INSERT INTO plant (plant_name, origin_id) VALUES (?, ?)",
+                           [(plant["name"], origin_id)
+                            for origin_id, plant in enumerate(plants, 1)])
+    connection.executemany("INSERT INTO botanist (botanist_name, email, phone) VALUES (?, ?, ?)",
+                           [(name, f"{name.lower().replace(' ', '.')}@lnhm.co.uk", phone)
+                            for name, phone in BOTANISTS])
+
+    plant_ids = [plant_id for (plant_id,) in connection.execute("SELECT plant_id FROM plant")]
+    readings = [(SEED_TIME + timedelta(minutes=minute), rng.uniform(8, 35),
+                 SEED_TIME, rng.uniform(0, 100), plant_id)
+                for plant_id in plant_ids for minute in range(readings_per_plant)]
+    alerts = [(plant_id, 1 + minute % 2, rng.uniform(0, 40),
+               SEED_TIME + timedelta(minutes=minute))
+              for plant_id in plant_ids for minute in range(0, readings_per_plant, 15)]
+
+    curs = connection.cursor()
+    backend.prepare_bulk_insert(curs)
+    curs.executemany("""INSERT INTO sensor_reading
+                        (taken_at, temperature, last_watered, soil_moisture, plant_id)
+                        VALUES (?, ?, ?, ?, ?)""", readings)
+    curs.executemany("""INSERT INTO alert (plant_id, alert_type_id, alert_value, sent_at)
+                        VALUES (?, ?, ?, ?)""", alerts)
+    connection.commit()
+    connection.execute("ANALYZE")
+
+
+def time_query(connection: "Connection", query: str, params: tuple, repeats: int) -> float:
+    """Returns the median time in milliseconds to run a query and fetch its rows."""
+    timings = []
+    for _ in range(repeats):
+        start = perf_counter()
+        connection.execute(query, params).fetchall()
+        timings.append((perf_counter() - start) * 1000)
+    return median(timings)
+
+
+def capture(connection: "Connection", backend: SQLiteBackend, repeats: int) -> dict:
+    """Gets the plan and median time of every hot query."""
+    return {name: (backend.explain(connection, query, params),
+                   time_query(connection, query, params, repeats))
+            for name, (query, params) in HOT_QUERIES.items()}
+
+
+def print_comparison(before: dict, after: dict) -> None:
+    """Prints each query's plans and timings side by side."""
+    for name, (before_plan, before_ms) in before.items():
+        after_plan, after_ms = after[name]
+        print(f"\n{name}: {before_ms:.2f} ms -> {after_ms:.2f} ms "
+              f"({before_ms / max(after_ms, 1e-6):.1f}x)")
+        print(f"  before: {' | '.join(before_plan)}")
+        print(f"  after:  {' | '.join(after_plan)}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compares hot query plans before and after migrations.")
+    parser.add_argument("--plants", type=int, default=50)
+    parser.add_argument("--readings", type=int, default=1440,
+                        help="Readings per plant, one per minute.")
+    parser.add_argument("--repeats", type=int, default=5)
+    options = parser.parse_args()
+    if BACKEND.name != SQLITE:
+        parser.error("set DB_BACKEND=sqlite, as the seeded database is SQLite")
+
+    with TemporaryDirectory() as directory:
+        sqlite = SQLiteBackend(str(Path(directory) / "plants.db"), auto_migrate=False)
+        conn = sqlite.connect()
+        seed_database(conn, sqlite, options.plants, options.readings)
+        print(f"Seeded {options.plants} plants with {options.readings} readings each")
+
+        plans_before = capture(conn, sqlite, options.repeats)
+        print(f"Applied migrations: {migrate(conn, backend=sqlite)}")
+        conn.execute("ANALYZE")
+        plans_after = capture(conn, sqlite, options.repeats)
+        conn.close()
+
+    print_comparison(plans_before, plans_after)
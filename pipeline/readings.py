@@ -0,0 +1,112 @@
+"""Compact record and columnar batch types for plant sensor readings."""
+from datetime import datetime
+
+import numpy as np
+
+
+def parse_timestamp(timestamp: str) -> np.datetime64:
+    """Converts an API timestamp such as 2025-06-03T15:18:44.108Z to a datetime64."""
+    return np.datetime64(timestamp.rstrip("Z"), "ms")
+
+
+class PlantReading:
+    """A single sensor reading for a plant."""
+
+    __slots__ = ("plant_id", "plant_name", "taken_at", "temperature",
+                 "last_watered", "soil_moisture")
+
+    def __init__(self, plant_id: int, plant_name: str, taken_at: datetime,
+                 temperature: float, last_watered: datetime, soil_moisture: float):
+        self.plant_id = plant_id
+        self.plant_name = plant_name
+        self.taken_at = taken_at
+        self.temperature = temperature
+        self.last_watered = last_watered
+        self.soil_moisture = soil_moisture
+
+    def __repr__(self) -> str:
+        return (f"PlantReading(plant_id={self.plant_id}, taken_at={self.taken_at}, "
+                f"temperature={self.temperature}, soil_moisture={self.soil_moisture})")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PlantReading):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    @classmethod
+    def from_plant(cls, plant: dict) -> "PlantReading":
+        """Makes a reading from validated API data for a single plant."""
+        return cls(plant["plant_id"], plant["name"],
+                   parse_timestamp(plant["recording_taken"]).item(),
+                   plant["temperature"],
+                   parse_timestamp(plant["last_watered"]).item(),
+                   plant["soil_moisture"])
+
+
+class ReadingBatch:
+    """A batch of readings held as parallel arrays, one per column."""
+
+    __slots__ = ("plant_ids", "plant_names", "taken_at", "temperature",
+                 "last_watered", "soil_moisture")
+
+    def __init__(self, plant_ids: np.ndarray, plant_names: list[str], taken_at: np.ndarray,
+                 temperature: np.ndarray, last_watered: np.ndarray, soil_moisture: np.ndarray):
+        self.plant_ids = plant_ids
+        self.plant_names = plant_names
+        self.taken_at = taken_at
+        self.temperature = temperature
+        self.last_watered = last_watered
+        self.soil_moisture = soil_moisture
+
+    def __len__(self) -> int:
+        return len(self.plant_ids)
+
+    def __iter__(self):
+        """Yields each reading in the batch as a PlantReading."""
+        columns = zip(self.plant_ids.tolist(), self.plant_names, self.taken_at.tolist(),
+                      self.temperature.tolist(), self.last_watered.tolist(),
+                      self.soil_moisture.tolist())
+        for row in columns:
+            yield PlantReading(*row)
+
+    @classmethod
+    def from_plants(cls, plants: list[dict]) -> "ReadingBatch":
+        """Makes a batch from validated API data for many plants."""
+        return cls(
+            np.fromiter((plant["plant_id"] for plant in plants), np.int32, len(plants)),
+            [plant["name"] for plant in plants],
+            np.array([plant["recording_taken"].rstrip("Z") for plant in plants],
+                     "datetime64[ms]"),
+            np.fromiter((plant["temperature"] for plant in plants), np.float64, len(plants)),
+            np.array([plant["last_watered"].rstrip("Z") for plant in plants],
+                     "datetime64[ms]"),
+            np.fromiter((plant["soil_moisture"] for plant in plants), np.float64, len(plants)))
+
+    def normalise(self) -> "ReadingBatch":
+        """Clamps negative soil moisture to 0, rounds readings to 2dp and truncates
+        timestamps to whole seconds, matching the sensor_reading columns."""
+        np.maximum(self.soil_moisture, 0, out=self.soil_moisture)
+        np.round(self.soil_moisture, 2, out=self.soil_moisture)
+        np.round(self.temperature, 2, out=self.temperature)
+        self.taken_at = self.taken_at.astype("datetime64[s]")
+        self.last_watered = self.last_watered.astype("datetime64[s]")
+        return self
+
+    def valid_mask(self) -> np.ndarray:
+        """Returns a mask of readings that fit the sensor_reading column constraints."""
+        return (np.isfinite(self.temperature) & (np.abs(self.temperature) < 1000)
+                & np.isfinite(self.soil_moisture)
+                & (self.soil_moisture >= 0) & (self.soil_moisture <= 100))
+
+    def select(self, mask: np.ndarray) -> "ReadingBatch":
+        """Returns a new batch holding only the readings where mask is True."""
+        return ReadingBatch(self.plant_ids[mask],
+                            [name for name, keep in zip(self.plant_names, mask) if keep],
+                            self.taken_at[mask], self.temperature[mask],
+                            self.last_watered[mask], self.soil_moisture[mask])
+
+    def rows(self) -> list[tuple]:
+        """Returns (taken_at, temperature, last_watered, soil_moisture, plant_name) rows."""
+        return list(zip(self.taken_at.tolist(), self.temperature.tolist(),
+                        self.last_watered.tolist(), self.soil_moisture.tolist(),
+                        self.plant_names))
@@ -1,3 +1,4 @@
 # Shell script to connect to and reset the database using MS SQL Server CLI.
 source .env
-sqlcmd -S $DB_HOST -U $DB_USER -P $DB_PASSWORD -d $DB_NAME -i schema.sql
\ No newline at end of file
+sqlcmd -S $DB_HOST -U $DB_USER -P $DB_PASSWORD -d $DB_NAME -i schema.sql
+python3 migrate.py
\ No newline at end of file
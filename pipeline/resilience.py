@@ -0,0 +1,90 @@
+"""Retry, circuit breaker and deadline helpers for calls to the plants api."""
+from collections import deque
+from random import uniform
+from threading import Lock
+from time import monotonic
+
+
+def get_backoff_delay(attempt: int, base: float = 0.2, cap: float = 2.0) -> float:
+    """Returns a fully jittered exponential backoff delay for a retry attempt."""
+    return uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class Deadline:
+    """An overall time budget shared by every call in a run."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Returns the seconds left before the deadline."""
+        return max(0.0, self.expires_at - monotonic())
+
+    def expired(self) -> bool:
+        """Returns True once the deadline has passed."""
+        return self.remaining() == 0
+
+    def timeout(self, limit: float) -> float:
+        """Returns a request timeout that never runs past the deadline."""
+        return min(limit, self.remaining())
+
+
+class CircuitBreaker:
+    """Stops calls to the api while most of the recent calls have failed.
+
+    Once open, the breaker rejects calls until the cooldown has passed, then
+    lets a single trial call through. A successful trial closes the breaker.
+    Callers must end every call with record_success, record_failure or
+    release_trial, so a trial can never be left in progress."""
+
+    def __init__(self, window: int = 20, failure_ratio: float = 0.5,
+                 min_calls: int = 10, cooldown: float = 30.0):
+        self.outcomes = deque(maxlen=window)
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Returns True while the breaker is rejecting calls."""
+        return self.opened_at is not None \
+            and monotonic() - self.opened_at < self.cooldown
+
+    def allow_request(self) -> bool:
+        """Returns True if a call may be made now."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.is_open or self.trial_in_progress:
+                return False
+            self.trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        """Records a successful call, closing the breaker if it was a trial."""
+        with self.lock:
+            self.outcomes.append(True)
+            if self.trial_in_progress:
+                self.opened_at = None
+                self.trial_in_progress = False
+
+    def record_failure(self) -> None:
+        """Records a failed call, opening the breaker if too many calls have failed."""
+        with self.lock:
+            self.outcomes.append(False)
+            failures = self.outcomes.count(False)
+            if self.trial_in_progress or (
+                    len(self.outcomes) >= self.min_calls
+                    and failures / len(self.outcomes) >= self.failure_ratio):
+                self.opened_at = monotonic()
+                self.outcomes.clear()
+            self.trial_in_progress = False
+
+    def release_trial(self) -> None:
+        """Ends a trial call whose outcome was not recorded, e.g. one rejected with a
+        4xx, so the next call after the cooldown is let through as a new trial."""
+        with self.lock:
+            self.trial_in_progress = False
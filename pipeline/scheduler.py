@@ -0,0 +1,122 @@
+"""Runs load stages as a dependency graph, with independent stages in parallel."""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+from typing import Callable, NamedTuple
+
+
+class Stage(NamedTuple):
+    """A unit of work, called with a database connection once its dependencies finish."""
+    name: str
+    run: Callable
+    depends_on: tuple = ()
+
+
+class StageTiming(NamedTuple):
+    """When a stage ran, in seconds since the graph started, and whether it was
+    on the critical path, the chain of stages that decided the total time."""
+    started: float
+    finished: float
+    critical: bool = False
+
+    @property
+    def duration(self) -> float:
+        """Seconds the stage took, including waiting for a connection."""
+        return self.finished - self.started
+
+
+def check_graph(stages: list[Stage]) -> None:
+    """Raises a ValueError if a stage is repeated, depends on an unknown stage or is in a cycle."""
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Stage names must be unique: {names}")
+
+    remaining = {stage.name: set(stage.depends_on) for stage in stages}
+    for name, depends_on in remaining.items():
+        if not depends_on <= remaining.keys():
+            raise ValueError(f"Stage {name!r} depends on unknown stages "
+                             f"{sorted(depends_on - remaining.keys())}")
+
+    while remaining:
+        ready = [name for name, depends_on in remaining.items() if not depends_on]
+        if not ready:
+            raise ValueError(f"Stages {sorted(remaining)} depend on each other")
+        for name in ready:
+            del remaining[name]
+        for depends_on in remaining.values():
+            depends_on.difference_update(ready)
+
+
+def get_critical_path(stages: list[Stage], durations: dict[str, float]) -> list[str]:
+    """Gets the chain of dependent stages with the longest total duration."""
+    path_time, previous = {}, {}
+    for stage in stages:
+        slowest = max(stage.depends_on, key=path_time.get, default=None)
+        previous[stage.name] = slowest
+        path_time[stage.name] = durations[stage.name] + path_time.get(slowest, 0.0)
+
+    path = [max(path_time, key=path_time.get)]
+    while previous[path[-1]]:
+        path.append(previous[path[-1]])
+    return path[::-1]
+
+
+def sort_stages(stages: list[Stage]) -> list[Stage]:
+    """Orders stages so each comes after the stages it depends on."""
+    ordered, placed = [], set()
+    while len(ordered) < len(stages):
+        for stage in stages:
+            if stage.name not in placed and placed.issuperset(stage.depends_on):
+                ordered.append(stage)
+                placed.add(stage.name)
+    return ordered
+
+
+def run_stage(stage: Stage, lend_connection: Callable, start: float) -> tuple:
+    """Runs a stage on a borrowed connection, returning its result and timing."""
+    started = perf_counter() - start
+    with lend_connection() as connection:
+        result = stage.run(connection)
+    return result, StageTiming(started, perf_counter() - start)
+
+
+def run_stages(stages: list[Stage], lend_connection: Callable,
+               max_workers: int) -> tuple[dict, dict[str, StageTiming]]:
+    """Runs each stage once all of its dependencies have finished.
+
+    Up to max_workers independent stages run at once, each on its own
+    connection from lend_connection, a context manager factory. If a stage
+    fails no new stages are started, and the first error is raised once the
+    running stages finish. Returns the result and timing of every stage."""
+    check_graph(stages)
+    stages = sort_stages(stages)
+    results, timings, errors = {}, {}, []
+    submitted = set()
+    running = {}
+    start = perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            if not errors:
+                for stage in stages:
+                    if stage.name not in submitted and timings.keys() >= set(stage.depends_on):
+                        submitted.add(stage.name)
+                        running[executor.submit(run_stage, stage, lend_connection,
+                                                start)] = stage.name
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name], timings[name] = future.result()
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    errors.append(error)
+
+    if errors:
+        raise errors[0]
+
+    critical = set(get_critical_path(stages, {name: timing.duration
+                                              for name, timing in timings.items()}))
+    return results, {name: timing._replace(critical=name in critical)
+                     for name, timing in timings.items()}
@@ -1,5 +1,11 @@
 -- This file contains all SQL commands to create the tables and relationships for the Plants database.
+-- Tables added since are created by the migrations in the migrations folder, so
+-- run migrate.py after this file to build the whole schema.
 
+DROP TABLE IF EXISTS latest_reading;
+DROP TABLE IF EXISTS range_state;
+DROP TABLE IF EXISTS anomaly_state;
+DROP TABLE IF EXISTS alert_rule;
 DROP TABLE IF EXISTS sensor_reading;
 DROP TABLE IF EXISTS botanist_assignment;
 DROP TABLE IF EXISTS plant;
@@ -8,6 +14,8 @@ DROP TABLE IF EXISTS botanist;
 DROP TABLE IF EXISTS country;
 DROP TABLE IF EXISTS alert;
 DROP TABLE IF EXISTS alert_type;
+DROP TABLE IF EXISTS load_fingerprint;
+DROP TABLE IF EXISTS schema_migration;
 
 -- Longest official country name in English is 56 characters.
 CREATE TABLE country (
@@ -92,7 +100,7 @@ CREATE TABLE alert (
         REFERENCES alert_type(alert_type_id)
 );
 
-INSERT INTO alert_type
+INSERT INTO alert_type (alert_type_name)
 VALUES 
 ('temperature'),
-('soil moisture');
\ No newline at end of file
+('soil moisture');
@@ -0,0 +1,51 @@
+"""Keeps the modules shared between Lambdas identical in every build context.
+
+Each Lambda's Docker build only sees its own folder, so a module used by more
+than one Lambda is kept as a copy in each folder. The first folder listed for
+a module holds the copy to edit. Run this script to copy it over the others;
+test_shared_modules.py fails while any copy differs."""
+from filecmp import cmp
+from pathlib import Path
+from shutil import copyfile
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SHARED_MODULES = {
+    "storage.py": ["pipeline", "alerts", "old_data/metadata_to_s3",
+                   "old_data/sensor_reading_to_s3"],
+    "db_pool.py": ["pipeline", "alerts"],
+    "migrate.py": ["pipeline", "alerts"],
+    "alert_rules.py": ["alerts", "pipeline"],
+    "alert_detectors.py": ["alerts", "pipeline"],
+    "alert_evaluator.py": ["alerts", "pipeline"],
+    "alert_digest.py": ["alerts", "pipeline"],
+    "alert_delivery.py": ["alerts", "pipeline"],
+}
+
+
+def get_copies(root: Path = ROOT, modules: dict = None) -> list[tuple[Path, Path]]:
+    """Gets the (source, copy) paths of every copy of a shared module."""
+    modules = SHARED_MODULES if modules is None else modules
+    return [(root / folders[0] / name, root / folder / name)
+            for name, folders in modules.items() for folder in folders[1:]]
+
+
+def find_stale_copies(root: Path = ROOT, modules: dict = None) -> list[Path]:
+    """Gets the copies that are missing or differ from their source."""
+    return [copy for source, copy in get_copies(root, modules)
+            if not copy.exists() or not cmp(source, copy, shallow=False)]
+
+
+def sync(root: Path = ROOT, modules: dict = None) -> list[Path]:
+    """Copies each shared module over its stale copies, returning the copies updated."""
+    stale = find_stale_copies(root, modules)
+    sources = {copy: source for source, copy in get_copies(root, modules)}
+    for copy in stale:
+        copyfile(sources[copy], copy)
+    return stale
+
+
+if __name__ == "__main__":
+    updated = sync()
+    print(f"Updated {len(updated)} copies: {[str(copy.relative_to(ROOT)) for copy in updated]}")
@@ -0,0 +1,243 @@
+"""A local write-ahead spool of validated plant data, kept until it is loaded."""
+from itertools import chain
+from os import environ as ENV, fsync, getpid
+from pathlib import Path
+from time import time, time_ns
+from typing import Callable, Iterable, Iterator, NamedTuple
+from zlib import crc32
+import json
+import struct
+
+
+SPOOL_DIR = ENV.get("SPOOL_DIR", "/tmp/plant_spool")
+FSYNC_ALWAYS = "always"
+FSYNC_BATCH = "batch"
+FSYNC_NEVER = "never"
+FSYNC_POLICY = ENV.get("SPOOL_FSYNC", FSYNC_BATCH)
+FSYNC_RECORDS = int(ENV.get("SPOOL_FSYNC_RECORDS", "25"))
+MICRO_BATCH_READINGS = int(ENV.get("MICRO_BATCH_READINGS", "0"))
+MICRO_BATCH_SECONDS = float(ENV.get("MICRO_BATCH_SECONDS", "300"))
+STALE_SECONDS = float(ENV.get("SPOOL_STALE_SECONDS", "900"))
+
+HEADER = struct.Struct(">II")
+OPEN_SUFFIX = ".open"
+CLOSED_SUFFIX = ".spool"
+BAD_SUFFIX = ".bad"
+
+
+def encode_record(record: dict) -> bytes:
+    """Encodes a record as its length, its CRC32 and then its JSON."""
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return HEADER.pack(len(payload), crc32(payload)) + payload
+
+
+def read_records(path: Path) -> Iterator[dict]:
+    """Yields each record in a segment file.
+
+    Reading stops at a record that was only partly written or fails its
+    checksum, which can only be the last record of a run that crashed."""
+    with open(path, "rb") as f:
+        while len(header := f.read(HEADER.size)) == HEADER.size:
+            length, checksum = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) != length or crc32(payload) != checksum:
+                return
+            yield json.loads(payload)
+
+
+def get_segment_time(path: Path) -> float:
+    """Gets when a segment was started, in seconds since the epoch, from its name."""
+    return int(path.name.split("-")[0]) / 1e9
+
+
+class FlushPolicy(NamedTuple):
+    """When buffered readings are loaded in micro-batch mode: once max_readings
+    have been spooled, or the oldest has waited max_seconds. A max_readings of
+    0 turns micro-batching off, and every run loads its own readings."""
+    max_readings: int = MICRO_BATCH_READINGS
+    max_seconds: float = MICRO_BATCH_SECONDS
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if readings are buffered between runs."""
+        return self.max_readings > 0
+
+    def is_due(self, buffered: int, oldest_age: float) -> bool:
+        """Returns True if the buffered readings should be loaded now."""
+        return buffered >= self.max_readings or oldest_age >= self.max_seconds
+
+
+class SpoolSegment:
+    """One run's spool file, appended to while the run is in progress.
+
+    The file has an .open suffix while being written and is renamed to
+    .spool when closed. With the always policy every record is fsynced, with
+    batch every fsync_records records and on close, and with never the
+    operating system decides when to write."""
+
+    def __init__(self, path: Path, fsync_policy: str = FSYNC_POLICY,
+                 fsync_records: int = FSYNC_RECORDS):
+        if fsync_policy not in (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_NEVER):
+            raise ValueError(f"Unknown spool fsync policy {fsync_policy!r}")
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.fsync_records = fsync_records
+        self.file = open(path, "ab")  # pylint: disable=consider-using-with
+        self.count = 0
+        self.unsynced = 0
+
+    def append(self, record: dict) -> None:
+        """Appends a record, syncing it to disk as the fsync policy requires."""
+        self.file.write(encode_record(record))
+        self.count += 1
+        self.unsynced += 1
+        if self.fsync_policy == FSYNC_ALWAYS or (
+                self.fsync_policy == FSYNC_BATCH and self.unsynced >= self.fsync_records):
+            self.sync()
+
+    def sync(self) -> None:
+        """Writes every appended record to disk."""
+        self.file.flush()
+        if self.fsync_policy != FSYNC_NEVER:
+            fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def tee(self, records: Iterable[dict]) -> Iterator[dict]:
+        """Yields each record after appending it to the spool."""
+        for record in records:
+            self.append(record)
+            yield record
+
+    def extend(self, records: Iterable[dict]) -> None:
+        """Appends every remaining record."""
+        for record in records:
+            self.append(record)
+
+    @property
+    def closed(self) -> bool:
+        """Returns True once the segment has been closed or discarded."""
+        return self.file.closed
+
+    def close(self) -> Path:
+        """Syncs and closes the segment, leaving it to be drained later."""
+        self.sync()
+        self.file.close()
+        closed = self.path.with_suffix(CLOSED_SUFFIX)
+        self.path.replace(closed)
+        return closed
+
+    def discard(self) -> None:
+        """Closes and deletes the segment, once all of its records are loaded."""
+        self.file.close()
+        self.path.unlink()
+
+
+class Spool:
+    """A directory of spool segments, drained oldest first."""
+
+    def __init__(self, directory: str = SPOOL_DIR, fsync_policy: str = FSYNC_POLICY,
+                 fsync_records: int = FSYNC_RECORDS, stale_seconds: float = STALE_SECONDS):
+        self.directory = Path(directory)
+        self.fsync_policy = fsync_policy
+        self.fsync_records = fsync_records
+        self.stale_seconds = stale_seconds
+        self.open_paths = set()
+
+    def open_segment(self) -> SpoolSegment:
+        """Starts a new segment for this run's records."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{time_ns():020d}-{getpid()}{OPEN_SUFFIX}"
+        self.open_paths = {open_path for open_path in self.open_paths if open_path.exists()}
+        self.open_paths.add(path)
+        return SpoolSegment(path, self.fsync_policy, self.fsync_records)
+
+    def is_abandoned(self, path: Path, now: float) -> bool:
+        """Returns True if an open segment was started by another run that has
+        since crashed.
+
+        Runs sharing the spool directory can be live at the same time, so an
+        open segment only counts as abandoned once it was started longer ago
+        than any run can last."""
+        return (path not in self.open_paths
+                and now - get_segment_time(path) >= self.stale_seconds)
+
+    def get_backlog(self, now: float = None) -> list[Path]:
+        """Gets the segments waiting to be loaded, oldest first, including
+        open segments abandoned by a run that crashed."""
+        if not self.directory.exists():
+            return []
+        now = now or time()
+        return sorted(path for path in self.directory.iterdir()
+                      if path.suffix == CLOSED_SUFFIX
+                      or (path.suffix == OPEN_SUFFIX and self.is_abandoned(path, now)))
+
+    def get_oldest_age(self, now: float = None) -> float:
+        """Gets how many seconds the oldest waiting segment has been in the spool."""
+        backlog = self.get_backlog()
+        if not backlog:
+            return 0.0
+        return max((now or time()) - get_segment_time(backlog[0]), 0.0)
+
+    def count_backlog(self) -> int:
+        """Counts the records waiting to be loaded."""
+        return sum(sum(1 for _ in read_records(path)) for path in self.get_backlog())
+
+    def get_quarantined(self) -> list[Path]:
+        """Gets the segments set aside because they could not be loaded."""
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob(f"*{BAD_SUFFIX}"))
+
+    @staticmethod
+    def quarantine(path: Path) -> Path:
+        """Sets a segment that cannot be loaded aside as a .bad file, so it no
+        longer blocks the backlog but can still be inspected."""
+        bad = path.with_suffix(BAD_SUFFIX)
+        path.replace(bad)
+        return bad
+
+    def drain(self, load: Callable[[Iterable[dict]], int],
+              keep_on: tuple[type[Exception], ...] = (Exception,),
+              on_quarantine: Callable[[Path, Exception], None] = None) -> int:
+        """Loads each waiting segment in order, deleting it once loaded.
+
+        load is given the records of one segment and returns how many it
+        loaded. If it raises one of keep_on, such as a database error, that
+        segment and any after it are kept and the error is raised. Any other
+        error means the segment itself cannot be loaded, so it is quarantined,
+        on_quarantine is called with it and the error if given, and the rest
+        of the backlog is drained."""
+        drained = 0
+        for path in self.get_backlog():
+            try:
+                drained += load(read_records(path))
+            except keep_on:
+                raise
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                bad = self.quarantine(path)
+                if on_quarantine:
+                    on_quarantine(bad, error)
+                continue
+            path.unlink(missing_ok=True)
+        return drained
+
+    def flush(self, load: Callable[[Iterable[dict]], int],
+              keep_on: tuple[type[Exception], ...] = (Exception,),
+              on_quarantine: Callable[[Path, Exception], None] = None) -> int:
+        """Loads every waiting segment as one stream, deleting them once loaded.
+
+        Unlike drain, records from several segments can share a batch, so a
+        backlog of small runs is written in a few large batches. If load
+        raises one of keep_on, every segment is kept and the whole backlog is
+        retried. Any other error falls back to draining the segments one at a
+        time, so only the segment that cannot be loaded is quarantined."""
+        backlog = self.get_backlog()
+        try:
+            flushed = load(chain.from_iterable(read_records(path) for path in backlog))
+        except keep_on:
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            return self.drain(load, keep_on, on_quarantine)
+        for path in backlog:
+            path.unlink(missing_ok=True)
+        return flushed
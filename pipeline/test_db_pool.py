@@ -0,0 +1,83 @@
+"""Tests for the database connection pool."""
+
+from unittest.mock import MagicMock, patch
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+def test_connection_is_reused_between_runs():
+    """Tests that a released connection is handed out again instead of opening a new one."""
+
+    connect = MagicMock()
+    pool = ConnectionPool(connect)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert connect.call_count == 1
+    assert pool.get_metrics() == {"reused": 1, "opened": 1, "discarded": 0,
+                                  "reuse_ratio": 0.5}
+
+
+def test_dead_connection_is_replaced():
+    """Tests that a connection failing its liveness check is closed and replaced."""
+
+    dead = MagicMock()
+    dead.cursor.return_value.execute.side_effect = sqlite3.Error("connection lost")
+    fresh = MagicMock()
+    pool = ConnectionPool(MagicMock(side_effect=[dead, fresh]), ping_after=0)
+    pool.release(pool.acquire())
+
+    assert pool.acquire() is fresh
+    dead.close.assert_called_once()
+
+
+@patch("db_pool.monotonic")
+def test_connection_idle_too_long_is_not_reused(mock_monotonic):
+    """Tests that a connection idle for longer than max_idle is closed rather than reused."""
+
+    mock_monotonic.return_value = 0
+    pool = ConnectionPool(MagicMock(side_effect=lambda: MagicMock()), max_idle=60)
+    stale = pool.acquire()
+    pool.release(stale)
+
+    mock_monotonic.return_value = 61
+    assert pool.acquire() is not stale
+    stale.close.assert_called_once()
+
+
+@patch("db_pool.monotonic")
+def test_only_connections_idle_past_the_threshold_are_checked(mock_monotonic):
+    """Tests that a connection reused straight away runs no liveness query."""
+
+    mock_monotonic.return_value = 0
+    connection = MagicMock()
+    pool = ConnectionPool(MagicMock(return_value=connection), ping_after=30)
+    pool.release(pool.acquire())
+
+    mock_monotonic.return_value = 10
+    pool.release(pool.acquire())
+    connection.cursor.assert_not_called()
+
+    mock_monotonic.return_value = 45
+    assert pool.acquire() is connection
+    connection.cursor.return_value.execute.assert_called_once_with("SELECT 1")
+
+
+def test_connection_is_discarded_when_block_raises():
+    """Tests that a connection in use when an error is raised is not returned to the pool."""
+
+    pool = ConnectionPool(MagicMock())
+
+    with pytest.raises(sqlite3.Error):
+        with pool.connection() as connection:
+            raise sqlite3.Error("insert failed")
+
+    connection.close.assert_called_once()
+    assert not pool.idle
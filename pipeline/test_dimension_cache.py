@@ -0,0 +1,62 @@
+"""Tests for the dimension key cache."""
+
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from dimension_cache import DimensionCache, get_origin_key
+
+
+def make_connection() -> MagicMock:
+    """Makes a mock connection whose cursor returns one row per dimension table."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.side_effect = [
+        [("Chad", 1)],
+        [(Decimal("14.3100"), Decimal("21.8900"), 4)],
+        [("Begonia", 7)],
+        [("Nathan Kuhic", "nathan.kuhic@lnhm.co.uk", 2)],
+        [(2, 7)]]
+    return connection
+
+
+def test_warm_loads_every_table_with_one_query_each():
+    """Tests that warming runs a single query per dimension table and keys each row."""
+
+    connection = make_connection()
+    cache = DimensionCache()
+
+    cache.warm(connection)
+
+    assert connection.cursor.return_value.execute.call_count == 5
+    assert cache.countries == {"Chad": 1}
+    assert cache.origins == {get_origin_key(14.31, 21.89): 4}
+    assert cache.plants == {"Begonia": 7}
+    assert cache.botanists == {("Nathan Kuhic", "nathan.kuhic@lnhm.co.uk"): 2}
+    assert cache.assignments == {(2, 7)}
+
+
+@patch("dimension_cache.monotonic")
+def test_cache_is_stale_after_ttl(mock_monotonic):
+    """Tests that the cache needs re-warming once it is older than the TTL."""
+
+    mock_monotonic.return_value = 100
+    cache = DimensionCache(ttl=60)
+    assert cache.is_stale()
+
+    cache.warm(make_connection())
+    mock_monotonic.return_value = 150
+    assert not cache.is_stale()
+
+    mock_monotonic.return_value = 161
+    assert cache.is_stale()
+
+
+def test_ensure_warm_skips_query_when_fresh():
+    """Tests that a fresh cache is not re-warmed."""
+
+    connection = make_connection()
+    cache = DimensionCache()
+    cache.ensure_warm(connection)
+    cache.ensure_warm(connection)
+
+    assert connection.cursor.return_value.execute.call_count == 5
@@ -0,0 +1,216 @@
+"""Tests for the api extract functions."""
+
+from time import sleep
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import requests
+
+from extract import (get_data, get_session, get_shard_plant_ids, stream_plant_data,
+                     FetchResult, API_URL)
+from resilience import CircuitBreaker
+
+
+def make_response(status_code: int, body: dict = None) -> MagicMock:
+    """Makes a mock api response."""
+
+    res = MagicMock()
+    res.status_code = status_code
+    res.json.return_value = body or {}
+    return res
+
+
+def test_get_data_uses_given_session():
+    """Tests that the request is made through the shared session when one is given."""
+
+    session = MagicMock()
+    session.get.return_value = make_response(200, {"plant_id": 3})
+
+    result = get_data(3, MagicMock(), session)
+
+    assert result.ok
+    assert result.data == {"plant_id": 3}
+    session.get.assert_called_once()
+    assert session.get.call_args.args == (f"{API_URL}/3",)
+
+
+@patch("extract.sleep")
+@patch("extract.BREAKER", CircuitBreaker())
+def test_get_data_retries_server_errors_and_timeouts(mock_sleep):
+    """Tests that 5xx responses and timeouts are retried until a success."""
+
+    session = MagicMock()
+    session.get.side_effect = [make_response(503), requests.Timeout("slow"),
+                               make_response(200, {"plant_id": 3})]
+
+    result = get_data(3, MagicMock(), session)
+
+    assert result.ok
+    assert result.attempts == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch("extract.sleep")
+@patch("extract.BREAKER", CircuitBreaker())
+def test_get_data_returns_structured_failure(mock_sleep):
+    """Tests that a plant which keeps failing returns an error result rather than None."""
+
+    session = MagicMock()
+    session.get.return_value = make_response(500)
+
+    result = get_data(3, MagicMock(), session)
+
+    assert not result.ok
+    assert result.error
+    assert result.attempts == 4
+
+
+def test_get_data_does_not_retry_unauthorised():
+    """Tests that a 401 response fails straight away."""
+
+    session = MagicMock()
+    session.get.return_value = make_response(401)
+
+    result = get_data(3, MagicMock(), session)
+
+    assert result.status_code == 401
+    assert result.attempts == 1
+
+
+def test_get_data_counts_a_404_without_a_json_body_as_missing():
+    """Tests that a missing plant is decided by the status code, not the body."""
+
+    session = MagicMock()
+    session.get.return_value = make_response(404)
+    session.get.return_value.json.side_effect = ValueError("not JSON")
+
+    result = get_data(3, MagicMock(), session)
+
+    assert result.missing
+    assert result.attempts == 1
+
+
+def test_get_data_returns_other_request_errors():
+    """Tests that request errors which are not retried are returned, not raised."""
+
+    session = MagicMock()
+    session.get.side_effect = requests.TooManyRedirects("redirect loop")
+
+    result = get_data(3, MagicMock(), session)
+
+    assert not result.ok
+    assert result.error == "redirect loop"
+    assert result.attempts == 1
+
+
+def test_get_data_skips_call_when_breaker_open():
+    """Tests that no request is made while the circuit breaker is open."""
+
+    breaker = CircuitBreaker(min_calls=1)
+    breaker.record_failure()
+    session = MagicMock()
+
+    with patch("extract.BREAKER", breaker):
+        result = get_data(3, MagicMock(), session)
+
+    assert result.error == "Circuit breaker is open."
+    session.get.assert_not_called()
+
+
+@pytest.mark.parametrize("response", [make_response(403), make_response(401)])
+@patch("resilience.monotonic")
+def test_get_data_ends_trial_rejected_without_retry(mock_monotonic, response):
+    """Tests that a half-open trial ending in a 4xx does not leave the breaker stuck."""
+
+    mock_monotonic.return_value = 100
+    breaker = CircuitBreaker(min_calls=1, cooldown=30)
+    breaker.record_failure()
+    mock_monotonic.return_value = 131
+    session = MagicMock()
+    session.get.return_value = response
+
+    with patch("extract.BREAKER", breaker):
+        get_data(3, MagicMock(), session)
+
+    assert not breaker.trial_in_progress
+    assert breaker.allow_request()
+
+
+def test_get_session_is_reused():
+    """Tests that the same keep-alive session is returned for the same pool size."""
+
+    assert get_session(4) is get_session(4)
+
+
+def test_get_shard_plant_ids_are_striped():
+    """Tests that each shard gets every Nth plant ID starting from its own offset."""
+
+    plant_ids = get_shard_plant_ids(1, 3)
+
+    assert [next(plant_ids) for _ in range(4)] == [2, 5, 8, 11]
+
+
+def test_get_shard_plant_ids_rejects_unknown_shard():
+    """Tests that a shard outside of the shard count raises an error."""
+
+    with pytest.raises(ValueError):
+        get_shard_plant_ids(3, 3)
+
+
+def make_plant_result(plant_id: int, exists: bool) -> FetchResult:
+    """Makes a fetch result for a plant that either exists or is missing from the api."""
+
+    if not exists:
+        return FetchResult(plant_id, {"error": "plant not found"}, 404)
+    return FetchResult(plant_id, {
+        "plant_id": plant_id, "name": "Begonia", "temperature": 17.351,
+        "origin_location": {"latitude": 14.312, "longitude": 21.89,
+                            "city": "South Julianview", "country": "Chad"},
+        "botanist": {"name": "Nathan Kuhic", "email": "nathan.kuhic@lnhm.co.uk",
+                     "phone": "(470) 586-3930 x591"},
+        "last_watered": "2025-06-03T13:32:05.000Z", "soil_moisture": -3.2,
+        "recording_taken": "2025-06-03T15:18:44.108Z", "images": None}, 200)
+
+
+@patch("extract.get_data")
+def test_stream_plant_data_stops_after_run_of_missing_plants(mock_get_data):
+    """Tests that streaming skips a single missing plant but stops after a run of them."""
+
+    existing_ids = {1, 2, 4, 5}
+    mock_get_data.side_effect = lambda plant_id, logger, session, deadline: \
+        make_plant_result(plant_id, plant_id in existing_ids)
+
+    result = stream_plant_data(MagicMock(), max_workers=2, max_misses=3)
+
+    assert sorted(plant["plant_id"] for plant in result) == [1, 2, 4, 5]
+
+
+@patch("extract.get_data")
+def test_stream_plant_data_does_not_run_ahead_of_a_slow_plant(mock_get_data):
+    """Tests that while the first ID is slow, only a bounded number of IDs past it are tried."""
+
+    def get_slow_first_plant(plant_id, logger, session, deadline):
+        if plant_id == 1:
+            sleep(0.2)
+        return make_plant_result(plant_id, plant_id == 1)
+    mock_get_data.side_effect = get_slow_first_plant
+
+    result = list(stream_plant_data(MagicMock(), max_workers=2, max_misses=3))
+
+    assert len(result) == 1
+    assert max(call.args[0] for call in mock_get_data.call_args_list) <= 5
+
+
+@patch("extract.get_data")
+def test_stream_plant_data_yields_cleaned_data(mock_get_data):
+    """Tests that each streamed plant has been validated and converted."""
+
+    mock_get_data.side_effect = lambda plant_id, logger, session, deadline: \
+        make_plant_result(plant_id, plant_id == 1)
+
+    result = list(stream_plant_data(MagicMock(), max_workers=1, max_misses=1))
+
+    assert len(result) == 1
+    assert "images" not in result[0]
+    assert result[0]["origin_location"]["latitude"] == 14.31
@@ -0,0 +1,56 @@
+"""Tests for the local fake plants API, driving the extractor against it."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+import extract
+from fake_api import start_server, get_api_url
+
+
+@pytest.fixture(name="api_url")
+def fixture_api_url():
+    """Starts a fake API with 30 plants and no errors for the duration of a test."""
+
+    server = start_server(plant_count=30, seed=0)
+    yield get_api_url(server)
+    server.shutdown()
+    server.server_close()
+
+
+def test_fake_api_serves_plants_and_404s(api_url):
+    """Tests that known plants are served and unknown plants return a 404."""
+
+    assert requests.get(f"{api_url}/3", timeout=5).json()["plant_id"] == 3
+    assert requests.get(f"{api_url}/31", timeout=5).status_code == 404
+
+
+def test_fake_api_serves_edge_cases(api_url):
+    """Tests that the payloads include null images, negative moisture and missing keys."""
+
+    assert requests.get(f"{api_url}/7", timeout=5).json()["images"] is None
+    assert requests.get(f"{api_url}/11", timeout=5).json()["soil_moisture"] < 0
+    assert "botanist" not in requests.get(f"{api_url}/13", timeout=5).json()
+
+
+def test_fake_api_keeps_plant_details_between_requests(api_url):
+    """Tests that a plant's origin stays the same while its readings change."""
+
+    first, second = (requests.get(f"{api_url}/5", timeout=5).json() for _ in range(2))
+
+    assert first["origin_location"] == second["origin_location"]
+    assert first["temperature"] != second["temperature"]
+
+
+def test_retrieve_all_data_against_fake_api(api_url):
+    """Tests that every valid plant is extracted and the invalid ones are dropped."""
+
+    results = []
+    with patch("extract.API_URL", api_url):
+        plants = extract.retrieve_all_data(MagicMock(), max_workers=4,
+                                           on_fetch=results.append)
+
+    assert sorted(plant["plant_id"] for plant in plants) == [
+        plant_id for plant_id in range(1, 31) if plant_id % 13 != 0]
+    assert all(result.elapsed > 0 for result in results)
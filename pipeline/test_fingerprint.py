@@ -0,0 +1,54 @@
+"""Tests for the dimension data fingerprints."""
+
+from unittest.mock import MagicMock
+
+from fingerprint import FingerprintStore
+
+
+def test_get_changes_reports_new_plants_in_every_dimension(make_plant):
+    """Tests that a plant never seen before is changed in every dimension."""
+
+    changed, pending = FingerprintStore().get_changes([make_plant(1)])
+
+    assert all(plants == [make_plant(1)] for plants in changed.values())
+    assert set(pending) == {(1, "botanist"), (1, "origin"), (1, "plant")}
+
+
+def test_get_changes_skips_unchanged_plants(make_plant):
+    """Tests that nothing is reported once the fingerprints have been saved."""
+
+    store = FingerprintStore()
+    _, pending = store.get_changes([make_plant(1), make_plant(2)])
+    store.update(pending)
+
+    changed, pending = store.get_changes([make_plant(1), make_plant(2)])
+
+    assert not any(changed.values())
+    assert not pending
+
+
+def test_get_changes_only_reports_changed_dimension(make_plant):
+    """Tests that a changed botanist phone only marks the botanist dimension as changed."""
+
+    store = FingerprintStore()
+    store.update(store.get_changes([make_plant(1)])[1])
+
+    changed, pending = store.get_changes([make_plant(1, phone="07700 900123")])
+
+    assert changed["botanist"] == [make_plant(1, phone="07700 900123")]
+    assert not changed["origin"] and not changed["plant"]
+    assert list(pending) == [(1, "botanist")]
+
+
+def test_ensure_loaded_reads_table_once():
+    """Tests that stored fingerprints are read from the database only once."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.fetchall.return_value = [(1, "botanist", b"\x01" * 16)]
+    store = FingerprintStore()
+
+    store.ensure_loaded(connection)
+    store.ensure_loaded(connection)
+
+    assert store.fingerprints == {(1, "botanist"): b"\x01" * 16}
+    assert connection.cursor.return_value.execute.call_count == 1
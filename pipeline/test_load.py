@@ -1,6 +1,19 @@
 """Testing file for load to database script."""
 
-from load import get_plant_master_data
+from random import Random
+from unittest.mock import MagicMock, patch
+import sqlite3
+
+import pytest
+
+from dimension_cache import DimensionCache
+from fake_api import make_plant
+from fingerprint import FingerprintStore
+from load import (get_plant_master_data, load_in_batches, get_plant_id, load_country_data,
+                  load_origin_data, load_botanist_data, load_botanist_assignment_data,
+                  load_plant_master_data, load_sensor_reading_data, load_plant_batch,
+                  match_plant_name, ReadingCounts, ALL_OR_NOTHING, SKIP_BAD_ROWS)
+from storage import SQLServerBackend
 
 
 def test_get_plant_master_data_no_images_key():
@@ -71,3 +84,237 @@ def test_get_plant_master_data_good_images():
     assert result["image_link"]
     assert all([result["scientific_name"],
                result["plant_name"], result["soil_moisture"]])
+
+
+@patch("load.load_plant_batch")
+def test_load_in_batches_loads_stream_in_fixed_size_batches(mock_load_plant_batch):
+    """Tests that a stream of plants is loaded in batches no larger than the batch size."""
+
+    plants = ({"plant_id": plant_id} for plant_id in range(7))
+
+    batch_counts = []
+
+    assert load_in_batches(MagicMock(), plants, batch_size=3, on_load=batch_counts.append) == 7
+    assert [len(call.args[1]) for call in mock_load_plant_batch.call_args_list] == [3, 3, 1]
+    assert batch_counts == [mock_load_plant_batch.return_value] * 3
+
+
+@patch("load.DIMENSION_CACHE", DimensionCache())
+def test_get_plant_id_only_queries_on_cache_miss():
+    """Tests that a plant ID is looked up once and then served from the cache."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.fetchone.return_value = (12,)
+
+    assert get_plant_id(connection, {"name": "Begonia"}) == 12
+    assert get_plant_id(connection, {"name": "Begonia"}) == 12
+    assert connection.cursor.return_value.execute.call_count == 1
+
+
+def test_match_plant_name_keeps_a_plain_comparison_for_the_index():
+    """Tests that the case-sensitive match also compares the bare column, so it can seek."""
+
+    with patch("load.BACKEND", SQLServerBackend()):
+        match = match_plant_name("p.plant_name", "s.plant_name")
+
+    assert match == ("p.plant_name = s.plant_name AND p.plant_name = s.plant_name "
+                     "COLLATE SQL_Latin1_General_CP1_CS_AS")
+
+
+def test_dimension_inserts_lock_the_keys_they_check_on_sql_server():
+    """Tests that every dimension insert locks the keys it checks, so overlapping
+    runs cannot insert the same row twice."""
+
+    connection = MagicMock()
+    plants = [make_plant(1, Random(1))]
+
+    with patch("load.BACKEND", SQLServerBackend()), \
+            patch("load.DIMENSION_CACHE", DimensionCache()):
+        for load_dimension in (load_country_data, load_origin_data, load_botanist_data,
+                               load_plant_master_data, load_botanist_assignment_data):
+            load_dimension(connection, plants)
+
+    inserts = [call.args[0] for call in connection.cursor.return_value.execute.call_args_list
+               if "INSERT INTO" in call.args[0]]
+    assert len(inserts) == 5
+    assert all("WITH (UPDLOCK, HOLDLOCK)" in insert for insert in inserts)
+
+
+def test_load_country_data_skips_cached_countries():
+    """Tests that only countries missing from the cache are inserted."""
+
+    cache = DimensionCache()
+    cache.countries["Chad"] = 1
+    connection = MagicMock()
+    curs = connection.cursor.return_value
+    curs.fetchall.return_value = [("Peru", 2)]
+    plants = [{"origin_location": {"country": "Chad"}},
+              {"origin_location": {"country": "Peru"}},
+              {"origin_location": {"country": "Peru"}}]
+
+    with patch("load.DIMENSION_CACHE", cache):
+        load_country_data(connection, plants)
+
+    assert curs.executemany.call_args.args[1] == [("Peru",)]
+    assert connection.commit.call_count == 1
+    assert cache.countries == {"Chad": 1, "Peru": 2}
+
+
+def test_load_country_data_makes_no_round_trips_when_all_cached():
+    """Tests that nothing is sent to the database when every country is already known."""
+
+    cache = DimensionCache()
+    cache.countries["Chad"] = 1
+    connection = MagicMock()
+
+    with patch("load.DIMENSION_CACHE", cache):
+        load_country_data(connection, [{"origin_location": {"country": "Chad"}}])
+
+    connection.cursor.assert_not_called()
+
+
+def make_reading_plant(plant_id: int, soil_moisture: float) -> dict:
+    """Makes validated API data for a plant with the given soil moisture."""
+
+    return {"plant_id": plant_id, "name": f"Plant {plant_id}", "temperature": 17.35,
+            "last_watered": "2025-06-03T13:32:05.000Z", "soil_moisture": soil_moisture,
+            "recording_taken": "2025-06-03T15:18:44.108Z"}
+
+
+def make_cached_plants_cache() -> DimensionCache:
+    """Makes a cache that already knows the IDs of plants 1 to 3."""
+
+    cache = DimensionCache()
+    cache.plants.update({f"Plant {plant_id}": plant_id for plant_id in range(1, 4)})
+    return cache
+
+
+def test_load_sensor_reading_data_stages_one_batch_and_commits_once():
+    """Tests that every reading is staged in one executemany call and inserted with one
+    statement that skips readings already loaded, with a single commit that also
+    updates the window of latest readings."""
+
+    connection = MagicMock()
+    curs = connection.cursor.return_value = MagicMock(spec=sqlite3.Cursor)
+    curs.rowcount = 2
+    plants = [make_reading_plant(plant_id, 40.0) for plant_id in range(1, 4)]
+
+    with patch("load.DIMENSION_CACHE", make_cached_plants_cache()), \
+            patch("load.BACKEND", SQLServerBackend()):
+        assert load_sensor_reading_data(connection, plants) == ReadingCounts(new=2, duplicate=1)
+
+    assert curs.fast_executemany is True
+    assert curs.executemany.call_count == 1
+    assert len(curs.executemany.call_args.args[1]) == 3
+    statements = [call.args[0] for call in curs.execute.call_args_list]
+    assert any("INSERT INTO sensor_reading" in statement and "NOT EXISTS" in statement
+               for statement in statements)
+    assert "DELETE FROM latest_reading" in statements[-1]
+    assert connection.commit.call_count == 1
+
+
+def test_load_sensor_reading_data_hands_committed_readings_to_on_readings():
+    """Tests that the loaded readings are passed on after the batch is committed."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.rowcount = 1
+    handed = []
+    connection.commit.side_effect = lambda: handed.append("commit")
+
+    with patch("load.DIMENSION_CACHE", make_cached_plants_cache()):
+        load_sensor_reading_data(connection, [make_reading_plant(1, 40.0)],
+                                 on_readings=handed.append)
+
+    assert handed[0] == "commit"
+    [(plant_id, plant_name, _, _, soil_moisture)] = handed[1]
+    assert (plant_id, plant_name, soil_moisture) == (1, "Plant 1", 40.0)
+
+
+def test_load_sensor_reading_data_stages_repeated_readings_once():
+    """Tests that the same plant and taken_at twice in a batch is staged once."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.rowcount = 1
+    plants = [make_reading_plant(1, 40.0), make_reading_plant(1, 40.0)]
+
+    with patch("load.DIMENSION_CACHE", make_cached_plants_cache()):
+        assert load_sensor_reading_data(connection, plants) == ReadingCounts(new=1, duplicate=1)
+
+    assert len(connection.cursor.return_value.executemany.call_args.args[1]) == 1
+
+
+def test_load_sensor_reading_data_all_or_nothing_rolls_back():
+    """Tests that a failed batch is rolled back and raised in all-or-nothing mode."""
+
+    connection = MagicMock()
+    connection.cursor.return_value.executemany.side_effect = sqlite3.Error("bad row")
+
+    with patch("load.DIMENSION_CACHE", make_cached_plants_cache()), \
+            pytest.raises(sqlite3.Error):
+        load_sensor_reading_data(connection, [make_reading_plant(1, 40.0)], ALL_OR_NOTHING)
+
+    connection.rollback.assert_called_once()
+    connection.commit.assert_not_called()
+
+
+def test_load_sensor_reading_data_skip_bad_rows():
+    """Tests that bad rows are dropped and the rest are still loaded in skip mode."""
+
+    connection = MagicMock()
+    curs = connection.cursor.return_value
+    curs.rowcount = 1
+    curs.executemany.side_effect = [sqlite3.Error("bad row"), None, None]
+    curs.execute.side_effect = [None] * 9 + [sqlite3.Error("bad row")]
+    plants = [make_reading_plant(1, 40.0), make_reading_plant(2, 140.0),
+              make_reading_plant(3, 20.0)]
+
+    with patch("load.DIMENSION_CACHE", make_cached_plants_cache()):
+        assert load_sensor_reading_data(connection, plants, SKIP_BAD_ROWS) == ReadingCounts(1, 0)
+
+    assert len(curs.executemany.call_args_list[0].args[1]) == 2
+    connection.commit.assert_called_once()
+
+
+def test_load_plant_master_data_stages_each_new_plant_once():
+    """Tests that new plants are staged once each and inserted with a single statement."""
+
+    connection = MagicMock()
+    curs = connection.cursor.return_value
+    curs.fetchall.return_value = [("Begonia", 5)]
+    plant = {"name": "Begonia", "soil_moisture": 40.0, "scientific_name": ["Begonia x"],
+             "origin_location": {"latitude": 14.31, "longitude": 21.89}}
+
+    with patch("load.DIMENSION_CACHE", DimensionCache()) as cache:
+        load_plant_master_data(connection, [plant, plant])
+
+        assert cache.plants == {"Begonia": 5}
+
+    assert curs.executemany.call_args.args[1] == [("Begonia", 14.31, 21.89, "Begonia x", None)]
+    assert connection.commit.call_count == 1
+
+
+@patch("load.load_sensor_reading_data")
+@patch("load.load_botanist_assignment_data")
+@patch("load.load_plant_master_data")
+@patch("load.load_origin_data")
+@patch("load.load_country_data")
+@patch("load.load_botanist_data")
+def test_load_plant_batch_skips_dimensions_for_unchanged_plants(mock_load_botanist_data,
+                                                                *mock_other_loaders):
+    """Tests that a second run with the same plants only passes readings to be loaded."""
+
+    plant = make_reading_plant(1, 40.0)
+    plant["botanist"] = {"name": "Benny Block", "email": "benny.block@lnhm.co.uk",
+                         "phone": "687-647-1094"}
+    plant["origin_location"] = {"latitude": 82.89, "longitude": 0.63,
+                                "city": "North Felicia", "country": "Chad"}
+    connection = MagicMock()
+
+    with patch("load.DIMENSION_CACHE", make_cached_plants_cache()), \
+            patch("load.FINGERPRINTS", FingerprintStore()):
+        load_plant_batch(connection, [plant])
+        load_plant_batch(connection, [plant])
+
+    assert [call.kwargs["plants_data"]
+            for call in mock_load_botanist_data.call_args_list] == [[plant], []]
+    assert mock_other_loaders[-1].call_count == 2
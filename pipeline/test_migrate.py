@@ -0,0 +1,112 @@
+"""Tests for the schema migrations."""
+
+from migrate import MIGRATIONS_PATH, get_migrations, migrate, split_statements
+from storage import SQLiteBackend
+
+
+def test_split_statements_drops_comments_and_blank_statements():
+
+    sql = "-- An index.\nCREATE INDEX a ON t (x);\n\n-- Another.\nCREATE INDEX b ON t (y);\n"
+
+    assert split_statements(sql) == ["CREATE INDEX a ON t (x)", "CREATE INDEX b ON t (y)"]
+
+
+def test_get_migrations_orders_by_version(tmp_path):
+
+    for name in ["010_later.sql", "002_earlier.sql", "notes.sql"]:
+        (tmp_path / name).write_text("")
+
+    assert [version for version, _ in get_migrations(tmp_path)] == [2, 10]
+
+
+def test_migrate_applies_each_migration_once(tmp_path):
+    """Tests that the shipped migrations apply to a new SQLite database and are recorded."""
+
+    backend = SQLiteBackend(str(tmp_path / "plants.db"), auto_migrate=False)
+    connection = backend.connect()
+
+    applied = migrate(connection, backend=backend)
+
+    assert applied == [migration.stem for _, migration in get_migrations(MIGRATIONS_PATH)]
+    assert migrate(connection, backend=backend) == []
+    assert connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'uq_sensor_reading_plant_taken_at'"
+    ).fetchone()
+
+
+def test_migrate_creates_missing_migration_table(tmp_path):
+    """Tests that databases created before schema_migration existed can be migrated."""
+
+    backend = SQLiteBackend(str(tmp_path / "plants.db"), auto_migrate=False)
+    connection = backend.connect()
+    (tmp_path / "001_first.sql").write_text("CREATE INDEX ix_first ON plant (plant_name);")
+
+    assert migrate(connection, tmp_path, backend) == ["001_first"]
+
+
+def test_latest_reading_migration_keeps_the_newest_three_readings(tmp_path):
+    """Tests that the window migration fills latest_reading from existing readings."""
+
+    backend = SQLiteBackend(str(tmp_path / "plants.db"), auto_migrate=False)
+    connection = backend.connect()
+    connection.execute("INSERT INTO country (country_name) VALUES ('Brazil')")
+    connection.execute("INSERT INTO origin (latitude, longitude, city_name, country_id) "
+                       "VALUES (0, 0, 'Recife', 1)")
+    connection.execute("INSERT INTO plant (plant_name, origin_id) VALUES ('Begonia', 1)")
+    connection.executemany("""INSERT INTO sensor_reading
+                              (taken_at, temperature, last_watered, soil_moisture, plant_id)
+                              VALUES (?, 20, '2025-06-03', 50, 1)""",
+                           [(f"2025-06-03 15:0{minute}:00",) for minute in range(5)])
+    connection.commit()
+
+    migrate(connection, backend=backend)
+
+    assert connection.execute(
+        "SELECT MIN(taken_at), COUNT(*) FROM latest_reading"
+    ).fetchone() == ("2025-06-03 15:02:00", 3)
+
+
+def test_migrations_build_the_tables_left_out_of_schema_sql(tmp_path):
+    """Tests that the tables and alert types added since schema.sql come from the migrations."""
+
+    backend = SQLiteBackend(str(tmp_path / "plants.db"), auto_migrate=False)
+    connection = backend.connect()
+
+    migrate(connection, backend=backend)
+
+    assert connection.execute(
+        "SELECT alert_type_id FROM alert_type WHERE alert_type_name LIKE '%anomaly'"
+    ).fetchall() == [(3,), (4,)]
+    assert {name for (name,) in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")} >= {
+            "latest_reading", "alert_rule", "anomaly_state", "load_fingerprint",
+            "range_state"}
+
+
+def test_load_fingerprint_migration_replaces_an_existing_table(tmp_path):
+    """Tests that databases reset from the older schema.sql, which had the table, migrate."""
+
+    backend = SQLiteBackend(str(tmp_path / "plants.db"), auto_migrate=False)
+    connection = backend.connect()
+    connection.execute("CREATE TABLE load_fingerprint (plant_id, dimension, fingerprint)")
+
+    migrate(connection, backend=backend)
+
+    assert connection.execute("SELECT COUNT(*) FROM load_fingerprint").fetchone() == (0,)
+
+
+def test_sqlite_connect_applies_pending_migrations(tmp_path):
+    """Tests that connecting brings a new or lagging SQLite database up to date."""
+
+    connection = SQLiteBackend(str(tmp_path / "plants.db")).connect()
+    connection.execute("DELETE FROM schema_migration WHERE version = 7")
+    connection.execute("DROP TABLE range_state")
+    connection.commit()
+    connection.close()
+
+    backend = SQLiteBackend(str(tmp_path / "plants.db"))
+    connection = backend.connect()
+
+    assert migrate(connection, backend=backend) == []
+    assert connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'range_state'").fetchone()
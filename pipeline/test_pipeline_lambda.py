@@ -0,0 +1,37 @@
+"""Tests for the pipeline Lambda's load modes."""
+
+import sqlite3
+from unittest.mock import MagicMock, patch
+
+from alert_delivery import DeliveryError, DeliveryResult
+from pipeline_lambda import load_now, send_alerts
+
+
+@patch("pipeline_lambda.send_alerts", return_value=[{"plant_id": 1}])
+@patch("pipeline_lambda.load_in_batches", return_value=1)
+@patch("pipeline_lambda.DB_POOL", MagicMock())
+@patch("pipeline_lambda.SPOOL")
+def test_load_now_sends_alerts_before_draining_the_spool(mock_spool, mock_load,
+                                                         mock_send_alerts):
+    """Tests that alerts for this run's readings go out even if the spool cannot be drained."""
+
+    mock_spool.drain.side_effect = sqlite3.OperationalError("database is locked")
+    mock_spool.count_backlog.return_value = 1
+    mock_spool.get_quarantined.return_value = []
+
+    result = load_now(iter([]), None, MagicMock(), MagicMock())
+
+    mock_send_alerts.assert_called_once()
+    assert result["alerts"] == [{"plant_id": 1}]
+
+
+@patch("pipeline_lambda.deliver_alerts", side_effect=DeliveryError(DeliveryResult(0, [None])))
+def test_send_alerts_leaves_alerts_unrecorded_when_no_digest_is_sent(mock_deliver):
+    """Tests that a mail outage is logged and no alerts are reported as sent."""
+
+    evaluator = MagicMock()
+    evaluator.evaluate.side_effect = lambda conn, on_alerts: on_alerts([{"plant_id": 1}])
+    file_logger = MagicMock()
+
+    assert send_alerts(MagicMock(), evaluator, file_logger, MagicMock()) == []
+    file_logger.error.assert_called_once()
@@ -0,0 +1,62 @@
+"""Tests for the plant reading record and batch types."""
+
+from datetime import datetime
+
+from readings import PlantReading, ReadingBatch
+
+
+def test_plant_reading_from_plant_parses_timestamps(make_plant):
+    """Tests that API timestamps are converted to datetimes."""
+
+    reading = PlantReading.from_plant(make_plant(1, 17.3, 40.1))
+
+    assert reading.taken_at == datetime(2025, 6, 3, 15, 18, 44, 108000)
+    assert reading.last_watered == datetime(2025, 6, 3, 13, 32, 5)
+
+
+def test_plant_reading_has_no_instance_dict(make_plant):
+    """Tests that readings use slots rather than a per-instance dict."""
+
+    assert not hasattr(PlantReading.from_plant(make_plant(1, 17.3, 40.1)), "__dict__")
+
+
+def test_reading_batch_normalise_rounds_and_clamps(make_plant):
+    """Tests that readings are rounded to 2dp and negative moisture is clamped to 0."""
+
+    batch = ReadingBatch.from_plants([make_plant(1, 17.3512, -4.2),
+                                      make_plant(2, 21.005, 93.861)]).normalise()
+
+    assert batch.temperature.tolist() == [17.35, 21.0]
+    assert batch.soil_moisture.tolist() == [0, 93.86]
+    assert batch.taken_at.tolist()[0] == datetime(2025, 6, 3, 15, 18, 44)
+
+
+def test_reading_batch_iterates_as_plant_readings(make_plant):
+    """Tests that a batch can be turned back into the same single readings."""
+
+    plants = [make_plant(1, 17.35, 40.1), make_plant(2, 21.0, 93.86)]
+
+    assert list(ReadingBatch.from_plants(plants)) == [PlantReading.from_plant(plant)
+                                                      for plant in plants]
+
+
+def test_reading_batch_rows_are_ordered_for_insert(make_plant):
+    """Tests that rows match the column order of the sensor_reading insert."""
+
+    rows = ReadingBatch.from_plants([make_plant(1, 17.35, 40.1)]).rows()
+
+    assert rows == [(datetime(2025, 6, 3, 15, 18, 44, 108000), 17.35,
+                     datetime(2025, 6, 3, 13, 32, 5), 40.1, "Plant 1")]
+
+
+def test_reading_batch_select_drops_out_of_range_readings(make_plant):
+    """Tests that readings outside the database column constraints can be filtered out."""
+
+    batch = ReadingBatch.from_plants([make_plant(1, 17.35, 40.1),
+                                      make_plant(2, 21.0, 140.2),
+                                      make_plant(3, 1234.5, 50.0)])
+
+    valid = batch.select(batch.valid_mask())
+
+    assert valid.plant_ids.tolist() == [1]
+    assert valid.plant_names == ["Plant 1"]
@@ -0,0 +1,71 @@
+"""Tests for the retry, circuit breaker and deadline helpers."""
+
+from unittest.mock import patch
+
+from resilience import CircuitBreaker, Deadline, get_backoff_delay
+
+
+def test_get_backoff_delay_is_capped():
+    """Tests that the jittered delay never exceeds the cap."""
+
+    assert all(0 <= get_backoff_delay(attempt, base=1, cap=3) <= 3
+               for attempt in range(1, 20))
+
+
+def test_deadline_timeout_never_exceeds_remaining_time():
+    """Tests that request timeouts are cut down to the time left."""
+
+    deadline = Deadline(1)
+
+    assert deadline.timeout(5) <= 1
+    assert not deadline.expired()
+    assert Deadline(0).expired()
+
+
+def test_circuit_breaker_opens_when_most_calls_fail():
+    """Tests that the breaker rejects calls once the failure ratio is reached."""
+
+    breaker = CircuitBreaker(window=4, failure_ratio=0.5, min_calls=4)
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+@patch("resilience.monotonic")
+def test_circuit_breaker_allows_one_trial_after_cooldown(mock_monotonic):
+    """Tests that a single trial call is let through after the cooldown, and
+    that a successful trial closes the breaker."""
+
+    mock_monotonic.return_value = 100
+    breaker = CircuitBreaker(min_calls=1, cooldown=30)
+    breaker.record_failure()
+
+    mock_monotonic.return_value = 131
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.allow_request()
+
+
+@patch("resilience.monotonic")
+def test_circuit_breaker_release_trial_allows_another_trial(mock_monotonic):
+    """Tests that a trial ended without an outcome does not block every later call."""
+
+    mock_monotonic.return_value = 100
+    breaker = CircuitBreaker(min_calls=1, cooldown=30)
+    breaker.record_failure()
+
+    mock_monotonic.return_value = 131
+    assert breaker.allow_request()
+    breaker.release_trial()
+
+    assert breaker.opened_at is not None
+    assert breaker.allow_request()
@@ -0,0 +1,92 @@
+"""Tests for the load stage scheduler."""
+
+from contextlib import nullcontext
+from threading import Event
+from time import sleep
+
+import pytest
+
+from scheduler import Stage, check_graph, get_critical_path, run_stages
+
+
+def lend_nothing():
+    """Lends no connection, for stages that do not need one."""
+
+    return nullcontext(None)
+
+
+def test_check_graph_rejects_cycles():
+
+    with pytest.raises(ValueError):
+        check_graph([Stage("a", print, ("b",)), Stage("b", print, ("a",))])
+
+
+def test_check_graph_rejects_unknown_dependencies():
+
+    with pytest.raises(ValueError):
+        check_graph([Stage("a", print, ("missing",))])
+
+
+def test_get_critical_path_follows_the_slowest_chain():
+
+    stages = [Stage("country", print), Stage("origin", print, ("country",)),
+              Stage("botanist", print), Stage("assignment", print, ("botanist", "origin"))]
+    durations = {"country": 1.0, "origin": 1.0, "botanist": 1.5, "assignment": 0.5}
+
+    assert get_critical_path(stages, durations) == ["country", "origin", "assignment"]
+
+
+def test_run_stages_runs_each_stage_after_its_dependencies():
+
+    order = []
+    stages = [Stage(name, lambda _, name=name: order.append(name), depends_on)
+              for name, depends_on in [("assignment", ("botanist", "plant")),
+                                       ("plant", ("origin",)), ("origin", ()),
+                                       ("botanist", ())]]
+
+    results, timings = run_stages(stages, lend_nothing, max_workers=1)
+
+    assert order.index("origin") < order.index("plant") < order.index("assignment")
+    assert order.index("botanist") < order.index("assignment")
+    assert results.keys() == timings.keys() == {"assignment", "plant", "origin", "botanist"}
+
+
+def test_run_stages_runs_independent_stages_at_the_same_time():
+    """Tests that two independent stages overlap, as each waits for the other to start."""
+
+    started = {"a": Event(), "b": Event()}
+
+    def run(name: str, other: str) -> bool:
+        started[name].set()
+        return started[other].wait(timeout=2)
+
+    results, _ = run_stages([Stage("a", lambda _: run("a", "b")),
+                             Stage("b", lambda _: run("b", "a"))],
+                            lend_nothing, max_workers=2)
+
+    assert results == {"a": True, "b": True}
+
+
+def test_run_stages_skips_dependents_of_a_failed_stage():
+
+    ran = []
+
+    def fail(_):
+        sleep(0.01)
+        raise RuntimeError("load failed")
+
+    with pytest.raises(RuntimeError):
+        run_stages([Stage("plant", fail), Stage("reading", ran.append, ("plant",))],
+                   lend_nothing, max_workers=2)
+
+    assert not ran
+
+
+def test_run_stages_marks_critical_stages():
+
+    _, timings = run_stages([Stage("slow", lambda _: sleep(0.05)),
+                             Stage("fast", lambda _: None)],
+                            lend_nothing, max_workers=2)
+
+    assert timings["slow"].critical and not timings["fast"].critical
+    assert timings["slow"].duration >= 0.05
@@ -0,0 +1,21 @@
+"""Tests that the modules shared between Lambdas are identical in every folder."""
+
+from shared_modules import find_stale_copies, sync
+
+
+def test_shared_modules_are_identical():
+    """Tests that no copy of a shared module has drifted; run shared_modules.py to fix it."""
+
+    assert not find_stale_copies()
+
+
+def test_sync_copies_the_source_over_stale_copies(tmp_path):
+
+    modules = {"shared.py": ["pipeline", "alerts", "old_data"]}
+    for folder, text in [("pipeline", "new"), ("alerts", "old"), ("old_data", "new")]:
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "shared.py").write_text(text)
+
+    assert sync(tmp_path, modules) == [tmp_path / "alerts" / "shared.py"]
+    assert (tmp_path / "alerts" / "shared.py").read_text() == "new"
+    assert not find_stale_copies(tmp_path, modules)
@@ -0,0 +1,238 @@
+"""Tests for the write-ahead spool."""
+
+from unittest.mock import patch
+import sqlite3
+
+import pytest
+
+from spool import (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_NEVER, FlushPolicy, Spool,
+                   SpoolSegment, encode_record, get_segment_time, read_records)
+from storage import TRANSIENT_DB_ERRORS
+
+
+def test_records_round_trip(tmp_path):
+
+    records = [{"plant_id": 1, "name": "Begonia"}, {"plant_id": 2, "images": None}]
+    segment = SpoolSegment(tmp_path / "1.open", FSYNC_NEVER)
+    segment.extend(records)
+
+    assert list(read_records(segment.close())) == records
+
+
+def test_read_records_stops_at_a_partly_written_record(tmp_path):
+    """Tests that a record cut short by a crash is ignored."""
+
+    path = tmp_path / "1.spool"
+    path.write_bytes(encode_record({"plant_id": 1}) + encode_record({"plant_id": 2})[:-3])
+
+    assert list(read_records(path)) == [{"plant_id": 1}]
+
+
+def test_read_records_stops_at_a_corrupt_record(tmp_path):
+
+    corrupt = bytearray(encode_record({"plant_id": 2}))
+    corrupt[-2] ^= 0xFF
+    path = tmp_path / "1.spool"
+    path.write_bytes(encode_record({"plant_id": 1}) + corrupt)
+
+    assert list(read_records(path)) == [{"plant_id": 1}]
+
+
+@patch("spool.fsync")
+def test_always_policy_syncs_every_record(mock_fsync, tmp_path):
+
+    segment = SpoolSegment(tmp_path / "1.open", FSYNC_ALWAYS)
+    segment.extend([{"plant_id": plant_id} for plant_id in range(3)])
+
+    assert mock_fsync.call_count == 3
+
+
+@patch("spool.fsync")
+def test_batch_policy_syncs_every_n_records_and_on_close(mock_fsync, tmp_path):
+
+    segment = SpoolSegment(tmp_path / "1.open", FSYNC_BATCH, fsync_records=2)
+    segment.extend([{"plant_id": plant_id} for plant_id in range(5)])
+
+    assert mock_fsync.call_count == 2
+    segment.close()
+    assert mock_fsync.call_count == 3
+
+
+def test_unknown_fsync_policy_is_rejected(tmp_path):
+
+    with pytest.raises(ValueError):
+        SpoolSegment(tmp_path / "1.open", "sometimes")
+
+
+def test_tee_spools_records_as_they_are_read(tmp_path):
+
+    segment = SpoolSegment(tmp_path / "1.open", FSYNC_NEVER)
+    plants = segment.tee(iter([{"plant_id": 1}, {"plant_id": 2}]))
+
+    next(plants)
+    assert segment.count == 1
+
+
+def test_drain_loads_segments_oldest_first_and_deletes_them(tmp_path):
+
+    spool = Spool(tmp_path, FSYNC_NEVER)
+    for plant_id in (1, 2):
+        segment = spool.open_segment()
+        segment.append({"plant_id": plant_id})
+        segment.close()
+    loaded = []
+
+    def load(records):
+        records = list(records)
+        loaded.extend(records)
+        return len(records)
+
+    assert spool.drain(load) == 2
+    assert loaded == [{"plant_id": 1}, {"plant_id": 2}]
+    assert not spool.get_backlog()
+
+
+def test_drain_keeps_segments_that_fail_to_load(tmp_path):
+
+    spool = Spool(tmp_path, FSYNC_NEVER)
+    segment = spool.open_segment()
+    segment.append({"plant_id": 1})
+    segment.close()
+
+    def fail(records):
+        raise ConnectionError("database down")
+
+    with pytest.raises(ConnectionError):
+        spool.drain(fail)
+
+    assert spool.count_backlog() == 1
+
+
+def write_segments(spool: Spool, records: list[dict]) -> None:
+    """Writes each record to its own closed segment."""
+
+    for record in records:
+        segment = spool.open_segment()
+        segment.append(record)
+        segment.close()
+
+
+def test_drain_quarantines_segments_that_cannot_be_loaded(tmp_path):
+    """Tests that a segment failing with a non-database error is set aside, so the
+    segments after it are still drained."""
+
+    spool = Spool(tmp_path, FSYNC_NEVER)
+    write_segments(spool, [{"plant_id": 1}, {"plant_id": 2}])
+    quarantined = []
+
+    def load(records):
+        records = list(records)
+        if records == [{"plant_id": 1}]:
+            raise ValueError("bad timestamp")
+        return len(records)
+
+    assert spool.drain(load, (ConnectionError,),
+                       lambda path, error: quarantined.append(path)) == 1
+    assert not spool.get_backlog()
+    assert spool.get_quarantined() == quarantined
+    assert list(read_records(quarantined[0])) == [{"plant_id": 1}]
+
+
+@pytest.mark.parametrize("error, kept", [(sqlite3.OperationalError("database is locked"), 1),
+                                         (sqlite3.IntegrityError("CHECK constraint failed"), 0)])
+def test_drain_only_keeps_segments_for_transient_database_errors(tmp_path, error, kept):
+    """Tests that a segment the database rejects is quarantined rather than retried forever."""
+
+    spool = Spool(tmp_path, FSYNC_NEVER)
+    write_segments(spool, [{"plant_id": 1}])
+
+    def load(records):
+        raise error
+
+    try:
+        spool.drain(load, TRANSIENT_DB_ERRORS)
+    except TRANSIENT_DB_ERRORS:
+        pass
+
+    assert len(spool.get_backlog()) == kept
+    assert len(spool.get_quarantined()) == 1 - kept
+
+
+def test_flush_falls_back_to_draining_past_a_bad_segment(tmp_path):
+
+    spool = Spool(tmp_path, FSYNC_NEVER)
+    write_segments(spool, [{"plant_id": 1}, {"plant_id": 2}, {"plant_id": 3}])
+
+    def load(records):
+        records = list(records)
+        if {"plant_id": 2} in records:
+            raise ValueError("bad timestamp")
+        return len(records)
+
+    assert spool.flush(load, (ConnectionError,)) == 2
+    assert not spool.get_backlog()
+    assert len(spool.get_quarantined()) == 1
+
+
+def test_backlog_includes_segments_left_open_by_a_crashed_run(tmp_path):
+    """Tests that a stale open segment from another run is drained, but not this run's."""
+
+    Spool(tmp_path, FSYNC_NEVER).open_segment().append({"plant_id": 1})
+    spool = Spool(tmp_path, FSYNC_NEVER, stale_seconds=900)
+    current = spool.open_segment()
+    [crashed] = [path for path in tmp_path.iterdir() if path != current.path]
+
+    assert spool.get_backlog(now=get_segment_time(current.path) + 900) == [crashed]
+
+
+def test_backlog_leaves_open_segments_of_live_runs_alone(tmp_path):
+    """Tests that a recent open segment from a concurrent run sharing the directory
+    is not drained out from under it."""
+
+    other = Spool(tmp_path, FSYNC_NEVER).open_segment()
+    other.append({"plant_id": 1})
+    spool = Spool(tmp_path, FSYNC_NEVER, stale_seconds=900)
+
+    assert not spool.get_backlog(now=get_segment_time(other.path) + 60)
+    assert other.close().exists()
+
+
+def test_flush_policy_is_due_on_size_or_age():
+
+    policy = FlushPolicy(max_readings=100, max_seconds=300)
+
+    assert policy.enabled
+    assert not policy.is_due(99, 299)
+    assert policy.is_due(100, 0)
+    assert policy.is_due(1, 300)
+    assert not FlushPolicy(max_readings=0).enabled
+
+
+def test_oldest_age_comes_from_the_oldest_segment(tmp_path):
+
+    spool = Spool(tmp_path, FSYNC_NEVER)
+    assert spool.get_oldest_age() == 0.0
+    segment = spool.open_segment()
+    segment.append({"plant_id": 1})
+    closed = segment.close()
+
+    assert spool.get_oldest_age(now=get_segment_time(closed) + 60) == pytest.approx(60)
+
+
+def test_flush_loads_every_segment_as_one_stream(tmp_path):
+    """Tests that records from several runs are loaded together, so they can share batches."""
+
+    spool = Spool(tmp_path, FSYNC_NEVER)
+    for plant_id in (1, 2, 3):
+        segment = spool.open_segment()
+        segment.append({"plant_id": plant_id})
+        segment.close()
+    calls = []
+
+    def load(records):
+        calls.append(list(records))
+        return len(calls[-1])
+
+    assert spool.flush(load) == 3
+    assert calls == [[{"plant_id": 1}, {"plant_id": 2}, {"plant_id": 3}]]
+    assert not spool.get_backlog()
@@ -0,0 +1,166 @@
+"""Tests for the storage backends."""
+
+from random import Random
+from unittest.mock import patch
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool
+from dimension_cache import DimensionCache
+from fake_api import make_plant
+from fingerprint import FingerprintStore
+from load import ALL_OR_NOTHING, SKIP_BAD_ROWS, ReadingCounts, load_plant_batch
+from storage import (TRANSIENT_DB_ERRORS, SQLiteBackend, SQLServerBackend, get_backend,
+                     translate_schema)
+from validate import validate_plant_record
+
+
+def make_backend(tmp_path: "Path") -> SQLiteBackend:
+    """Makes an SQLite database built from schema.sql and the migrations."""
+
+    backend = SQLiteBackend(str(tmp_path / "plants.db"))
+    backend.connect().close()
+    return backend
+
+
+def test_translate_schema_makes_identity_columns_integer_keys():
+    """Tests that IDENTITY columns become INTEGER so SQLite numbers them."""
+
+    schema = translate_schema("CREATE TABLE t (\n    t_id SMALLINT IDENTITY(1,1),\n"
+                              "    PRIMARY KEY (t_id),\n);")
+
+    assert schema == "CREATE TABLE t (\n    t_id INTEGER,\n    PRIMARY KEY (t_id)\n);"
+
+
+def test_get_backend_rejects_unknown_names():
+
+    with pytest.raises(ValueError):
+        get_backend("postgres")
+
+
+def test_get_backend_by_name():
+
+    assert isinstance(get_backend("sqlite"), SQLiteBackend)
+    assert isinstance(get_backend("sqlserver"), SQLServerBackend)
+
+
+@patch.dict("os.environ", {"DB_DRIVER": "ODBC Driver 18 for SQL Server", "DB_HOST": "host",
+                            "DB_NAME": "plants", "DB_USER": "user", "DB_PASSWORD": "secret"})
+@patch("storage.pyodbc")
+def test_sqlserver_connect_adds_connection_options(mock_pyodbc):
+    """Tests that options such as the archive Lambdas' Encrypt=no reach the connection."""
+
+    SQLServerBackend().connect(Encrypt="no")
+
+    assert mock_pyodbc.connect.call_args.kwargs["Encrypt"] == "no"
+    assert mock_pyodbc.connect.call_args.kwargs["server"] == "host"
+
+
+def test_sqlite_upsert_updates_existing_rows(tmp_path):
+    """Tests that the SQLite upsert replaces the values of rows with matching keys."""
+
+    backend = make_backend(tmp_path)
+    connection = backend.connect()
+    connection.execute("CREATE TEMP TABLE staging (plant_id, dimension, fingerprint)")
+    connection.executemany("INSERT INTO staging VALUES (?, ?, ?)",
+                           [(1, "plant", b"new"), (2, "plant", b"two")])
+    connection.execute("INSERT INTO load_fingerprint VALUES (1, 'plant', ?)", (b"old",))
+
+    connection.execute(backend.upsert_query("load_fingerprint", "temp.staging",
+                                            ["plant_id", "dimension"], ["fingerprint"]))
+
+    assert connection.execute(
+        "SELECT plant_id, fingerprint FROM load_fingerprint ORDER BY plant_id"
+    ).fetchall() == [(1, b"new"), (2, b"two")]
+
+
+def test_load_plant_batch_into_sqlite(tmp_path):
+    """Tests the whole load against an SQLite database built from schema.sql and
+    the migrations, and that loading the same readings again inserts no duplicates."""
+
+    backend = make_backend(tmp_path)
+    plants = [plant for plant in (make_plant(plant_id, Random(plant_id))
+                                  for plant_id in range(1, 30))
+              if not validate_plant_record(plant)]
+    connection = backend.connect()
+
+    with patch("load.BACKEND", backend), \
+            patch("load.DIMENSION_CACHE", DimensionCache()), \
+            patch("load.FINGERPRINTS", FingerprintStore()):
+        first_run = load_plant_batch(connection, plants)
+        repeat_run = load_plant_batch(connection, plants)
+
+    def count(table: str) -> int:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    assert count("plant") == len(plants)
+    assert count("botanist_assignment") == len(plants)
+    assert count("sensor_reading") == len(plants)
+    assert first_run.readings == ReadingCounts(new=len(plants), duplicate=0)
+    assert repeat_run.readings == ReadingCounts(new=0, duplicate=len(plants))
+    assert count("load_fingerprint") == 3 * len(plants)
+
+
+def test_load_plant_batch_skips_a_reading_failing_a_check(tmp_path):
+    """Tests that a reading breaking a CHECK constraint fails the whole batch with a
+    data error, which is not transient, unless bad rows are skipped."""
+
+    backend = make_backend(tmp_path)
+    plants = [make_plant(plant_id, Random(plant_id)) for plant_id in (1, 2)]
+    plants[1]["soil_moisture"] = 150
+    connection = backend.connect()
+
+    with patch("load.BACKEND", backend), \
+            patch("load.DIMENSION_CACHE", DimensionCache()), \
+            patch("load.FINGERPRINTS", FingerprintStore()):
+        with pytest.raises(sqlite3.IntegrityError) as error:
+            load_plant_batch(connection, plants, failure_mode=ALL_OR_NOTHING)
+        report = load_plant_batch(connection, plants, failure_mode=SKIP_BAD_ROWS)
+
+    assert not isinstance(error.value, TRANSIENT_DB_ERRORS)
+    assert report.readings.new == 1
+    assert connection.execute("SELECT COUNT(*) FROM sensor_reading").fetchone() == (1,)
+
+
+def test_load_plant_batch_into_sqlite_in_parallel(tmp_path):
+    """Tests that independent stages can load on separate pooled connections."""
+
+    backend = make_backend(tmp_path)
+    pool = ConnectionPool(backend.connect)
+    plants = [plant for plant in (make_plant(plant_id, Random(plant_id))
+                                  for plant_id in range(1, 30))
+              if not validate_plant_record(plant)]
+
+    with patch("load.BACKEND", backend), \
+            patch("load.DIMENSION_CACHE", DimensionCache()), \
+            patch("load.FINGERPRINTS", FingerprintStore()), \
+            pool.connection() as connection:
+        report = load_plant_batch(connection, plants, pool, max_workers=3)
+
+    assert report.readings == ReadingCounts(new=len(plants), duplicate=0)
+    assert "sensor_reading" in report.stages
+    assert any(timing.critical for timing in report.stages.values())
+    assert pool.get_metrics()["opened"] > 1
+
+
+def test_latest_reading_keeps_the_newest_window_per_plant(tmp_path):
+    """Tests that loading more readings than the window size keeps only the newest."""
+
+    backend = make_backend(tmp_path)
+    plant = make_plant(1, Random(1))
+    assert not validate_plant_record(plant)
+    connection = backend.connect()
+
+    with patch("load.BACKEND", backend), \
+            patch("load.DIMENSION_CACHE", DimensionCache()), \
+            patch("load.FINGERPRINTS", FingerprintStore()):
+        for minute in range(5):
+            plant["recording_taken"] = f"2025-06-03T15:0{minute}:00.000Z"
+            load_plant_batch(connection, [plant])
+
+    assert connection.execute(
+        "SELECT taken_at FROM latest_reading ORDER BY taken_at"
+    ).fetchall() == [("2025-06-03 15:02:00",), ("2025-06-03 15:03:00",),
+                     ("2025-06-03 15:04:00",)]
+    assert connection.execute("SELECT COUNT(*) FROM sensor_reading").fetchone()[0] == 5
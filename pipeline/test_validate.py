@@ -1,161 +1,78 @@
 """Tests for validation functions."""
 
 
-from validate import (get_dict_of_missing_info, check_missing_keys,
-                      check_missing_location_details,
-                      has_null_images_key, check_negative_moisture)
+from validate import (validate_plant_record, ValidationError,
+                      MISSING_KEY, MISSING_VALUE, WRONG_TYPE, INVALID_VALUE)
 
 
-def test_get_dict_of_missing_info_returns_correct_missing_keys():
-    """Tests that the function returns the correct missing keys when 
-    given a list of required keys."""
+def test_validate_plant_record_returns_no_errors_and_rounds_valid_plant(make_plant):
+    """Tests that a valid plant has no errors and its readings and coordinates are
+    rounded to 2dp."""
 
-    required_keys = ["name", "plant_id", "origin_location", "soil_moisture"]
-    data = {"name": "/", "plant_id": "/"}
-    assert get_dict_of_missing_info(data, required_keys) == {"missing_keys": [
-        "origin_location", "soil_moisture"]}
+    plant = make_plant()
 
+    assert validate_plant_record(plant) == []
+    assert (plant["temperature"], plant["soil_moisture"]) == (17.35, 93.86)
+    assert plant["origin_location"] == {"latitude": 14.31, "longitude": 21.89,
+                                        "city": "South Julianview", "country": "Chad"}
 
-def test_get_dict_of_missing_info_returns_correct_missing_values():
-    """Tests that the function returns the correct missing values when 
-    given a list of required keys."""
 
-    required_keys = ["name", "plant_id", "origin_location", "soil_moisture"]
-    data = {"name": "/", "plant_id": "/",
-            "origin_location": "", "soil_moisture": ""}
-    assert get_dict_of_missing_info(data, required_keys) == {"missing_values": [
-        "origin_location", "soil_moisture"]}
+def test_validate_plant_record_clamps_negative_soil_moisture(make_plant):
+    """Tests that a negative soil moisture reading is raised to 0."""
 
+    plant = make_plant()
+    plant["soil_moisture"] = -3.2
 
-def test_get_dict_of_missing_info_returns_correct_missing_keys_and_values():
-    """Tests that the function returns the correct missing keys and values when 
-    given a list of required keys."""
+    assert validate_plant_record(plant) == []
+    assert plant["soil_moisture"] == 0
 
-    required_keys = ["name", "plant_id", "origin_location", "soil_moisture"]
-    data = {"name": "/", "origin_location": "", "soil_moisture": ""}
-    assert get_dict_of_missing_info(data, required_keys) == {"missing_keys": ["plant_id"],
-                                                             "missing_values":
-                                                             ["origin_location", "soil_moisture"]}
 
+def test_validate_plant_record_rejects_soil_moisture_above_100(make_plant):
+    """Tests that soil moisture above 100% is reported rather than loaded."""
 
-def test_get_dict_of_missing_info_returns_empty_dict_when_no_missing_keys_and_values():
-    """Tests that the function returns an empty list when there are no missing keys when
-    given a list of required keys."""
+    plant = make_plant()
+    plant["soil_moisture"] = 100.5
 
-    required_keys = ["name", "plant_id", "origin_location", "soil_moisture"]
-    data = {"name": "/", "plant_id": "/",
-            "origin_location": "/", "soil_moisture": "/"}
-    assert not get_dict_of_missing_info(data, required_keys)
+    assert validate_plant_record(plant) == [ValidationError("soil_moisture", INVALID_VALUE)]
 
 
-def test_check_missing_keys_returns_dict_of_missing_keys():
-    """Tests that the function returns a dict of missing keys 
-    if last_watered, soil_moisture and recording_taken keys are missing from plant data. """
+def test_validate_plant_record_removes_null_images(make_plant):
+    """Tests that a null images key is removed."""
 
-    data = {"plant_id": 7, "name": "/", "temperature": "/",
-            "origin_location": "/", "botanist": "/"}
-    assert check_missing_keys(
-        data) == {"missing_keys": ["last_watered", "soil_moisture", "recording_taken"]}
+    plant = make_plant()
+    plant["images"] = None
 
+    assert validate_plant_record(plant) == []
+    assert "images" not in plant
 
-def test_check_missing_keys_returns_dict_of_missing_values():
-    """Tests that the function returns a dict of missing values 
-    if last_watered, soil_moisture and recording_taken keys have empty values. """
 
-    data = {"plant_id": 7, "name": "/", "temperature": "/",
-            "origin_location": "/", "botanist": "/", "last_watered": "", "soil_moisture": "",
-            "recording_taken": ""}
-    assert check_missing_keys(
-        data) == {"missing_values": ["last_watered", "soil_moisture", "recording_taken"]}
+def test_validate_plant_record_returns_typed_errors_for_nested_fields(make_plant):
+    """Tests that missing keys, missing values and wrong types are reported by path."""
 
+    plant = make_plant()
+    del plant["recording_taken"]
+    plant["botanist"]["email"] = ""
+    plant["origin_location"]["latitude"] = "north"
 
-def test_check_missing_keys_returns_dict_of_missing_key_and_values():
-    """Tests that the function returns a dict of missing keys and missing values
-    if plant_id and name keys are missing and last_watered, soil_moisture and 
-    recording_taken keys are empty values."""
+    assert validate_plant_record(plant) == [
+        ValidationError("origin_location.latitude", WRONG_TYPE),
+        ValidationError("botanist.email", MISSING_VALUE),
+        ValidationError("recording_taken", MISSING_KEY)]
 
-    data = {"temperature": "/",
-            "origin_location": "/", "botanist": "/", "last_watered": "", "soil_moisture": "",
-            "recording_taken": ""}
-    assert check_missing_keys(
-        data) == {"missing_keys": ["plant_id", "name"],
-                  "missing_values": ["last_watered", "soil_moisture", "recording_taken"]}
 
+def test_validate_plant_record_rejects_timestamps_that_do_not_parse(make_plant):
+    """Tests that a timestamp which cannot be loaded is reported, not passed on."""
 
-def test_check_missing_keys_returns_empty_dict_if_no_missing_key_and_values():
-    """Tests that the function returns an empty dict if no keys and values are missing."""
+    plant = make_plant()
+    plant["recording_taken"] = "yesterday"
+    plant["last_watered"] = "2025-13-01T00:00:00.000Z"
 
-    data = {"plant_id": "/", "name": "/", "temperature": "/",
-            "origin_location": "/", "botanist": "/", "last_watered": "/", "soil_moisture": "/",
-            "recording_taken": "/"}
-    assert not check_missing_keys(data)
+    assert validate_plant_record(plant) == [
+        ValidationError("last_watered", INVALID_VALUE),
+        ValidationError("recording_taken", INVALID_VALUE)]
 
 
-def test_check_missing_location_details_returns_dict_of_missing_keys():
-    """Tests that the function returns a dict of missing keys 
-    if city and country keys are missing from plant data. """
+def test_validate_plant_record_rejects_non_dict():
+    """Tests that a response which is not a dict is reported as the wrong type."""
 
-    data = {"origin_location": {"latitude": 7, "longitude": "/"}}
-    assert check_missing_location_details(
-        data) == {"missing_keys": ["country", "city"]}
-
-
-def test_check_missing_location_details_returns_dict_of_missing_values():
-    """Tests that the function returns a dict of missing values 
-    if city and country keys have empty values."""
-
-    data = {"origin_location": {"latitude": 7,
-                                "longitude": "/", "city": "", "country": ""}}
-    assert check_missing_location_details(
-        data) == {"missing_values": ["country", "city"]}
-
-
-def test_check_missing_location_details_returns_dict_of_missing_keys_and_values():
-    """Tests that the function returns a dict of missing keys and values if 
-    latitude key is missing and if city and country keys have empty values."""
-
-    data = {"origin_location": {"longitude": "/", "city": "", "country": ""}}
-    assert check_missing_location_details(
-        data) == {"missing_keys": ["latitude"], "missing_values": ["country", "city"]}
-
-
-def test_has_null_images_key_returns_true():
-    """Tests that True is returned if images key is present but equals 'null'."""
-
-    assert has_null_images_key({"images": None})
-
-
-def test_has_null_images_key_returns_false_no_key():
-    """Tests that False is returned if images key is not present."""
-
-    data = {"plant_id": 7, "name": "/", "temperature": "/",
-            "origin_location": "/", "botanist": "/", "last_watered": "", "soil_moisture": "",
-            "recording_taken": ""}
-
-    assert not has_null_images_key({})
-
-
-def test_has_null_images_key_returns_false_valid_key_nested_dict():
-    """Tests that False is returned if images key present and valid."""
-
-    assert not has_null_images_key({"images": {"url": "/"}})
-
-
-def test_has_negative_soil_moisture():
-    """Tests that True is returned when soil moisture is negative"""
-    assert check_negative_moisture({"soil_moisture": -12.101})
-
-
-def test_has_positive_soil_moisture():
-    """Tests that False is returned when soil moisture is positive."""
-    assert not check_negative_moisture({"soil_moisture": 12.131})
-
-
-def test_has_zero_moisture():
-    """Tests that False is returned when soil moisture is 0."""
-    assert not check_negative_moisture({"soil_moisture": 0})
-
-
-def test_has_negative_small_moisture():
-    """Tests that True is returned when soil moisture is -0.001."""
-    assert check_negative_moisture({"soil_moisture": -0.001})
+    assert validate_plant_record(None) == [ValidationError("", WRONG_TYPE)]
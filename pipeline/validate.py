@@ -1,112 +1,184 @@
 """Functions for validating the plant data extracted from API."""
-from requests import Response
-
-
-def check_status_code(res: Response) -> dict:
-    """Checks the status code of the response."""
-    if res.status_code == 404:
-        return res.json()
-    if res.status_code >= 500:
-        raise RuntimeError("Unable to connect to API.")
-    if res.status_code == 401:
-        raise PermissionError("Invalid API key or not authorised.")
-    if res.status_code != 200:
-        raise ValueError("Fetching plant data was not successful.")
-
-
-def get_dict_of_missing_info(plant_dict: dict, keys: list):
-    """Returns a dict of missing keys and values."""
-    missing_info = {}
-    missing_keys = []
-    missing_values = []
-    for key in keys:
-        if key not in plant_dict:
-            missing_keys.append(key)
-        else:
-            if not plant_dict[key]:
-                missing_values.append(key)
-
-    if missing_keys:
-        missing_info["missing_keys"] = missing_keys
-    if missing_values:
-        missing_info["missing_values"] = missing_values
-
-    return missing_info
+from typing import Callable, NamedTuple
 
+from requests import Response
 
-def check_missing_keys(data: dict) -> dict:
-    """Check that the plant data has all valid keys."""
-
-    required_keys = ["plant_id", "name", "temperature", "origin_location", "botanist",
-                     "last_watered", "soil_moisture", "recording_taken"]
-
-    missing_info = get_dict_of_missing_info(data, required_keys)
-
-    return missing_info
-
-
-def check_missing_location_details(data: dict) -> dict:
-    """Checks that data has all relevant location details."""
-    location_details = data["origin_location"]
-
-    required_keys = ["latitude", "longitude", "country", "city"]
-    missing_info = get_dict_of_missing_info(location_details, required_keys)
-    return missing_info
+from readings import parse_timestamp
 
 
-def check_missing_botanist_details(data: dict) -> dict:
-    """Checks that data has all relevant botanist details."""
-    botanist_details = data["botanist"]
+MISSING_KEY = "missing_key"
+MISSING_VALUE = "missing_value"
+WRONG_TYPE = "wrong_type"
+INVALID_VALUE = "invalid_value"
 
-    required_keys = ["name", "email", "phone"]
-    missing_info = get_dict_of_missing_info(botanist_details, required_keys)
-    return missing_info
+NUMBER = (int, float)
+MISSING = object()
 
 
-def convert_int_to_2dp(data: dict) -> dict:
-    """Converts int to 2 decimal places."""
-    data["temperature"] = round(data["temperature"], 2)
-    data["soil_moisture"] = round(data["soil_moisture"], 2)
-    location = data["origin_location"]
-    location["latitude"] = round(location["latitude"], 2)
-    location["longitude"] = round(location["longitude"], 2)
-    return data
+class ValidationError(NamedTuple):
+    """A single problem found in a plant record, e.g. ("botanist.email", "missing_key")."""
+    field: str
+    problem: str
 
 
-def has_null_images_key(data: dict) -> bool:
-    """Returns True if the images key is present but is null in plant data."""
+class Field(NamedTuple):
+    """Schema entry for a single plant field.
 
-    if "images" in data:
-        if not data["images"]:
-            return True
+    If given, parse is called with the value and must raise ValueError if the
+    value cannot be used, e.g. a timestamp that does not parse."""
+    types: tuple
+    normalise: Callable = None
+    required: bool = True
+    parse: Callable = None
 
-    return False
 
+def round_2dp(value: float) -> float:
+    """Rounds a reading to 2 decimal places."""
+    return round(value, 2)
 
-def validate_plant_data(data: dict) -> list[dict]:
-    """Checks that relevant keys are not missing from the plant data."""
-    all_missing_keys = []
 
-    missing_keys = check_missing_keys(data)
+def clamp_soil_moisture(value: float) -> float:
+    """Raises a negative soil moisture reading to 0 and rounds it to 2 decimal places."""
+    return round(max(value, 0), 2)
 
-    if missing_keys:
-        all_missing_keys.append(
-            f"Plant data is missing the following: {missing_keys}")
-        return all_missing_keys
 
-    missing_location_details = check_missing_location_details(data)
-    missing_botanist_details = check_missing_botanist_details(data)
+def check_soil_moisture(value: float) -> None:
+    """Raises ValueError for soil moisture above 100%, which the sensors cannot read."""
+    if not value <= 100:
+        raise ValueError(f"Soil moisture {value} is above 100%.")
 
-    if missing_location_details:
-        all_missing_keys.append(
-            f"Missing keys for location: {missing_location_details}")
-    if missing_botanist_details:
-        all_missing_keys.append(
-            f"Missing keys for botanist: {missing_botanist_details}")
 
-    return all_missing_keys
+def check_status_code(res: Response) -> dict:
+    """Checks the status code of the response."""
+    if res.status_code == 404:
+        return res.json()
+    if res.status_code >= 500:
+        raise RuntimeError("Unable to connect to API.")
+    if res.status_code == 401:
+        raise PermissionError("Invalid API key or not authorised.")
+    if res.status_code != 200:
+        raise ValueError("Fetching plant data was not successful.")
 
 
-def check_negative_moisture(data: dict) -> bool:
-    """Returns True if the soil moisture level is below 0."""
-    return data["soil_moisture"] < 0
+PLANT_SCHEMA = {
+    "plant_id": Field((int,)),
+    "name": Field((str,)),
+    "temperature": Field(NUMBER, round_2dp),
+    "origin_location": {
+        "latitude": Field(NUMBER, round_2dp),
+        "longitude": Field(NUMBER, round_2dp),
+        "country": Field((str,)),
+        "city": Field((str,)),
+    },
+    "botanist": {
+        "name": Field((str,)),
+        "email": Field((str,)),
+        "phone": Field((str,)),
+    },
+    "last_watered": Field((str,), parse=parse_timestamp),
+    "soil_moisture": Field(NUMBER, clamp_soil_moisture, parse=check_soil_moisture),
+    "recording_taken": Field((str,), parse=parse_timestamp),
+    "images": Field((dict,), required=False),
+}
+
+
+def compile_report(key: str, path: str, required: bool) -> Callable:
+    """Compiles the reporting of a field whose value is missing or of the wrong
+    type. An optional field that is null is removed rather than reported."""
+    def report(record: dict, value: object, errors: list[ValidationError]) -> None:
+        if value is MISSING:
+            if required:
+                errors.append(ValidationError(path, MISSING_KEY))
+        elif value is None or value == "":
+            if required:
+                errors.append(ValidationError(path, MISSING_VALUE))
+            else:
+                del record[key]
+        else:
+            errors.append(ValidationError(path, WRONG_TYPE))
+
+    return report
+
+
+def compile_accept(key: str, path: str, spec: Field, children: list[Callable]) -> Callable:
+    """Compiles the checks and normalising of a field whose value has the right type,
+    or returns None if there is nothing more to do."""
+    normalise, parse = spec.normalise, spec.parse
+    if children:
+        def accept(_record: dict, value: dict, errors: list[ValidationError]) -> None:
+            for check_child in children:
+                check_child(value, errors)
+    elif parse or normalise:
+        def accept(record: dict, value: object, errors: list[ValidationError]) -> None:
+            if parse:
+                try:
+                    parse(value)
+                except ValueError:
+                    errors.append(ValidationError(path, INVALID_VALUE))
+                    return
+            if normalise:
+                record[key] = normalise(value)
+    else:
+        accept = None
+    return accept
+
+
+def compile_field(key: str, path: str, spec: "Field | dict") -> Callable:
+    """Compiles a single field into a function that checks and normalises it in
+    the record holding it, appending any errors found."""
+    children = []
+    if isinstance(spec, dict):
+        children = [compile_field(child_key, f"{path}.{child_key}", child_spec)
+                    for child_key, child_spec in spec.items()]
+        spec = Field((dict,))
+    types = frozenset(spec.types)
+    allows_empty = str not in types
+    accept = compile_accept(key, path, spec, children)
+    report = compile_report(key, path, spec.required)
+
+    if accept is None:
+        def check_field(record: dict, errors: list[ValidationError]) -> None:
+            value = record.get(key, MISSING)
+            if value.__class__ not in types or not (allows_empty or value):
+                report(record, value, errors)
+    else:
+        def check_field(record: dict, errors: list[ValidationError]) -> None:
+            value = record.get(key, MISSING)
+            if value.__class__ in types and (allows_empty or value):
+                accept(record, value, errors)
+            else:
+                report(record, value, errors)
+
+    return check_field
+
+
+def compile_schema(schema: dict) -> Callable:
+    """Compiles a schema into a function that checks and normalises a record in one pass.
+
+    Each field's spec is bound into a closure once, so validating a record does
+    no schema lookups at all."""
+    checks = [compile_field(key, key, spec) for key, spec in schema.items()]
+
+    def validate_record(record: dict) -> list[ValidationError]:
+        errors = []
+        for check in checks:
+            check(record, errors)
+        return errors
+
+    return validate_record
+
+
+validate_compiled_plant = compile_schema(PLANT_SCHEMA)
+
+
+def validate_plant_record(data: dict) -> list[ValidationError]:
+    """Checks and normalises a plant record in a single pass.
+
+    Null images are removed, readings and coordinates are rounded to 2
+    decimal places and negative soil moisture is raised to 0, as
+    retrieve_all_data and plant_data.json have always held them. Soil
+    moisture above 100% is rejected. Returns a list of errors, empty if valid."""
+    if not isinstance(data, dict):
+        return [ValidationError("", WRONG_TYPE)]
+
+    return validate_compiled_plant(data)